@@ -37,6 +37,11 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main.middleware.SqlInstrumentationMiddleware',
+    'main.middleware.ProfilingMiddleware',
+    # Внутри SQL-инструментирования и профилировщика: их EXPLAIN и накладные
+    # расходы не попадают в span, число запросов совпадает с X-SQL-Queries
+    'main.middleware.TracingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'simple_history.middleware.HistoryRequestMiddleware'
@@ -128,3 +133,29 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
 }
+
+# Начиная с этого числа строк (по оценке PostgreSQL) админка показывает
+# примерное количество вместо COUNT(*) по всей таблице
+ADMIN_EXACT_COUNT_LIMIT = int(os.getenv('ADMIN_EXACT_COUNT_LIMIT', 10000))
+
+# Учёт SQL по эндпоинтам (main.middleware.SqlInstrumentationMiddleware):
+# заголовки X-SQL-* для сотрудников и статистика на /debug/sql-stats/
+SQL_INSTRUMENTATION = os.getenv('SQL_INSTRUMENTATION', 'False').lower() == 'true'
+# Запросы дольше этого (мс) попадают в выборку для EXPLAIN
+SQL_SLOW_QUERY_MS = float(os.getenv('SQL_SLOW_QUERY_MS', 100))
+# Доля медленных запросов, для которых снимается план
+SQL_EXPLAIN_SAMPLE_RATE = float(os.getenv('SQL_EXPLAIN_SAMPLE_RATE', 0.1))
+# Сколько самых медленных шаблонов запросов хранить на эндпоинт
+SQL_TOP_QUERIES = int(os.getenv('SQL_TOP_QUERIES', 5))
+
+# Профилирование отдельных запросов сотрудников по X-Profile / ?_profile=
+# (main.middleware.ProfilingMiddleware); выключено — middleware не подключается
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING', 'False').lower() == 'true'
+# Интервал сэмплирования стека, мс
+PROFILING_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILING_SAMPLE_INTERVAL_MS', 5))
+# Сколько функций показывать в таблице профиля
+PROFILING_TOP = int(os.getenv('PROFILING_TOP', 30))
+
+# Куда писать span'ы запросов бота с X-Trace-Id (JSON lines, main.middleware.TracingMiddleware);
+# пусто — трассировка выключена
+API_TRACE_FILE = os.getenv('API_TRACE_FILE', '')
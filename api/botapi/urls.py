@@ -27,6 +27,8 @@ from main.views import (
     RotatedQuestionListView,
     ConfigViewSet,
     BulkQuestionImportView,
+    QuestionSearchView,
+    SqlStatsView,
     QuestionLikeView,
     QuestionDislikeView,
     ChatRegisterView,
@@ -45,6 +47,7 @@ urlpatterns = [
     path('quiz/list/<str:quiz_type>/', QuizListView.as_view(), name='quiz-list'),
     path('question/list/', QuestionQuizListView.as_view(), name='question-list'),
     path('question/rotated/', RotatedQuestionListView.as_view(), name='question-rotated'),
+    path('question/search/', QuestionSearchView.as_view(), name='question-search'),
     path('team/<str:chat_username>/', TeamByChatView.as_view(), name='team-by-chat'),
     path('game/plan-game/list/<str:chat_username>/', PlanTeamQuizListView.as_view(), name='plan-team-quiz-list'),
     path('player/game-end/', PlayerGameEndView.as_view(), name='player-game-end'),
@@ -63,6 +66,7 @@ urlpatterns = [
     path('question/<int:question_id>/like/', QuestionLikeView.as_view(), name='question-like'),
     path('question/<int:question_id>/dislike/', QuestionDislikeView.as_view(), name='question-dislike'),
     path('chat/register/', ChatRegisterView.as_view(), name='chat-register'),
+    path('debug/sql-stats/', SqlStatsView.as_view(), name='debug-sql-stats'),
 
     path('', include(router.urls)),
 ]
@@ -1,5 +1,7 @@
 from django.contrib import admin
 from django.contrib.admin import SimpleListFilter
+from django.db.models import Aggregate, CharField, Exists, OuterRef, Subquery
+from django.db.models.expressions import RawSQL
 from import_export import resources, fields
 from import_export.admin import ImportExportModelAdmin
 from import_export.widgets import ManyToManyWidget
@@ -21,17 +23,51 @@ from .models import (
     Chat,
     PlayerInChat
 )
+from . import search
+from .paginators import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Админка для таблиц на миллионы строк: без COUNT(*) на каждой странице."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class FullTextSearchAdmin(admin.ModelAdmin):
+    """Поиск по полнотекстовому индексу (main/search.py) вместо ILIKE '%...%'.
+
+    Если индекса для СУБД нет, работает обычный поиск по search_fields.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        matching = search.matching_ids_sql(queryset.model, search_term, using=queryset.db)
+        if matching is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(id__in=RawSQL(*matching)), False
 
 
 @admin.register(QuestionUsage)
-class QuestionUsageAdmin(admin.ModelAdmin):
+class QuestionUsageAdmin(LargeTableAdmin):
     list_display = ('id', 'question', 'use_type', 'context_id')
-    list_filter = ('use_type', 'context_id')
+    list_filter = ('use_type',)
+    list_select_related = ('question',)
+    raw_id_fields = ('question',)
     search_fields = ('question__text',)
+    search_help_text = 'Число — поиск по chat_id, telegram_id или id команды, иначе по тексту вопроса'
+
+    def get_search_results(self, request, queryset, search_term):
+        # Контекст ищем точным совпадением по индексу, а не DISTINCT-фильтром
+        term = search_term.strip()
+        if term.lstrip('-').isdigit():
+            return queryset.filter(context_id=int(term)), False
+        matching = search.matching_ids_sql(Question, term, using=queryset.db)
+        if matching is not None:
+            return queryset.filter(question_id__in=RawSQL(*matching)), False
+        return super().get_search_results(request, queryset, search_term)
 
 
 @admin.register(TelegramPlayer)
-class TelegramPlayerAdmin(admin.ModelAdmin):
+class TelegramPlayerAdmin(LargeTableAdmin):
     list_display = ('id', 'first_name', 'last_name', 'username', 'telegram_id', 'added_at', 'total_xp', 'current_streak', 'notification_is_on')
     search_fields = ('first_name', 'last_name', 'username', 'telegram_id')
 
@@ -96,6 +132,20 @@ class QuestionAnswerResource(resources.ModelResource):
         report_skipped = True
 
 
+class GroupConcat(Aggregate):
+    """Строки группы через запятую: STRING_AGG в PostgreSQL, GROUP_CONCAT в SQLite."""
+    function = 'GROUP_CONCAT'
+    template = "%(function)s(%(expressions)s, ', ')"
+    output_field = CharField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='STRING_AGG', **extra_context)
+
+
+def _quiz_links():
+    return Quiz.questions.through.objects.filter(question_id=OuterRef('pk'))
+
+
 class HasQuizFilter(SimpleListFilter):
     """Фильтр для отображения вопросов, связанных с квизами"""
     title = 'Наличие квиза'
@@ -109,18 +159,21 @@ class HasQuizFilter(SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value() == 'yes':
-            return queryset.filter(quizzes__isnull=False).distinct()
+            return queryset.filter(Exists(_quiz_links()))
         if self.value() == 'no':
-            return queryset.filter(quizzes__isnull=True)
+            return queryset.filter(~Exists(_quiz_links()))
         return queryset
 
 
 @admin.register(Question)
-class QuestionAdmin(SimpleHistoryAdmin, ImportExportModelAdmin):
+class QuestionAdmin(SimpleHistoryAdmin, ImportExportModelAdmin, FullTextSearchAdmin, LargeTableAdmin):
     resource_classes = [QuestionResource]  # Изменено с resource_class на resource_classes
     list_display = ('id', 'text', 'question_type', 'comment', 'difficulty', 'game_use_type', 'image', 'get_quiz_names')
     list_filter = ('question_type', 'difficulty', 'game_use_type', HasQuizFilter)
     search_fields = ('text',)
+    search_help_text = 'Поиск по словам в тексте и комментарии вопроса'
+    # Порядок по id обслуживают индексы фильтров; нужен и автодополнению
+    ordering = ('-id',)
     history_list_display = ['text', 'question_type', 'game_use_type', 'difficulty']
 
     # Добавляем массовые действия
@@ -130,20 +183,30 @@ class QuestionAdmin(SimpleHistoryAdmin, ImportExportModelAdmin):
     
     def get_quiz_names(self, obj):
         """Возвращает названия квизов, связанных с вопросом"""
-        quiz_names = obj.quizzes.values_list('name', flat=True)
-        return ', '.join(quiz_names) if quiz_names else '-'
+        return obj.quiz_names or '-'
     get_quiz_names.short_description = 'Квизы'
     
     def get_queryset(self, request):
-        """Оптимизированный queryset с prefetch для связанных квизов"""
-        return super().get_queryset(request).prefetch_related('quizzes')
+        """Названия квизов подзапросом: считается только для строк текущей страницы"""
+        quiz_names = _quiz_links().values('question_id').annotate(names=GroupConcat('quiz__name')).values('names')
+        return super().get_queryset(request).annotate(quiz_names=Subquery(quiz_names))
+
+    def get_search_results(self, request, queryset, search_term):
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        # В автодополнении поля «Вопросы» квиза — только текстовые вопросы,
+        # как и в форме квиза (QuizAdmin.formfield_for_manytomany)
+        if request.GET.get('model_name') == 'quiz' and request.GET.get('field_name') == 'questions':
+            queryset = queryset.filter(question_type=Question.QuestionTypeChoices.TEXT)
+        return queryset, may_have_duplicates
 
 
 @admin.register(QuestionAnswer)
-class QuestionAnswerAdmin(SimpleHistoryAdmin, ImportExportModelAdmin):
+class QuestionAnswerAdmin(SimpleHistoryAdmin, ImportExportModelAdmin, FullTextSearchAdmin, LargeTableAdmin):
     resource_classes = [QuestionAnswerResource]
     list_display = ('id', 'text', 'question', 'is_right')
     list_filter = ('is_right',)
+    list_select_related = ('question',)
+    raw_id_fields = ('question',)
     search_fields = ('text',)
     history_list_display = ['text', 'question', 'is_right']
 
@@ -153,6 +216,8 @@ class QuizAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'quiz_type', 'amount_questions', 'time_to_answer')
     list_filter = ('quiz_type',)
     search_fields = ('name',)
+    # Вопросов сотни тысяч — подгружаем их поиском, а не списком в форме
+    autocomplete_fields = ('questions',)
     
     def formfield_for_manytomany(self, db_field, request, **kwargs):
         if db_field.name == "questions":
@@ -162,9 +227,11 @@ class QuizAdmin(admin.ModelAdmin):
 
 
 @admin.register(PlayerToken)
-class PlayerTokenAdmin(admin.ModelAdmin):
+class PlayerTokenAdmin(LargeTableAdmin):
     list_display = ('player', 'key', 'created')
     search_fields = ('player__username', 'key')
+    list_select_related = ('player',)
+    raw_id_fields = ('player',)
 
 
 @admin.register(Team)
@@ -208,8 +275,9 @@ class ChatAdmin(admin.ModelAdmin):
 
 
 @admin.register(PlayerInChat)
-class PlayerInChatAdmin(admin.ModelAdmin):
+class PlayerInChatAdmin(LargeTableAdmin):
     list_display = ('id', 'player', 'chat', 'points', 'last_played_at')
     search_fields = ('player__username', 'player__first_name', 'player__last_name', 'chat__chat_username')
     list_filter = ('last_played_at',)
+    list_select_related = ('player', 'chat')
     raw_id_fields = ('player', 'chat')
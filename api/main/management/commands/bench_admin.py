@@ -0,0 +1,138 @@
+"""Замер времени страниц списка в админке на больших таблицах.
+
+    python manage.py bench_admin --rows 1000000 --populate
+    python manage.py bench_admin --json admin_bench.json
+    python manage.py bench_admin --cleanup
+"""
+import json
+import statistics
+import time
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from main.models import Question, QuestionUsage, Quiz
+
+
+BENCH_PREFIX = '[bench] '
+BATCH_SIZE = 10000
+
+# Страницы списка, которые открывают чаще всего: без фильтров, с фильтрами,
+# с поиском и далеко от начала
+PAGES = {
+    QuestionUsage: ['', '?use_type=dm', '?q=-1000000000007', '?p=500', '?q=столица'],
+    Question: ['', '?has_quiz=yes', '?has_quiz=no', '?question_type=text', '?game_use_type=dm&difficulty=3', '?q=столица'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Замерить страницы списка вопросов и использований вопросов в админке'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Сколько строк должно быть в каждой таблице при --populate')
+        parser.add_argument('--questions', type=int, default=None, help='Сколько тестовых вопросов создать (по умолчанию --rows)')
+        parser.add_argument('--populate', action='store_true', help='Досоздать тестовые строки до --rows')
+        parser.add_argument('--cleanup', action='store_true', help='Удалить тестовые строки и выйти')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--json', dest='json_path', default=None)
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            self.cleanup()
+            return
+        if options['populate']:
+            self.populate(options['questions'] or options['rows'], options['rows'])
+
+        factory = RequestFactory()
+        user = get_user_model()(username='bench', is_staff=True, is_superuser=True, is_active=True)
+        report = {'vendor': connection.vendor, 'rows': {}, 'pages': []}
+        self.stdout.write(f"{'страница':60} {'p50, мс':>10} {'max, мс':>10} {'запросов':>9}")
+        for model, pages in PAGES.items():
+            report['rows'][model._meta.model_name] = model.objects.count()
+            model_admin = admin.site._registry[model]
+            path = f'/admin/main/{model._meta.model_name}/'
+            for query in pages:
+                timings = []
+                for _ in range(options['repeat']):
+                    request = factory.get(path + query)
+                    request.user = user
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        model_admin.changelist_view(request).render()
+                        timings.append((time.perf_counter() - started) * 1000)
+                row = {
+                    'page': path + query,
+                    'p50_ms': round(statistics.median(timings), 1),
+                    'max_ms': round(max(timings), 1),
+                    'queries': len(queries.captured_queries),
+                }
+                report['pages'].append(row)
+                self.stdout.write(f"{row['page']:60} {row['p50_ms']:>10} {row['max_ms']:>10} {row['queries']:>9}")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    def populate(self, questions: int, rows: int):
+        """Досоздать тестовые вопросы и использования пакетами через bulk_create."""
+        existing = Question.objects.filter(text__startswith=BENCH_PREFIX).count()
+        for start in range(existing, questions, BATCH_SIZE):
+            batch = [
+                Question(
+                    text=f'{BENCH_PREFIX}Вопрос {i}: столица страны номер {i % 200}?',
+                    difficulty=i % 5 + 1,
+                    question_type=Question.QuestionTypeChoices.TEXT if i % 3 else Question.QuestionTypeChoices.VARIANT,
+                    game_use_type=Question.QuestionUseTypeChoices.DM if i % 2 else Question.QuestionUseTypeChoices.SOLO,
+                )
+                for i in range(start, min(start + BATCH_SIZE, questions))
+            ]
+            Question.objects.bulk_create(batch)
+            self.stdout.write(f'вопросов: {start + len(batch)}/{questions}')
+
+        question_ids = list(Question.objects.filter(text__startswith=BENCH_PREFIX).order_by('id').values_list('id', flat=True)[:questions])
+        if not question_ids:
+            return
+
+        # Каждый десятый вопрос — в одном из тестовых квизов
+        quiz, _ = Quiz.objects.get_or_create(name=f'{BENCH_PREFIX}квиз', defaults={'quiz_type': Quiz.QuizTypeChoices.DM})
+        Link = Quiz.questions.through
+        Link.objects.bulk_create(
+            [Link(quiz_id=quiz.id, question_id=qid) for qid in question_ids[::10]],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+        bench_usages = QuestionUsage.objects.filter(question__text__startswith=BENCH_PREFIX)
+        existing = bench_usages.count()
+        count = len(question_ids)
+        for start in range(existing, rows, BATCH_SIZE):
+            with transaction.atomic():
+                QuestionUsage.objects.bulk_create([
+                    QuestionUsage(
+                        use_type=QuestionUsage.UseType.DM if (i // count) % 2 else QuestionUsage.UseType.SOLO,
+                        context_id=-(10**12) - i // count,
+                        question_id=question_ids[i % count],
+                    )
+                    for i in range(start, min(start + BATCH_SIZE, rows))
+                ], ignore_conflicts=True)
+            self.stdout.write(f'использований: {min(start + BATCH_SIZE, rows)}/{rows}')
+
+        if connection.vendor == 'postgresql':
+            # Оценки числа строк для пагинатора берутся из статистики
+            with connection.cursor() as cursor:
+                for model in (Question, QuestionUsage):
+                    cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+    def cleanup(self):
+        """Удалить тестовые строки напрямую SQL: история и каскады Django тут не нужны."""
+        question_ids = Question.objects.filter(text__startswith=BENCH_PREFIX).values('id')
+        with transaction.atomic():
+            deleted = QuestionUsage.objects.filter(question_id__in=question_ids)._raw_delete(QuestionUsage.objects.db)
+            Quiz.questions.through.objects.filter(question_id__in=question_ids)._raw_delete(Question.objects.db)
+            questions = Question.objects.filter(text__startswith=BENCH_PREFIX)._raw_delete(Question.objects.db)
+            Quiz.objects.filter(name__startswith=BENCH_PREFIX).delete()
+        self.stdout.write(f'Удалено вопросов: {questions}, использований: {deleted}')
@@ -0,0 +1,581 @@
+"""Замер эндпоинтов API на синтетических данных.
+
+    python manage.py bench_api --populate --players 10000 --questions 50000 --chats 1000 --usages 200000
+    python manage.py bench_api --repeat 30 --concurrency 8 --json api_bench.json
+    python manage.py bench_api --baseline api_bench.json --threshold 0.25   # код выхода 1 при регрессии
+    python manage.py bench_api --url http://127.0.0.1:8000 --concurrency 32  # запущенный сервер (uvicorn botapi.asgi:application)
+    python manage.py bench_api --cleanup
+
+По умолчанию запросы идут через тестовый клиент Django в этом процессе: для
+каждого маршрута считаются задержки (p50/p95/p99), число SQL-запросов и
+время в базе, а по первому успешному запросу — план каждого SELECT: сколько
+строк прочитано (PostgreSQL) и какие таблицы просмотрены целиком. С --url
+запросы идут по HTTP к живому серверу, и считаются только задержки.
+Пишущие маршруты с --concurrency больше 1 имеет смысл мерить на PostgreSQL:
+SQLite пускает одного писателя, и часть запросов упрётся в блокировку базы.
+"""
+import json
+import logging
+import os
+import platform
+import queue
+import statistics
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from main.models import (
+    BotText, Chat, PlanTeamQuiz, PlayerInChat, PlayerToken, Question, QuestionAnswer,
+    QuestionUsage, Quiz, Team, TelegramPlayer, Topic,
+)
+from main.querystats import QueryRecorder, explain
+
+
+BENCH_PREFIX = '[bench-api] '
+BENCH_NAME = 'bench_api_'
+PLAYER_ID_BASE = 7 * 10**12
+CHAT_ID_BASE = -3 * 10**12
+BATCH_SIZE = 5000
+TOKENS = 100
+PLAYERS_PER_CHAT = 20
+TOPICS = 10
+BOT_TEXTS = 50
+USAGES_PER_CONTEXT = 50
+
+
+@dataclass
+class Route:
+    """Маршрут из botapi/urls.py и то, как построить к нему i-й запрос."""
+    name: str
+    method: str
+    path: Callable[[dict, int], str]
+    auth: str = 'none'  # none | player | system | staff
+    body: Callable[[dict, int], object] | None = None
+
+
+def _pick(items: list, i: int):
+    return items[i % len(items)]
+
+
+ROUTES = [
+    Route('POST auth/player/', 'post', lambda d, i: '/auth/player/', body=lambda d, i: {
+        'telegram_id': PLAYER_ID_BASE + i % d['players'], 'first_name': 'Bench', 'username': f'{BENCH_NAME}{i % d["players"]}',
+    }),
+    Route('GET quiz/game/<quiz_type>/', 'get', lambda d, i: f'/quiz/game/{_pick(["solo", "dm", "team"], i)}/'),
+    Route('GET quiz/list/<quiz_type>/', 'get', lambda d, i: f'/quiz/list/{_pick(["solo", "dm", "team"], i)}/'),
+    Route('GET question/list/', 'get', lambda d, i: f"/question/list/?quiz_id={d['team_quiz']}", 'player'),
+    Route('GET question/list/?team_id', 'get', lambda d, i: f"/question/list/?quiz_id={d['team_quiz']}&team_id={_pick(d['teams'], i)}", 'player'),
+    Route('POST question/rotated/ dm', 'post', lambda d, i: '/question/rotated/', 'system', lambda d, i: {
+        'use_type': 'dm', 'context_id': _pick(d['chats'], i), 'size': 10, 'time_to_answer': 30,
+    }),
+    Route('POST question/rotated/ solo', 'post', lambda d, i: '/question/rotated/', 'system', lambda d, i: {
+        'use_type': 'solo', 'context_id': PLAYER_ID_BASE + i % d['players'], 'size': 10, 'time_to_answer': 10,
+    }),
+    Route('POST question/rotated/ mix', 'post', lambda d, i: '/question/rotated/', 'system', lambda d, i: {
+        'use_type': 'dm', 'context_id': _pick(d['chats'], i), 'time_to_answer': 30,
+        'topic_ids': d['topics'][:3], 'difficulty_mix': {'1': 3, '2': 5, '3': 2},
+    }),
+    Route('GET question/search/', 'get', lambda d, i: f"/question/search/?q={_pick(['столица', 'река', 'вопрос номер'], i)}", 'staff'),
+    Route('GET team/<chat_username>/', 'get', lambda d, i: f"/team/{_pick(d['team_chats'], i)}/", 'player'),
+    Route('GET game/plan-game/list/<chat_username>/', 'get', lambda d, i: f"/game/plan-game/list/{_pick(d['team_chats'], i)}/", 'player'),
+    Route('POST player/game-end/', 'post', lambda d, i: '/player/game-end/', 'system', lambda d, i: {'results': [
+        {'username': f'{BENCH_NAME}{(i * 5 + k) % d["players"]}', 'points': k, 'chat_id': _pick(d['chats'], i)}
+        for k in range(5)
+    ]}),
+    Route('POST team/game-end/<team_id>/', 'post', lambda d, i: f"/team/game-end/{_pick(d['teams'], i)}/", 'system',
+          lambda d, i: {'points': 3, 'plan_team_quiz_id': _pick(d['plans'], i)}),
+    Route('PATCH player/<telegram_id>/', 'patch', lambda d, i: f'/player/{PLAYER_ID_BASE + i % d["players"]}/',
+          body=lambda d, i: {'notification_is_on': bool(i % 2)}),
+    Route('GET player/leaderboard/', 'get', lambda d, i: '/player/leaderboard/', 'player'),
+    Route('POST player/leaderboard/', 'post', lambda d, i: '/player/leaderboard/', 'player', lambda d, i: {
+        'usernames': [f'{BENCH_NAME}{(i + k) % d["players"]}' for k in range(20)],
+        'current_user_username': f'{BENCH_NAME}{i % d["players"]}',
+    }),
+    Route('GET player/total-points/<username>/', 'get', lambda d, i: f'/player/total-points/{BENCH_NAME}{i % d["players"]}/'),
+    Route('POST player/list/total-points/', 'post', lambda d, i: '/player/list/total-points/', 'system',
+          lambda d, i: {'usernames': [f'{BENCH_NAME}{(i + k) % d["players"]}' for k in range(20)]}),
+    Route('POST player/list/chat-points/', 'post', lambda d, i: '/player/list/chat-points/', 'system', lambda d, i: {
+        'chat_id': _pick(d['chats'], i), 'usernames': [f'{BENCH_NAME}{(i + k) % d["players"]}' for k in range(20)],
+    }),
+    Route('GET team/leaderboard/<chat_username>/', 'get', lambda d, i: f"/team/leaderboard/{_pick(d['team_chats'], i)}/", 'player'),
+    Route('GET chat/<chat_id>/leaderboard/', 'get', lambda d, i: f"/chat/{_pick(d['chats'], i)}/leaderboard/", 'system'),
+    Route('GET player/notify-list/', 'get', lambda d, i: '/player/notify-list/'),
+    Route('GET bot-texts/', 'get', lambda d, i: '/bot-texts/', 'system'),
+    Route('POST bot-texts/bulk-upsert/', 'post', lambda d, i: '/bot-texts/bulk-upsert/', 'system', lambda d, i: {'texts': [
+        {'text_name': f'{BENCH_NAME}text_{(i + k) % BOT_TEXTS}', 'unformatted_text': f'Текст {i}'} for k in range(10)
+    ]}),
+    Route('GET bulk-import-questions/', 'get', lambda d, i: '/bulk-import-questions/', 'staff'),
+    Route('POST question/<question_id>/like/', 'post', lambda d, i: f"/question/{_pick(d['questions'], i)}/like/", 'player'),
+    Route('POST question/<question_id>/dislike/', 'post', lambda d, i: f"/question/{_pick(d['questions'], i)}/dislike/", 'player'),
+    Route('POST chat/register/', 'post', lambda d, i: '/chat/register/', 'system', lambda d, i: {
+        'chat_id': _pick(d['chats'], i), 'chat_username': f'{BENCH_NAME}chat_{d["chats"].index(_pick(d["chats"], i))}',
+    }),
+    Route('GET teams/', 'get', lambda d, i: '/teams/', 'player'),
+    Route('GET teams/<pk>/', 'get', lambda d, i: f"/teams/{_pick(d['teams'], i)}/", 'player'),
+    Route('GET configs/', 'get', lambda d, i: '/configs/', 'system'),
+]
+
+
+def percentile(sorted_values: list[float], share: float) -> float:
+    """Перцентиль с линейной интерполяцией, как statistics.quantiles(method='inclusive')."""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = (len(sorted_values) - 1) * share
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class Command(BaseCommand):
+    help = 'Замерить задержки и SQL всех эндпоинтов API на синтетических данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=10_000)
+        parser.add_argument('--questions', type=int, default=20_000)
+        parser.add_argument('--chats', type=int, default=1_000)
+        parser.add_argument('--usages', type=int, default=100_000, help='Строк истории использования вопросов')
+        parser.add_argument('--populate', action='store_true', help='Досоздать тестовые данные до заданных размеров')
+        parser.add_argument('--cleanup', action='store_true', help='Удалить тестовые данные и выйти')
+        parser.add_argument('--repeat', type=int, default=20, help='Запросов на каждый маршрут')
+        parser.add_argument('--concurrency', type=int, default=1, help='Параллельных клиентов')
+        parser.add_argument('--only', default=None, help='Только маршруты, чьё имя содержит одну из подстрок через запятую')
+        parser.add_argument('--url', default=None, help='Адрес запущенного сервера вместо тестового клиента')
+        parser.add_argument('--no-explain', action='store_true', help='Не разбирать планы запросов')
+        parser.add_argument('--json', dest='json_path', default=None)
+        parser.add_argument('--baseline', default=None, help='JSON прошлого прогона для сравнения')
+        parser.add_argument('--threshold', type=float, default=0.25, help='Допустимое замедление p50 относительно базы (0.25 = +25%%)')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            self.cleanup()
+            return
+        if options['populate']:
+            self.populate(options['players'], options['questions'], options['chats'], options['usages'])
+
+        data = self.load_dataset()
+        if data is None:
+            self.stderr.write('Тестовых данных нет — запустите с --populate')
+            return
+
+        if not (os.getenv('BOT_SYSTEM_TOKEN') or os.getenv('BOT_TOKEN')):
+            if options['url']:
+                self.stderr.write('Для --url нужен BOT_SYSTEM_TOKEN или BOT_TOKEN сервера')
+                return
+            os.environ['BOT_SYSTEM_TOKEN'] = f'{BENCH_NAME}system'
+
+        patterns = [p for p in (options['only'] or '').split(',') if p]
+        routes = [route for route in ROUTES if not patterns or any(p in route.name for p in patterns)]
+        if options['url']:
+            # Сессия администратора есть только у тестового клиента
+            routes = [route for route in routes if route.auth != 'staff']
+
+        # Ошибки маршрутов попадают в отчёт; трейсбеки django.request в таблице — шум
+        request_logger = logging.getLogger('django.request')
+        previous_level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            results = self.run_routes(routes, data, options)
+        finally:
+            request_logger.setLevel(previous_level)
+
+        report = {
+            'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'vendor': connection.vendor,
+            'mode': 'http' if options['url'] else 'client',
+            'config': {key: options[key] for key in ('repeat', 'concurrency', 'url', 'only')},
+            'dataset': data['counts'],
+            'results': results,
+        }
+
+        exit_code = 0
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)
+            rows = compare(results, baseline.get('results', {}), options['threshold'])
+            self.print_comparison(rows, options['threshold'])
+            report['comparison'] = {'baseline': options['baseline'], 'threshold': options['threshold'], 'rows': rows}
+            regressions = [row['route'] for row in rows if row['regression']]
+            if regressions:
+                self.stdout.write(f"\nРегрессии: {', '.join(regressions)}")
+                exit_code = 1
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        if exit_code:
+            raise SystemExit(exit_code)
+
+    # --- прогон ---
+
+    def run_routes(self, routes: list[Route], data: dict, options: dict) -> dict:
+        results = {}
+        self.stdout.write(
+            f"{'маршрут':46} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'запросов':>9} {'строк':>9} {'без инд.':>9} {'ошибок':>7}"
+        )
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for route in routes:
+                results[route.name] = row = self.run_route(route, data, options)
+                self.stdout.write(
+                    f"{route.name:46} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} "
+                    f"{_dash(row['queries_p50']):>9} {_dash(row['rows_scanned']):>9} "
+                    f"{_dash(None if row['full_scans'] is None else len(row['full_scans'])):>9} {row['errors']:>7}"
+                )
+                if row['error_sample']:
+                    self.stdout.write(f"    {row['error_sample'][:150]}")
+        return results
+
+    def run_route(self, route: Route, data: dict, options: dict) -> dict:
+        jobs = queue.Queue()
+        for i in range(options['repeat']):
+            jobs.put(i)
+        samples = []
+        lock = threading.Lock()
+
+        def worker():
+            send = self.http_sender(options['url'], data) if options['url'] else self.client_sender(data)
+            try:
+                while True:
+                    try:
+                        i = jobs.get_nowait()
+                    except queue.Empty:
+                        return
+                    sample = send(route, i)
+                    with lock:
+                        samples.append(sample)
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(max(1, options['concurrency']))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        latencies = sorted(sample['ms'] for sample in samples)
+        counted = sorted(sample['queries'] for sample in samples if sample['queries'] is not None)
+        db_times = sorted(sample['db_ms'] for sample in samples if sample['db_ms'] is not None)
+        statuses = {}
+        for sample in samples:
+            statuses[str(sample['status'])] = statuses.get(str(sample['status']), 0) + 1
+
+        plans = {'rows_scanned': None, 'full_scans': None}
+        first_ok = next((s for s in samples if s['sql'] and 200 <= s['status'] < 400), None)
+        if first_ok is not None and not options['no_explain']:
+            plans = self.explain_queries(first_ok['sql'])
+
+        return {
+            'requests': len(samples),
+            'errors': sum(1 for sample in samples if sample['status'] >= 500),
+            'error_sample': next((sample['error'] for sample in samples if sample['error']), None),
+            'statuses': statuses,
+            'rps': round(len(samples) / wall, 1) if wall else None,
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'max_ms': round(latencies[-1], 2),
+            'queries_p50': round(statistics.median(counted)) if counted else None,
+            'queries_max': counted[-1] if counted else None,
+            'db_ms_p50': round(statistics.median(db_times), 2) if db_times else None,
+            **plans,
+        }
+
+    def client_sender(self, data: dict):
+        client = Client(raise_request_exception=False)
+        system_token = os.getenv('BOT_SYSTEM_TOKEN') or os.getenv('BOT_TOKEN')
+        staff = get_user_model().objects.get(username=f'{BENCH_NAME}staff')
+        client.force_login(staff)
+
+        def send(route: Route, i: int) -> dict:
+            headers = self.auth_headers(route, data, i, system_token)
+            body = route.body(data, i) if route.body else None
+            recorder = QueryRecorder()
+            with connection.execute_wrapper(recorder):
+                started = time.perf_counter()
+                call = getattr(client, route.method)
+                if body is None:
+                    response = call(route.path(data, i), headers=headers)
+                else:
+                    response = call(route.path(data, i), json.dumps(body), content_type='application/json', headers=headers)
+                ms = (time.perf_counter() - started) * 1000
+            error = None
+            if getattr(response, 'exc_info', None):
+                error = f'{response.exc_info[0].__name__}: {response.exc_info[1]}'
+            return {
+                'ms': ms,
+                'status': response.status_code,
+                'error': error,
+                'queries': recorder.count,
+                'db_ms': recorder.total_ms,
+                'sql': [(q.sql, q.params) for q in recorder.queries if q.is_select],
+            }
+        return send
+
+    def http_sender(self, base_url: str, data: dict):
+        import requests
+
+        session = requests.Session()
+        system_token = os.getenv('BOT_SYSTEM_TOKEN') or os.getenv('BOT_TOKEN')
+
+        def send(route: Route, i: int) -> dict:
+            headers = self.auth_headers(route, data, i, system_token)
+            body = route.body(data, i) if route.body else None
+            started = time.perf_counter()
+            try:
+                response = session.request(route.method.upper(), base_url.rstrip('/') + route.path(data, i), json=body, headers=headers, timeout=30)
+                code = response.status_code
+            except requests.RequestException:
+                code = 599
+            return {'ms': (time.perf_counter() - started) * 1000, 'status': code, 'error': None, 'queries': None, 'db_ms': None, 'sql': None}
+        return send
+
+    @staticmethod
+    def auth_headers(route: Route, data: dict, i: int, system_token: str) -> dict:
+        if route.auth == 'player':
+            return {'Authorization': f"Token {_pick(data['tokens'], i)}"}
+        if route.auth == 'system':
+            return {'Authorization': f'Token {system_token}'}
+        return {}
+
+    @staticmethod
+    def explain_queries(queries: list) -> dict:
+        """Сумма прочитанных строк и таблицы без индекса по всем SELECT одного запроса."""
+        rows_scanned = 0
+        full_scans = set()
+        analyze = connection.vendor == 'postgresql'
+        for sql, params in queries:
+            try:
+                # EXPLAIN ANALYZE выполняет запрос — в откатываемой транзакции
+                with transaction.atomic():
+                    plan = explain(connection, sql, params, analyze=analyze)
+                    transaction.set_rollback(True)
+            except Exception:
+                continue
+            if plan is None:
+                continue
+            rows_scanned += plan['rows_scanned'] or 0
+            full_scans.update(name for name in plan['full_scans'] if name)
+        return {'rows_scanned': rows_scanned if analyze else None, 'full_scans': sorted(full_scans)}
+
+    def print_comparison(self, rows: list[dict], threshold: float):
+        self.stdout.write(f"\nСравнение с базой (порог +{threshold:.0%}):")
+        self.stdout.write(f"{'маршрут':46} {'база p50':>9} {'p50':>9} {'x':>6} {'запросов':>13}")
+        for row in rows:
+            mark = '  РЕГРЕССИЯ' if row['regression'] else ''
+            queries = f"{_dash(row['baseline_queries'])} -> {_dash(row['current_queries'])}"
+            self.stdout.write(
+                f"{row['route']:46} {row['baseline_p50_ms']:>9} {row['current_p50_ms']:>9} {row['ratio']:>6.2f} {queries:>13}{mark}"
+            )
+
+    # --- данные ---
+
+    def load_dataset(self) -> dict | None:
+        players = TelegramPlayer.objects.filter(username__startswith=BENCH_NAME).count()
+        if not players:
+            return None
+        chats = list(Chat.objects.filter(chat_id__lte=CHAT_ID_BASE).order_by('-chat_id').values_list('chat_id', flat=True))
+        teams = Team.objects.filter(chat_username__startswith=f'@{BENCH_NAME}').order_by('id')
+        quizzes = dict(Quiz.objects.filter(name__startswith=BENCH_PREFIX).values_list('quiz_type', 'id'))
+        return {
+            'players': players,
+            'chats': chats,
+            'teams': list(teams.values_list('id', flat=True)),
+            'team_chats': list(teams.values_list('chat_username', flat=True)),
+            'team_quiz': quizzes.get(Quiz.QuizTypeChoices.TEAM),
+            'plans': list(PlanTeamQuiz.objects.filter(quiz_id__in=quizzes.values()).values_list('id', flat=True)),
+            'topics': list(Topic.objects.filter(name__startswith=BENCH_PREFIX).order_by('id').values_list('id', flat=True)),
+            'questions': list(Question.objects.filter(text__startswith=BENCH_PREFIX).order_by('id').values_list('id', flat=True)[:1000]),
+            'tokens': list(PlayerToken.objects.filter(player__username__startswith=BENCH_NAME).values_list('key', flat=True)),
+            'counts': {
+                'players': players,
+                'chats': len(chats),
+                'teams': teams.count(),
+                'questions': Question.objects.count(),
+                'question_usages': QuestionUsage.objects.count(),
+                'player_in_chat': PlayerInChat.objects.count(),
+            },
+        }
+
+    def populate(self, players: int, questions: int, chats: int, usages: int):
+        """Досоздать тестовые данные пакетами через bulk_create."""
+        existing = TelegramPlayer.objects.filter(username__startswith=BENCH_NAME).count()
+        for start in range(existing, players, BATCH_SIZE):
+            TelegramPlayer.objects.bulk_create([
+                TelegramPlayer(
+                    telegram_id=PLAYER_ID_BASE + i, first_name=f'Игрок {i}', username=f'{BENCH_NAME}{i}',
+                    total_xp=(i * 7919) % 10_000, notification_is_on=i % 3 == 0,
+                )
+                for i in range(start, min(start + BATCH_SIZE, players))
+            ])
+            self.stdout.write(f'игроков: {min(start + BATCH_SIZE, players)}/{players}')
+        for player in TelegramPlayer.objects.filter(username__startswith=BENCH_NAME, auth_token__isnull=True).order_by('id')[:TOKENS]:
+            PlayerToken.objects.create(player=player)
+
+        existing = Chat.objects.filter(chat_id__lte=CHAT_ID_BASE).count()
+        Chat.objects.bulk_create([
+            Chat(chat_id=CHAT_ID_BASE - i, chat_username=f'{BENCH_NAME}chat_{i}')
+            for i in range(existing, chats)
+        ], batch_size=BATCH_SIZE)
+        chat_rows = list(Chat.objects.filter(chat_id__lte=CHAT_ID_BASE).order_by('-chat_id').values_list('id', flat=True))
+        player_ids = list(TelegramPlayer.objects.filter(username__startswith=BENCH_NAME).order_by('id').values_list('id', flat=True))
+        if not player_ids:
+            return
+
+        # Каждый второй чат — чат команды; капитан — очередной игрок
+        Team.objects.bulk_create([
+            Team(name=f'{BENCH_PREFIX}Команда {i}', chat_username=f'@{BENCH_NAME}chat_{i}',
+                 captain_id=player_ids[i % len(player_ids)], total_scores=(i * 31) % 500)
+            for i in range(0, len(chat_rows), 2)
+        ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+        PlayerInChat.objects.bulk_create([
+            PlayerInChat(player_id=player_ids[(idx * PLAYERS_PER_CHAT + k) % len(player_ids)], chat_id=chat_pk, points=(idx + k) % 50)
+            for idx, chat_pk in enumerate(chat_rows) for k in range(min(PLAYERS_PER_CHAT, len(player_ids)))
+        ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+        topics = list(Topic.objects.filter(name__startswith=BENCH_PREFIX).order_by('id'))
+        if not topics:
+            topics = Topic.objects.bulk_create([Topic(name=f'{BENCH_PREFIX}тема {i}') for i in range(TOPICS)])
+        existing = Question.objects.filter(text__startswith=BENCH_PREFIX).count()
+        for start in range(existing, questions, BATCH_SIZE):
+            batch = Question.objects.bulk_create([
+                Question(
+                    text=f'{BENCH_PREFIX}Вопрос номер {i}: какая столица и какая река у страны {i % 300}?',
+                    difficulty=i % 3 + 1,
+                    question_type=Question.QuestionTypeChoices.VARIANT if i % 2 else Question.QuestionTypeChoices.TEXT,
+                    game_use_type=Question.QuestionUseTypeChoices.DM if i % 2 else Question.QuestionUseTypeChoices.SOLO,
+                )
+                for i in range(start, min(start + BATCH_SIZE, questions))
+            ])
+            batch_ids = [q.id for q in batch] if batch and batch[0].id else list(
+                Question.objects.filter(text__startswith=BENCH_PREFIX).order_by('-id').values_list('id', flat=True)[:len(batch)]
+            )
+            QuestionAnswer.objects.bulk_create([
+                QuestionAnswer(question_id=qid, text=f'Ответ {qid}-{k}', is_right=k == 0)
+                for qid in batch_ids for k in range(3)
+            ])
+            Question.topics.through.objects.bulk_create([
+                Question.topics.through(question_id=qid, topic_id=topics[qid % len(topics)].id) for qid in batch_ids
+            ])
+            self.stdout.write(f'вопросов: {min(start + BATCH_SIZE, questions)}/{questions}')
+        question_ids = list(Question.objects.filter(text__startswith=BENCH_PREFIX).order_by('id').values_list('id', flat=True))
+        if not question_ids:
+            return
+
+        quizzes = {}
+        for quiz_type in Quiz.QuizTypeChoices.values:
+            quizzes[quiz_type], _ = Quiz.objects.get_or_create(
+                name=f'{BENCH_PREFIX}{quiz_type}', defaults={'quiz_type': quiz_type, 'amount_questions': 10, 'time_to_answer': 30},
+            )
+        team_quiz = quizzes[Quiz.QuizTypeChoices.TEAM]
+        Quiz.questions.through.objects.bulk_create(
+            [Quiz.questions.through(quiz_id=team_quiz.id, question_id=qid) for qid in question_ids[::5]],
+            batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+        if not PlanTeamQuiz.objects.filter(quiz=team_quiz).exists():
+            now = timezone.now()
+            for days, always_active in ((0, True), (1, False), (7, False)):
+                PlanTeamQuiz.objects.create(
+                    quiz=team_quiz, scheduled_datetime=now + timedelta(days=days),
+                    always_active=always_active, send_notification=False,
+                )
+
+        # История использования: каждому контексту — серия из USAGES_PER_CONTEXT
+        # вопросов подряд; контексты по очереди DM-чаты и SOLO-игроки
+        chat_ids = list(Chat.objects.filter(chat_id__lte=CHAT_ID_BASE).values_list('chat_id', flat=True))
+        bench_usages = QuestionUsage.objects.filter(question_id__in=Question.objects.filter(text__startswith=BENCH_PREFIX).values('id'))
+        existing = bench_usages.count()
+        for start in range(existing, usages, BATCH_SIZE):
+            batch = []
+            for i in range(start, min(start + BATCH_SIZE, usages)):
+                context, offset = divmod(i, USAGES_PER_CONTEXT)
+                is_dm = context % 2 and chat_ids
+                batch.append(QuestionUsage(
+                    use_type=QuestionUsage.UseType.DM if is_dm else QuestionUsage.UseType.SOLO,
+                    context_id=chat_ids[context // 2 % len(chat_ids)] if is_dm else PLAYER_ID_BASE + context // 2 % len(player_ids),
+                    question_id=question_ids[(context * 131 + offset) % len(question_ids)],
+                ))
+            QuestionUsage.objects.bulk_create(batch, ignore_conflicts=True)
+            self.stdout.write(f'использований: {min(start + BATCH_SIZE, usages)}/{usages}')
+
+        BotText.objects.bulk_create([
+            BotText(text_name=f'{BENCH_NAME}text_{i}', unformatted_text=f'Текст {i}') for i in range(BOT_TEXTS)
+        ], ignore_conflicts=True)
+        User = get_user_model()
+        if not User.objects.filter(username=f'{BENCH_NAME}staff').exists():
+            User.objects.create_user(f'{BENCH_NAME}staff', is_staff=True, is_superuser=True)
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def cleanup(self):
+        """Удалить тестовые данные напрямую SQL: история и каскады Django тут не нужны."""
+        players = TelegramPlayer.objects.filter(username__startswith=BENCH_NAME)
+        questions = Question.objects.filter(text__startswith=BENCH_PREFIX)
+        quizzes = Quiz.objects.filter(name__startswith=BENCH_PREFIX)
+        chats = Chat.objects.filter(chat_id__lte=CHAT_ID_BASE)
+        teams = Team.objects.filter(captain__in=players.values('id'))
+        db = Question.objects.db
+        with transaction.atomic():
+            PlanTeamQuiz.teams_played.through.objects.filter(team_id__in=teams.values('id'))._raw_delete(db)
+            plans = PlanTeamQuiz.objects.filter(quiz__in=quizzes.values('id'))
+            PlanTeamQuiz.teams_played.through.objects.filter(planteamquiz_id__in=plans.values('id'))._raw_delete(db)
+            plans._raw_delete(db)
+            Quiz.questions.through.objects.filter(quiz_id__in=quizzes.values('id'))._raw_delete(db)
+            Quiz.questions.through.objects.filter(question_id__in=questions.values('id'))._raw_delete(db)
+            quizzes._raw_delete(db)
+            usages = QuestionUsage.objects.filter(question_id__in=questions.values('id'))._raw_delete(db)
+            QuestionAnswer.objects.filter(question_id__in=questions.values('id'))._raw_delete(db)
+            Question.topics.through.objects.filter(question_id__in=questions.values('id'))._raw_delete(db)
+            deleted_questions = questions._raw_delete(db)
+            Topic.objects.filter(name__startswith=BENCH_PREFIX)._raw_delete(db)
+            PlayerInChat.objects.filter(player_id__in=players.values('id'))._raw_delete(db)
+            PlayerInChat.objects.filter(chat_id__in=chats.values('id'))._raw_delete(db)
+            teams._raw_delete(db)
+            Team.objects.filter(chat_username__startswith=f'@{BENCH_NAME}')._raw_delete(db)
+            chats._raw_delete(db)
+            PlayerToken.objects.filter(player_id__in=players.values('id'))._raw_delete(db)
+            deleted_players = players._raw_delete(db)
+            BotText.objects.filter(text_name__startswith=BENCH_NAME)._raw_delete(db)
+            get_user_model().objects.filter(username=f'{BENCH_NAME}staff').delete()
+        self.stdout.write(f'Удалено игроков: {deleted_players}, вопросов: {deleted_questions}, использований: {usages}')
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[dict]:
+    """Сравнить p50 и число запросов с базой; регрессия — медленнее порога или больше SQL."""
+    rows = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base or not base.get('p50_ms'):
+            continue
+        ratio = current['p50_ms'] / base['p50_ms']
+        more_queries = (
+            current.get('queries_max') is not None and base.get('queries_max') is not None
+            and current['queries_max'] > base['queries_max']
+        )
+        rows.append({
+            'route': name,
+            'baseline_p50_ms': base['p50_ms'],
+            'current_p50_ms': current['p50_ms'],
+            'ratio': round(ratio, 3),
+            'baseline_queries': base.get('queries_max'),
+            'current_queries': current.get('queries_max'),
+            'regression': ratio > 1 + threshold or more_queries,
+        })
+    return rows
+
+
+def _dash(value) -> str:
+    return '-' if value is None else str(value)
@@ -0,0 +1,216 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+
+from .profiling import CProfiler, StackSampler
+from .querystats import QueryRecorder, SqlStats, explain, normalize_sql
+
+
+_REGEX_GROUP = re.compile(r'\(\?P<(\w+)>[^)]*\)')
+# trace_id и span_id от бота — hex из tracing.py
+_TRACE_ID = re.compile(r'^[0-9a-f]{1,32}$')
+
+
+def endpoint_name(request) -> str:
+    # Шаблон маршрута, а не путь: /player/42/ и /player/43/ — один эндпоинт
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return f'{request.method} (unresolved)'
+    # Маршруты роутера DRF — регулярные выражения: ^teams/(?P<pk>[^/.]+)/$ -> teams/<pk>/
+    route = _REGEX_GROUP.sub(r'<\1>', match.route).lstrip('^').rstrip('$')
+    return f'{request.method} /{route}'
+
+
+def _record_queries(get_response, request):
+    """Выполнить запрос, записывая SQL всех соединений: (ответ, {alias: QueryRecorder})."""
+    recorders = {}
+    with ExitStack() as stack:
+        for connection in connections.all():
+            recorder = recorders[connection.alias] = QueryRecorder()
+            stack.enter_context(connection.execute_wrapper(recorder))
+        response = get_response(request)
+    return response, recorders
+
+
+def _merge(recorders: dict[str, QueryRecorder]) -> QueryRecorder:
+    merged = QueryRecorder()
+    for recorder in recorders.values():
+        merged.queries.extend(recorder.queries)
+    return merged
+
+
+# Статистика этого процесса; у каждого воркера gunicorn — своя
+sql_stats = SqlStats(top=settings.SQL_TOP_QUERIES)
+
+
+class SqlInstrumentationMiddleware:
+    """Учёт SQL по эндпоинтам: число запросов, время в базе, самые медленные.
+
+    Включается настройкой SQL_INSTRUMENTATION. Запросы медленнее
+    SQL_SLOW_QUERY_MS с вероятностью SQL_EXPLAIN_SAMPLE_RATE разбираются
+    через EXPLAIN (без ANALYZE — запрос второй раз не выполняется).
+    Сотрудникам итог запроса приходит в заголовках X-SQL-*, накопленная
+    статистика — на /debug/sql-stats/ (SqlStatsView).
+    """
+
+    def __init__(self, get_response):
+        if not settings.SQL_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Проверяем до вьюхи: аутентификация DRF по токену подменит request.user
+        is_staff = getattr(getattr(request, 'user', None), 'is_staff', False)
+        response, recorders = _record_queries(self.get_response, request)
+        recorder = _merge(recorders)
+        sql_stats.add(endpoint_name(request), recorder, self._sample_plans(recorders))
+
+        if is_staff:
+            response['X-SQL-Queries'] = str(recorder.count)
+            response['X-SQL-Time-ms'] = f'{recorder.total_ms:.1f}'
+            slowest = recorder.slowest(1)
+            if slowest:
+                response['X-SQL-Slowest-ms'] = f'{slowest[0].duration_ms:.1f}'
+        return response
+
+    @staticmethod
+    def _sample_plans(recorders: dict[str, QueryRecorder]) -> dict[str, object]:
+        plans = {}
+        for alias, recorder in recorders.items():
+            for query in recorder.queries:
+                if query.duration_ms < settings.SQL_SLOW_QUERY_MS or not query.is_select:
+                    continue
+                if random.random() >= settings.SQL_EXPLAIN_SAMPLE_RATE:
+                    continue
+                try:
+                    plan = explain(connections[alias], query.sql, query.params)
+                except Exception as e:
+                    plan = {'error': str(e)}
+                if plan is not None:
+                    plans[normalize_sql(query.sql)] = plan
+        return plans
+
+
+class ProfilingMiddleware:
+    """Профилирование одного запроса по флагу сотрудника.
+
+    Включается настройкой REQUEST_PROFILING; без неё middleware не
+    подключается вовсе. Запрос профилируется, если сотрудник передал
+    заголовок X-Profile или параметр ?_profile= со значением cprofile или
+    sample (сэмплирование стека). По умолчанию результат сохраняется в
+    MEDIA_ROOT/profiles/ (.prof для cProfile, .collapsed для flame graph),
+    а путь приходит в заголовке X-Profile-File; с X-Profile-Output: table
+    (?_profile_output=table) вместо ответа вьюхи возвращается таблица
+    PROFILING_TOP самых тяжёлых функций.
+    """
+
+    PROFILERS = {'cprofile', 'sample'}
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # cProfile и сэмплер — по одному запросу на процесс, остальные идут без профиля
+        self._busy = threading.Lock()
+
+    def __call__(self, request):
+        mode = request.headers.get('X-Profile') or request.GET.get('_profile')
+        if (
+            mode not in self.PROFILERS
+            or not getattr(getattr(request, 'user', None), 'is_staff', False)
+            or not self._busy.acquire(blocking=False)
+        ):
+            return self.get_response(request)
+        try:
+            return self._profile(request, mode)
+        finally:
+            self._busy.release()
+
+    def _profile(self, request, mode: str):
+        if mode == 'sample':
+            profiler = StackSampler(threading.get_ident(), settings.PROFILING_SAMPLE_INTERVAL_MS / 1000)
+        else:
+            profiler = CProfiler()
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        output = request.headers.get('X-Profile-Output') or request.GET.get('_profile_output')
+        if output == 'table':
+            header = f'{request.method} {request.get_full_path()} -> {response.status_code}, {elapsed_ms:.1f} мс ({mode})\n\n'
+            return HttpResponse(header + profiler.table(settings.PROFILING_TOP), content_type='text/plain; charset=utf-8')
+
+        # Имя не угадать: MEDIA_ROOT может раздаваться веб-сервером
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex}.{profiler.extension}'
+        directory = os.path.join(settings.MEDIA_ROOT, 'profiles')
+        os.makedirs(directory, exist_ok=True)
+        profiler.write(os.path.join(directory, name))
+        response['X-Profile-File'] = f'{settings.MEDIA_URL}profiles/{name}'
+        response['X-Profile-Time-ms'] = f'{elapsed_ms:.1f}'
+        return response
+
+
+class TracingMiddleware:
+    """Span запроса из бота с временем в базе (пара к bot/tracing.py).
+
+    Запрос с заголовком X-Trace-Id пишется строкой JSON в API_TRACE_FILE:
+    эндпоинт, статус, время, число SQL-запросов и время в базе; родитель —
+    span вызова api_client из X-Parent-Span-Id. Водопад по файлам бота и API
+    строит python tracing.py в каталоге бота. Без API_TRACE_FILE middleware
+    не подключается.
+    """
+
+    def __init__(self, get_response):
+        if not settings.API_TRACE_FILE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(settings.API_TRACE_FILE)), exist_ok=True)
+
+    def __call__(self, request):
+        trace_id = request.headers.get('X-Trace-Id', '')
+        if not _TRACE_ID.match(trace_id):
+            return self.get_response(request)
+        parent_id = request.headers.get('X-Parent-Span-Id', '')
+        started_at = time.time()
+        started = time.perf_counter()
+        response, recorders = _record_queries(self.get_response, request)
+        duration_ms = (time.perf_counter() - started) * 1000
+        recorder = _merge(recorders)
+        record = {
+            'trace_id': trace_id,
+            'span_id': uuid.uuid4().hex[:16],
+            'parent_id': parent_id if _TRACE_ID.match(parent_id) else None,
+            'service': 'api',
+            'name': endpoint_name(request),
+            'start': round(started_at, 6),
+            'duration_ms': round(duration_ms, 3),
+            'attrs': {
+                'path': request.path,
+                'status': response.status_code,
+                'queries': recorder.count,
+                'db_ms': round(recorder.total_ms, 3),
+                'pid': os.getpid(),
+            },
+        }
+        try:
+            with self._lock, open(settings.API_TRACE_FILE, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f'TracingMiddleware: не удалось записать span в {settings.API_TRACE_FILE}: {e}')
+        response['X-Trace-Id'] = trace_id
+        return response
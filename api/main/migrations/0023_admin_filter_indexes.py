@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0022_alter_chat_chat_username'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['question_type', 'id'], name='main_questi_questio_6dd8ed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['game_use_type', 'id'], name='main_questi_game_us_287c9c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['difficulty', 'id'], name='main_questi_difficu_3bffe7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionanswer',
+            index=models.Index(fields=['is_right', 'id'], name='main_questi_is_righ_ce96c5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionusage',
+            index=models.Index(fields=['use_type', 'id'], name='main_questi_use_typ_291037_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionusage',
+            index=models.Index(fields=['context_id'], name='main_questi_context_82087a_idx'),
+        ),
+    ]
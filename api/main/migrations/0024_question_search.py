@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from main import search
+
+
+def install_search(apps, schema_editor):
+    search.install(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0023_admin_filter_indexes'),
+    ]
+
+    operations = [
+        # Поисковый индекс живёт вне моделей: tsvector + GIN на PostgreSQL,
+        # FTS5 на SQLite; обе схемы обновляются триггерами (см. main/search.py)
+        migrations.RunPython(install_search, uninstall_search),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0024_question_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['game_use_type', 'difficulty'], name='main_questi_game_us_b85e95_idx'),
+        ),
+        # Выбор вопросов по темам идёт от темы к вопросам. Промежуточную
+        # таблицу M2M Django создаёт сам, поэтому индекс — обычным SQL
+        migrations.RunSQL(
+            'CREATE INDEX main_question_topics_topic_question_idx ON main_question_topics (topic_id, question_id)',
+            'DROP INDEX main_question_topics_topic_question_idx',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0025_rotation_strata_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='questionusage',
+            name='context_id',
+            field=models.BigIntegerField(verbose_name='Контекст (chat_id, telegram_id или id команды)'),
+        ),
+        migrations.AlterField(
+            model_name='questionusage',
+            name='use_type',
+            field=models.CharField(choices=[('dm', 'DM'), ('solo', 'SOLO'), ('team', 'TEAM')], max_length=10, verbose_name='Тип использования'),
+        ),
+    ]
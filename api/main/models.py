@@ -144,15 +144,24 @@ class Question(models.Model):
     class Meta:
         verbose_name = 'Вопрос'
         verbose_name_plural = 'Вопросы'
+        # Фильтры админки вместе с сортировкой по id
+        indexes = [
+            models.Index(fields=['question_type', 'id']),
+            models.Index(fields=['game_use_type', 'id']),
+            models.Index(fields=['difficulty', 'id']),
+            # Ротация с разбивкой по сложности (RotatedQuestionListView)
+            models.Index(fields=['game_use_type', 'difficulty']),
+        ]
 
 
 class QuestionUsage(models.Model):
     class UseType(models.TextChoices):
         DM = 'dm', 'DM'
         SOLO = 'solo', 'SOLO'
+        TEAM = 'team', 'TEAM'
 
     use_type = models.CharField(max_length=10, choices=UseType.choices, verbose_name='Тип использования')
-    context_id = models.BigIntegerField(verbose_name='Контекст (chat_id или telegram_id)')
+    context_id = models.BigIntegerField(verbose_name='Контекст (chat_id, telegram_id или id команды)')
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='usages', verbose_name='Вопрос')
     used_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата использования')
 
@@ -162,6 +171,9 @@ class QuestionUsage(models.Model):
         unique_together = (('use_type', 'context_id', 'question'),)
         indexes = [
             models.Index(fields=['use_type', 'context_id', 'used_at']),
+            # Фильтр и поиск по контексту в админке
+            models.Index(fields=['use_type', 'id']),
+            models.Index(fields=['context_id']),
         ]
 
 
@@ -195,6 +207,9 @@ class QuestionAnswer(models.Model):
     class Meta:
         verbose_name = 'Ответ на вопрос'
         verbose_name_plural = 'Ответы на вопросы'
+        indexes = [
+            models.Index(fields=['is_right', 'id']),
+        ]
 
 
 class Quiz(models.Model):
@@ -0,0 +1,121 @@
+"""Профилирование одного запроса: cProfile или сэмплирование стека.
+
+cProfile считает каждый вызов функции — точно, но сам замедляет код, где
+много мелких вызовов (сериализаторы DRF). StackSampler раз в несколько
+миллисекунд снимает стек потока запроса из отдельного потока: почти не
+влияет на время, а на выходе — стеки в формате collapsed («a;b;c 12»),
+который сразу открывают flamegraph.pl и speedscope.
+
+    profiler = StackSampler(threading.get_ident(), interval=0.005)
+    profiler.start()
+    ...
+    profiler.stop()
+    profiler.table(30), profiler.write('/tmp/request.collapsed')
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from functools import lru_cache
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    # Путь относительно sys.path: django/db/models/query.py вместо полного
+    for root in sorted((p for p in sys.path if p), key=len, reverse=True):
+        if filename.startswith(root + os.sep):
+            return filename[len(root) + 1:]
+    return filename
+
+
+def _frame_label(code) -> str:
+    # «;» разделяет кадры в формате collapsed
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f'{name} ({_short_path(code.co_filename)}:{code.co_firstlineno})'.replace(';', ':')
+
+
+class StackSampler:
+    extension = 'collapsed'
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[tuple[str, ...]] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            # Корень стека — первым, как принято в collapsed
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def write(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.collapsed())
+
+    def table(self, limit: int = 30) -> str:
+        """Функции по числу сэмплов: self — функция на вершине стека, total — где-либо в стеке."""
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        lines = [
+            f'{self.samples} сэмплов с интервалом {self.interval * 1000:g} мс',
+            f"{'self':>7} {'self %':>7} {'total':>7} {'total %':>8}  функция",
+        ]
+        for label, count in own.most_common(limit):
+            lines.append(
+                f'{count:>7} {count / self.samples:>7.1%} {total[label]:>7} {total[label] / self.samples:>8.1%}  {label}'
+            )
+        return '\n'.join(lines) + '\n'
+
+
+class CProfiler:
+    """Тот же интерфейс поверх cProfile; файл — в формате pstats (snakeviz, flameprof)."""
+
+    extension = 'prof'
+
+    def __init__(self, sort: str = 'cumulative'):
+        self.sort = sort
+        self.profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self.profile.enable()
+
+    def stop(self) -> None:
+        self.profile.disable()
+
+    def write(self, path: str) -> None:
+        self.profile.dump_stats(path)
+
+    def table(self, limit: int = 30) -> str:
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.strip_dirs().sort_stats(self.sort).print_stats(limit)
+        return stream.getvalue()
@@ -0,0 +1,182 @@
+"""Запись SQL-запросов и разбор их планов.
+
+QueryRecorder вешается на соединение через connection.execute_wrapper и
+запоминает каждый запрос с параметрами и временем — в отличие от
+connection.queries, работает и при DEBUG=False. explain() выполняет EXPLAIN
+для SELECT и считает по плану, сколько строк прочитано и сколько таблиц
+просмотрено целиком, без индекса. SqlStats копит статистику по эндпоинтам
+для SqlInstrumentationMiddleware.
+
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        ...
+    recorder.count, recorder.total_ms, recorder.slowest(3)
+"""
+import json
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+
+@dataclass
+class RecordedQuery:
+    sql: str
+    params: object
+    duration_ms: float
+    many: bool = False
+
+    @property
+    def is_select(self) -> bool:
+        return not self.many and self.sql.lstrip().upper().startswith(('SELECT', 'WITH'))
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries: list[RecordedQuery] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(RecordedQuery(sql, params, (time.perf_counter() - started) * 1000, many))
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def total_ms(self) -> float:
+        return sum(query.duration_ms for query in self.queries)
+
+    def slowest(self, limit: int) -> list[RecordedQuery]:
+        return sorted(self.queries, key=lambda query: query.duration_ms, reverse=True)[:limit]
+
+
+# Узлы плана PostgreSQL, которые читают строки таблицы
+POSTGRESQL_SCAN_NODES = {'Seq Scan', 'Index Scan', 'Index Only Scan', 'Bitmap Heap Scan', 'Tid Scan'}
+
+
+def _walk_postgresql_plan(node: dict, totals: dict) -> None:
+    if node.get('Node Type') in POSTGRESQL_SCAN_NODES:
+        loops = node.get('Actual Loops', 1)
+        rows = node.get('Actual Rows', node.get('Plan Rows', 0))
+        removed = node.get('Rows Removed by Filter', 0) + node.get('Rows Removed by Index Recheck', 0)
+        totals['rows_scanned'] += int((rows + removed) * loops)
+        if node['Node Type'] == 'Seq Scan':
+            totals['full_scans'].append(node.get('Relation Name'))
+    for child in node.get('Plans', []):
+        _walk_postgresql_plan(child, totals)
+
+
+def explain(connection, sql: str, params, analyze: bool = False) -> dict | None:
+    """План запроса: {'plan': текст или JSON, 'rows_scanned', 'full_scans'}.
+
+    rows_scanned считается только на PostgreSQL с analyze=True (запрос при
+    этом выполняется); на SQLite есть лишь список таблиц, просмотренных
+    целиком. None — запрос не SELECT или СУБД не поддерживается.
+    """
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            options = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+            cursor.execute(f'EXPLAIN ({options}) {sql}', params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            totals = {'rows_scanned': 0, 'full_scans': []}
+            _walk_postgresql_plan(plan[0]['Plan'], totals)
+            return {
+                'plan': plan,
+                'rows_scanned': totals['rows_scanned'] if analyze else None,
+                'full_scans': totals['full_scans'],
+            }
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            details = [row[-1] for row in cursor.fetchall()]
+            # SCAN — проход по всей таблице или всему индексу, SEARCH — поиск по индексу.
+            # Подзапросы, CTE и таблицы FTS5 в счёт не идут
+            full_scans = [
+                detail.split()[1] for detail in details
+                if detail.startswith('SCAN ')
+                and not detail.startswith(('SCAN (', 'SCAN CONSTANT'))
+                and 'VIRTUAL TABLE' not in detail
+            ]
+            return {'plan': '\n'.join(details), 'rows_scanned': None, 'full_scans': full_scans}
+    return None
+
+
+_IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+
+
+def normalize_sql(sql: str) -> str:
+    """Текст запроса без длины списков IN (%s, %s, ...): один шаблон — одна строка статистики."""
+    return _IN_LIST.sub('(...)', ' '.join(sql.split()))
+
+
+class SqlStats:
+    """Накопленная статистика SQL по эндпоинтам в этом процессе.
+
+    На каждый эндпоинт — число запросов к API, SQL-запросов и время в базе,
+    плюс top самых медленных шаблонов запросов с последним снятым планом и
+    шаблон, который чаще всего повторялся за один запрос к API (признак N+1).
+    """
+
+    def __init__(self, top: int = 5):
+        self.top = top
+        self._lock = threading.Lock()
+        self._endpoints: dict[str, dict] = {}
+        self.started_at = time.time()
+
+    def add(self, endpoint: str, recorder: QueryRecorder, plans: dict[str, object] | None = None) -> None:
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                'requests': 0, 'queries': 0, 'queries_max': 0, 'db_ms': 0.0, 'db_ms_max': 0.0, 'slowest': {},
+                'repeats_max': 0, 'repeated_sql': None,
+            })
+            stats['requests'] += 1
+            stats['queries'] += recorder.count
+            stats['queries_max'] = max(stats['queries_max'], recorder.count)
+            stats['db_ms'] += recorder.total_ms
+            stats['db_ms_max'] = max(stats['db_ms_max'], recorder.total_ms)
+            repeated = Counter(normalize_sql(query.sql) for query in recorder.queries).most_common(1)
+            if repeated and repeated[0][1] > stats['repeats_max']:
+                stats['repeated_sql'], stats['repeats_max'] = repeated[0]
+            for query in recorder.slowest(self.top):
+                key = normalize_sql(query.sql)
+                slow = stats['slowest'].setdefault(key, {'sql': key, 'count': 0, 'max_ms': 0.0, 'explain': None})
+                slow['count'] += 1
+                slow['max_ms'] = max(slow['max_ms'], query.duration_ms)
+                if plans and key in plans:
+                    slow['explain'] = plans[key]
+            if len(stats['slowest']) > self.top:
+                keep = sorted(stats['slowest'].values(), key=lambda slow: slow['max_ms'], reverse=True)[:self.top]
+                stats['slowest'] = {slow['sql']: slow for slow in keep}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            endpoints = {}
+            for endpoint, stats in self._endpoints.items():
+                requests = stats['requests']
+                endpoints[endpoint] = {
+                    'requests': requests,
+                    'queries_avg': round(stats['queries'] / requests, 2),
+                    'queries_max': stats['queries_max'],
+                    'db_ms_avg': round(stats['db_ms'] / requests, 2),
+                    'db_ms_max': round(stats['db_ms_max'], 2),
+                    'repeats_max': stats['repeats_max'],
+                    'repeated_sql': stats['repeated_sql'],
+                    'slowest': [
+                        dict(slow, max_ms=round(slow['max_ms'], 2))
+                        for slow in sorted(stats['slowest'].values(), key=lambda slow: slow['max_ms'], reverse=True)
+                    ],
+                }
+        return {'since': self.started_at, 'endpoints': endpoints}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+            self.started_at = time.time()
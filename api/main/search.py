@@ -0,0 +1,257 @@
+"""Полнотекстовый поиск по вопросам и ответам.
+
+На PostgreSQL у main_question и main_questionanswer есть колонка
+search_vector (tsvector, русская морфология) с GIN-индексом; её заполняют
+триггеры базы, так что вопросы из импорта, bulk_create и админки попадают в
+индекс одинаково. На SQLite (DEBUG) вместо неё — таблицы FTS5 с внешним
+содержимым main_question_fts и main_questionanswer_fts, тоже на триггерах;
+морфологии там нет, слова ищутся по префиксу. Индекс создаёт миграция
+0024_question_search.
+
+Поиск в админке (QuestionAdmin, QuestionAnswerAdmin) и staff-API
+/question/search/ идут через этот модуль, а не через ILIKE '%...%'.
+"""
+import re
+
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+
+
+SEARCH_MIGRATION = ('main', '0024_question_search')
+# Совпадение в ответе весит меньше, чем в тексте вопроса
+ANSWER_WEIGHT = 0.5
+
+POSTGRESQL_INSTALL = [
+    """
+    ALTER TABLE main_question ADD COLUMN IF NOT EXISTS search_vector tsvector
+    """,
+    """
+    CREATE OR REPLACE FUNCTION main_question_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(NEW.comment, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    DROP TRIGGER IF EXISTS main_question_search_vector ON main_question
+    """,
+    """
+    CREATE TRIGGER main_question_search_vector
+        BEFORE INSERT OR UPDATE OF text, comment ON main_question
+        FOR EACH ROW EXECUTE FUNCTION main_question_search_vector_update()
+    """,
+    """
+    UPDATE main_question SET search_vector =
+        setweight(to_tsvector('russian', coalesce(text, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(comment, '')), 'C')
+    WHERE search_vector IS NULL
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS main_question_search_vector_idx
+        ON main_question USING GIN (search_vector)
+    """,
+    """
+    ALTER TABLE main_questionanswer ADD COLUMN IF NOT EXISTS search_vector tsvector
+    """,
+    """
+    CREATE OR REPLACE FUNCTION main_questionanswer_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := to_tsvector('russian', coalesce(NEW.text, ''));
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    DROP TRIGGER IF EXISTS main_questionanswer_search_vector ON main_questionanswer
+    """,
+    """
+    CREATE TRIGGER main_questionanswer_search_vector
+        BEFORE INSERT OR UPDATE OF text ON main_questionanswer
+        FOR EACH ROW EXECUTE FUNCTION main_questionanswer_search_vector_update()
+    """,
+    """
+    UPDATE main_questionanswer SET search_vector = to_tsvector('russian', coalesce(text, ''))
+    WHERE search_vector IS NULL
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS main_questionanswer_search_vector_idx
+        ON main_questionanswer USING GIN (search_vector)
+    """,
+]
+
+POSTGRESQL_UNINSTALL = [
+    'DROP TRIGGER IF EXISTS main_question_search_vector ON main_question',
+    'DROP FUNCTION IF EXISTS main_question_search_vector_update()',
+    'ALTER TABLE main_question DROP COLUMN IF EXISTS search_vector',
+    'DROP TRIGGER IF EXISTS main_questionanswer_search_vector ON main_questionanswer',
+    'DROP FUNCTION IF EXISTS main_questionanswer_search_vector_update()',
+    'ALTER TABLE main_questionanswer DROP COLUMN IF EXISTS search_vector',
+]
+
+# Таблица FTS5 -> (таблица с данными, индексируемые колонки)
+SQLITE_INDEXES = {
+    'main_question_fts': ('main_question', ('text', 'comment')),
+    'main_questionanswer_fts': ('main_questionanswer', ('text',)),
+}
+
+
+def _sqlite_triggers(fts_table: str) -> dict[str, str]:
+    table, columns = SQLITE_INDEXES[fts_table]
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    delete = f"INSERT INTO {fts_table}({fts_table}, rowid, {names}) VALUES ('delete', old.id, {old_values});"
+    insert = f"INSERT INTO {fts_table}(rowid, {names}) VALUES (new.id, {new_values});"
+    return {
+        f'{fts_table}_ai': f'AFTER INSERT ON {table} BEGIN {insert} END',
+        f'{fts_table}_ad': f'AFTER DELETE ON {table} BEGIN {delete} END',
+        f'{fts_table}_au': f'AFTER UPDATE OF {names} ON {table} BEGIN {delete} {insert} END',
+    }
+
+
+def install(connection) -> None:
+    """Создать поисковый индекс, триггеры и заполнить индекс существующими строками."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for sql in POSTGRESQL_INSTALL:
+                cursor.execute(sql)
+        elif connection.vendor == 'sqlite':
+            for fts_table, (table, columns) in SQLITE_INDEXES.items():
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+                    f"{', '.join(columns)}, content='{table}', content_rowid='id', "
+                    f"tokenize='unicode61 remove_diacritics 2')"
+                )
+            ensure_sqlite_triggers(connection, rebuild=True)
+
+
+def uninstall(connection) -> None:
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for sql in POSTGRESQL_UNINSTALL:
+                cursor.execute(sql)
+        elif connection.vendor == 'sqlite':
+            for fts_table in SQLITE_INDEXES:
+                # Триггеры висят на таблицах с данными и сами не удалятся
+                for trigger in _sqlite_triggers(fts_table):
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+                cursor.execute(f'DROP TABLE IF EXISTS {fts_table}')
+
+
+def ensure_sqlite_triggers(connection, rebuild: bool = False) -> None:
+    """Вернуть триггеры FTS5, если их нет.
+
+    SQLite меняет схему, пересоздавая таблицу целиком, и триггеры старой
+    таблицы при этом пропадают. Поэтому после каждой миграции триггеры
+    проверяются, а индекс перестраивается, если какого-то не хватало.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existing = {row[0] for row in cursor.fetchall()}
+        for fts_table in SQLITE_INDEXES:
+            triggers = _sqlite_triggers(fts_table)
+            missing = [name for name in triggers if name not in existing]
+            for name in missing:
+                cursor.execute(f'CREATE TRIGGER {name} {triggers[name]}')
+            if missing or rebuild:
+                cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+
+def is_installed(connection) -> bool:
+    return SEARCH_MIGRATION in MigrationRecorder(connection).applied_migrations()
+
+
+def _sqlite_match(term: str) -> str | None:
+    """Запрос MATCH для FTS5: каждое слово обязательно и ищется по префиксу."""
+    words = re.findall(r'\w+', term)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def matching_ids_sql(model, term: str, using: str = 'default') -> tuple[str, list] | None:
+    """SQL с id строк модели (Question или QuestionAnswer), подходящих под запрос.
+
+    Годится для queryset.filter(id__in=RawSQL(sql, params)). None — полнотекстовый
+    поиск недоступен (другая СУБД, пустой запрос), пусть ищет сама админка.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    term = term.strip()
+    if not term:
+        return None
+    if connection.vendor == 'postgresql':
+        return (
+            f"SELECT id FROM {table} WHERE search_vector @@ websearch_to_tsquery('russian', %s)",
+            [term],
+        )
+    if connection.vendor == 'sqlite':
+        match = _sqlite_match(term)
+        if match is None:
+            return None
+        fts_table = f'{table}_fts'
+        return f'SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s', [match]
+    return None
+
+
+POSTGRESQL_RANKED = f"""
+WITH query AS (SELECT websearch_to_tsquery('russian', %s) AS q),
+hits AS (
+    SELECT question.id AS question_id, ts_rank(question.search_vector, query.q) AS rank
+    FROM main_question question, query
+    WHERE question.search_vector @@ query.q
+    UNION ALL
+    SELECT answer.question_id, {ANSWER_WEIGHT} * ts_rank(answer.search_vector, query.q)
+    FROM main_questionanswer answer, query
+    WHERE answer.search_vector @@ query.q
+)
+SELECT question_id, SUM(rank) AS rank, COUNT(*) OVER () AS total
+FROM hits
+GROUP BY question_id
+ORDER BY rank DESC, question_id DESC
+LIMIT %s OFFSET %s
+"""
+
+# bm25 в FTS5 тем меньше, чем лучше совпадение, — берём с минусом.
+# Текст вопроса весит больше комментария
+SQLITE_RANKED = f"""
+WITH hits AS (
+    SELECT rowid AS question_id, -bm25(main_question_fts, 1.0, 0.3) AS rank
+    FROM main_question_fts
+    WHERE main_question_fts MATCH %s
+    UNION ALL
+    SELECT answer.question_id, -{ANSWER_WEIGHT} * bm25(main_questionanswer_fts)
+    FROM main_questionanswer_fts
+    JOIN main_questionanswer answer ON answer.id = main_questionanswer_fts.rowid
+    WHERE main_questionanswer_fts MATCH %s
+)
+SELECT question_id, SUM(rank) AS rank, COUNT(*) OVER () AS total
+FROM hits
+GROUP BY question_id
+ORDER BY rank DESC, question_id DESC
+LIMIT %s OFFSET %s
+"""
+
+
+def search_questions(term: str, limit: int = 20, offset: int = 0, using: str = 'default') -> tuple[list[tuple[int, float]], int]:
+    """Вопросы по убыванию релевантности: ([(question_id, rank), ...], всего найдено).
+
+    Ищется по тексту и комментарию вопроса и по текстам его ответов.
+    """
+    connection = connections[using]
+    term = term.strip()
+    if connection.vendor == 'postgresql' and term:
+        sql, params = POSTGRESQL_RANKED, [term, limit, offset]
+    elif connection.vendor == 'sqlite' and _sqlite_match(term):
+        match = _sqlite_match(term)
+        sql, params = SQLITE_RANKED, [match, match, limit, offset]
+    else:
+        return [], 0
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    total = rows[0][2] if rows else 0
+    return [(question_id, float(rank)) for question_id, rank, _ in rows], total
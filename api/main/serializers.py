@@ -1,5 +1,6 @@
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
-from .models import Quiz, Question, Team, TelegramPlayer, PlanTeamQuiz, BotText, Config, Chat, PlayerInChat
+from .models import Quiz, Question, QuestionAnswer, Team, TelegramPlayer, PlanTeamQuiz, BotText, Config, Chat, PlayerInChat
 
 
 class AuthPlayerSerializer(serializers.Serializer):
@@ -18,6 +19,12 @@ class QuizInfoSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'description', 'quiz_type', 'amount_questions', 'time_to_answer')
 
 
+def prefetch_answers(questions: list) -> list:
+    """Подгрузить ответы вопросов для QuestionListSerializer одним запросом, по порядку id."""
+    prefetch_related_objects(questions, Prefetch('questionanswer_set', queryset=QuestionAnswer.objects.order_by('id')))
+    return questions
+
+
 class QuestionListSerializer(serializers.ModelSerializer):
     wrong_answers = serializers.SerializerMethodField()
     correct_answer = serializers.SerializerMethodField()
@@ -40,18 +47,30 @@ class QuestionListSerializer(serializers.ModelSerializer):
             'image_url'
         )
 
+    # Ответы берём из questionanswer_set.all(): во вьюхах они подгружаются
+    # prefetch_related одним запросом на все вопросы, а не тремя на каждый
+
     def get_wrong_answers(self, obj):
-        return list(obj.questionanswer_set.filter(is_right=False).values_list('text', flat=True))
+        return [a.text for a in obj.questionanswer_set.all() if not a.is_right]
 
     def get_correct_answer(self, obj):
-        ans = obj.questionanswer_set.filter(is_right=True).first()
+        ans = self._first_right_answer(obj)
         return ans.text if ans else ''
 
     def get_correct_answers(self, obj):
-        ans = obj.questionanswer_set.filter(is_right=True).first()
-        config = Config.objects.filter(name='correct_answers_separator').first()
-
-        return [a.strip() for a in ans.text.split(config.value if config else ';')] if ans else []
+        ans = self._first_right_answer(obj)
+        return [a.strip() for a in ans.text.split(self._answers_separator())] if ans else []
+
+    @staticmethod
+    def _first_right_answer(obj):
+        return next((a for a in obj.questionanswer_set.all() if a.is_right), None)
+
+    def _answers_separator(self) -> str:
+        # Контекст общий для всех вопросов списка — конфиг читается один раз на ответ
+        if 'correct_answers_separator' not in self.context:
+            config = Config.objects.filter(name='correct_answers_separator').first()
+            self.context['correct_answers_separator'] = config.value if config else ';'
+        return self.context['correct_answers_separator']
 
     def get_time_to_answer(self, obj):
         # Берем из контекста, куда передается значение из связанного Quiz
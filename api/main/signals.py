@@ -1,10 +1,12 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_migrate, post_save
+from django.db import connections
 from django.dispatch import receiver
 import asyncio
 import os
 
 from aiogram import Bot
 
+from . import search
 from .models import PlanTeamQuiz, Team, BotText
 
 
@@ -62,3 +64,13 @@ def on_plan_team_quiz_created(sender, instance: PlanTeamQuiz, created: bool, **k
         loop = asyncio.new_event_loop()
         loop.run_until_complete(_broadcast())
 
+
+
+@receiver(post_migrate)
+def on_post_migrate_restore_search_triggers(sender, using, **kwargs):
+    """После миграций SQLite вернуть триггеры поискового индекса, если таблицу пересоздали."""
+    if sender.name != 'main':
+        return
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and search.is_installed(connection):
+        search.ensure_sqlite_triggers(connection)
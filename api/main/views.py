@@ -5,14 +5,17 @@ from rest_framework import status, permissions, serializers
 from django.utils import timezone
 from django.db import transaction
 from django.db.models import Q, F
-from django.db.models import Exists, OuterRef
+from django.db.models import Exists, OuterRef, Case, When, Value, IntegerField, Window
+from django.db.models.functions import Random, RowNumber
 from django.shortcuts import render
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.http import JsonResponse
+from django.conf import settings
 
 from datetime import datetime
+import os
 import random
 import pandas as pd
 import hashlib
@@ -23,8 +26,10 @@ from .serializers import (
     AuthPlayerSerializer, QuizInfoSerializer, QuestionListSerializer, TeamSerializer,
     PlanTeamQuizSerializer, TelegramPlayerUpdateSerializer, LeaderboardEntrySerializer,
     BotTextDictSerializer, TeamLeaderboardEntrySerializer, ConfigSerializer,
-    ChatLeaderboardEntrySerializer, ChatSerializer
+    ChatLeaderboardEntrySerializer, ChatSerializer, prefetch_answers
 )
+from . import search
+from .middleware import sql_stats
 from .authentication import PlayerTokenAuthentication, SystemTokenAuthentication
 
 
@@ -84,23 +89,56 @@ class QuizListView(APIView):
 
 
 class QuestionQuizListView(APIView):
+    """GET ?quiz_id=<id>[&team_id=<id>]: amount_questions случайных вопросов квиза.
+    С team_id вопросы ротируются по команде: пока в квизе есть вопросы, которые
+    команда не видела, повторов нет.
+    """
     authentication_classes = [PlayerTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
         quiz_id = request.query_params.get('quiz_id')
+        team_id = request.query_params.get('team_id')
 
         if not quiz_id:
             return Response({'detail': 'quiz_id parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if team_id is not None:
+            try:
+                team_id = int(team_id)
+            except ValueError:
+                return Response({'detail': 'team_id must be integer'}, status=status.HTTP_400_BAD_REQUEST)
         try:
             quiz = Quiz.objects.get(id=quiz_id)
         except Quiz.DoesNotExist:
             return Response({'detail': 'Quiz not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        all_questions = list(quiz.questions.all())
-        random.shuffle(all_questions)
+        # Случайная выборка — в базе по связям квиза, а не по всем вопросам в памяти
+        links = Quiz.questions.through.objects.filter(quiz_id=quiz.id)
+        size = quiz.amount_questions
 
-        selected = all_questions[:quiz.amount_questions]
+        if team_id is None:
+            question_ids = list(links.order_by('?').values_list('question_id', flat=True)[:size])
+        else:
+            with transaction.atomic():
+                team_usages = QuestionUsage.objects.filter(use_type=QuestionUsage.UseType.TEAM, context_id=team_id)
+                used = team_usages.filter(question_id=OuterRef('question_id'))
+                question_ids = list(
+                    links.filter(~Exists(used)).order_by('?').values_list('question_id', flat=True)[:size]
+                )
+                # Команда видела почти весь квиз — сбрасываем её историю по этому квизу и добираем
+                if len(question_ids) < size:
+                    team_usages.filter(question_id__in=links.values('question_id')).delete()
+                    question_ids += list(
+                        links.exclude(question_id__in=question_ids)
+                        .order_by('?').values_list('question_id', flat=True)[:size - len(question_ids)]
+                    )
+                QuestionUsage.objects.bulk_create(
+                    [QuestionUsage(use_type=QuestionUsage.UseType.TEAM, context_id=team_id, question_id=qid) for qid in question_ids],
+                    ignore_conflicts=True,
+                )
+
+        questions = Question.objects.in_bulk(question_ids)
+        selected = prefetch_answers([questions[qid] for qid in question_ids if qid in questions])
         # Передаем time_to_answer из Quiz в контекст сериализатора, чтобы оно добавилось к каждому вопросу
         serializer = QuestionListSerializer(selected, many=True, context={'time_to_answer': quiz.time_to_answer})
 
@@ -110,7 +148,12 @@ class QuestionQuizListView(APIView):
 class RotatedQuestionListView(APIView):
     """POST: отдаёт список вопросов по use_type (dm/solo) с ротацией по context_id.
     Авторизация: системный токен.
-    Тело запроса: { use_type: 'dm'|'solo', context_id: int, size: int, time_to_answer?: int }
+    Тело запроса: {
+        use_type: 'dm'|'solo', context_id: int, size: int, time_to_answer?: int,
+        topic_ids?: [int, ...],                   # только вопросы с одной из этих тем
+        difficulty_mix?: {сложность: количество}  # например {"1": 3, "2": 5, "3": 2}
+    }
+    С difficulty_mix size можно не передавать — это сумма количеств.
     Ответ: { questions: [QuestionListSerializer ...] }
     """
     authentication_classes = [SystemTokenAuthentication]
@@ -121,6 +164,8 @@ class RotatedQuestionListView(APIView):
         context_id = request.data.get('context_id')
         size = request.data.get('size')
         time_to_answer = request.data.get('time_to_answer')
+        topic_ids = request.data.get('topic_ids') or []
+        difficulty_mix = request.data.get('difficulty_mix') or {}
 
         # Валидация
         if use_type not in ('dm', 'solo'):
@@ -130,6 +175,19 @@ class RotatedQuestionListView(APIView):
         except Exception:
             return Response({'detail': 'context_id must be integer'}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            topic_ids = [int(topic_id) for topic_id in topic_ids]
+        except Exception:
+            return Response({'detail': 'topic_ids must be a list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            strata = {int(difficulty): int(count) for difficulty, count in dict(difficulty_mix).items()}
+        except Exception:
+            return Response({'detail': 'difficulty_mix must map difficulty to count'}, status=status.HTTP_400_BAD_REQUEST)
+        strata = {difficulty: count for difficulty, count in strata.items() if count > 0}
+
+        if strata and size in (None, ''):
+            size = sum(strata.values())
         try:
             size = int(size)
         except Exception:
@@ -137,26 +195,37 @@ class RotatedQuestionListView(APIView):
 
         if size <= 0:
             return Response({'detail': 'size must be > 0'}, status=status.HTTP_400_BAD_REQUEST)
+        if strata and sum(strata.values()) != size:
+            return Response({'detail': 'size must equal the sum of difficulty_mix'}, status=status.HTTP_400_BAD_REQUEST)
+
+        pool = Question.objects.filter(game_use_type=use_type)
+        if topic_ids:
+            # EXISTS, а не JOIN: вопрос с несколькими темами не задвоится
+            pool = pool.filter(Exists(
+                Question.topics.through.objects.filter(question_id=OuterRef('pk'), topic_id__in=topic_ids)
+            ))
+        if strata:
+            pool = pool.filter(difficulty__in=strata)
 
         with transaction.atomic():
-            # Кандидаты — все вопросы данного типа игры, не использованные в этом контексте
+            # Кандидаты — вопросы пула, не использованные в этом контексте
             exists_subq = QuestionUsage.objects.filter(
                 use_type=use_type, context_id=context_id, question=OuterRef('pk')
             )
-            available_qs = (
-                Question.objects
-                .filter(game_use_type=use_type)
-                .annotate(already_used=Exists(exists_subq))
-                .filter(already_used=False)
-            )
+            available_qs = pool.annotate(already_used=Exists(exists_subq)).filter(already_used=False)
 
-            # Одним запросом случайно выбираем нужное количество
-            selected = list(available_qs.order_by('?')[:size])
+            # Одним запросом случайно выбираем нужное количество (по каждой сложности)
+            selected = self._draw(available_qs, strata, size)
 
-            # Если не хватило — сброс истории и выбор из полного пула
-            if len(selected) < size:
-                QuestionUsage.objects.filter(use_type=use_type, context_id=context_id).delete()
-                selected = list(Question.objects.filter(game_use_type=use_type).order_by('?')[:size])
+            # Если не хватило — сброс истории по исчерпанной части пула и выбор из неё заново
+            shortage = self._shortage(selected, strata, size)
+            if shortage:
+                exhausted = pool.filter(difficulty__in=shortage) if strata else pool
+                QuestionUsage.objects.filter(
+                    use_type=use_type, context_id=context_id, question__in=exhausted
+                ).delete()
+                refill_qs = exhausted.exclude(pk__in=[q.pk for q in selected])
+                selected += self._draw(refill_qs, shortage if strata else {}, size - len(selected))
 
             if not selected:
                 return Response({'questions': []})
@@ -168,9 +237,47 @@ class RotatedQuestionListView(APIView):
             except Exception:
                 pass
 
+        if strata:
+            # Внутри выборки сложности идут вперемешку, как и без difficulty_mix
+            random.shuffle(selected)
+        prefetch_answers(selected)
         serializer = QuestionListSerializer(selected, many=True, context={'time_to_answer': time_to_answer})
         return Response({'questions': serializer.data})
 
+    @staticmethod
+    def _draw(queryset, strata: dict[int, int], size: int) -> list:
+        """Случайные вопросы: size штук или по strata[сложность] каждой сложности.
+
+        Страты заполняются одним запросом: ROW_NUMBER() в случайном порядке
+        внутри каждой сложности и отсечение по квоте этой сложности.
+        """
+        if not strata:
+            return list(queryset.order_by('?')[:size])
+        quota = Case(
+            *[When(difficulty=difficulty, then=Value(count)) for difficulty, count in strata.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        ranked = queryset.annotate(
+            stratum_rank=Window(RowNumber(), partition_by=F('difficulty'), order_by=Random().asc()),
+            stratum_quota=quota,
+        )
+        return list(ranked.filter(stratum_rank__lte=F('stratum_quota')))
+
+    @staticmethod
+    def _shortage(selected: list, strata: dict[int, int], size: int) -> dict[int, int]:
+        """Сколько вопросов не хватило: {сложность: недостача}, без страт — {None: недостача}."""
+        if not strata:
+            return {None: size - len(selected)} if len(selected) < size else {}
+        got = {}
+        for question in selected:
+            got[question.difficulty] = got.get(question.difficulty, 0) + 1
+        return {
+            difficulty: count - got.get(difficulty, 0)
+            for difficulty, count in strata.items()
+            if got.get(difficulty, 0) < count
+        }
+
 
 class ConfigViewSet(viewsets.ModelViewSet):
     authentication_classes = [SystemTokenAuthentication]
@@ -812,6 +919,79 @@ class BulkQuestionImportView(View):
         return difficulty_map.get(difficulty_str, 1)
 
 
+@method_decorator(staff_member_required, name='dispatch')
+class QuestionSearchView(View):
+    """
+    Полнотекстовый поиск вопросов для администраторов.
+    GET ?q=<запрос>&page=1&page_size=20 — вопросы по убыванию релевантности
+    вместе с ответами; совпадения ищутся и в тексте вопроса, и в ответах.
+    """
+
+    MAX_PAGE_SIZE = 100
+
+    def get(self, request):
+        term = request.GET.get('q', '').strip()
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+            page_size = min(max(int(request.GET.get('page_size', 20)), 1), self.MAX_PAGE_SIZE)
+        except ValueError:
+            return JsonResponse({'error': 'page и page_size должны быть числами'}, status=400)
+        if not term:
+            return JsonResponse({'error': 'Параметр q обязателен'}, status=400)
+
+        hits, total = search.search_questions(term, limit=page_size, offset=(page - 1) * page_size)
+        questions = Question.objects.prefetch_related('questionanswer_set').in_bulk([question_id for question_id, _ in hits])
+        results = []
+        for question_id, rank in hits:
+            question = questions.get(question_id)
+            if question is None:
+                continue
+            results.append({
+                'id': question.id,
+                'text': question.text,
+                'comment': question.comment,
+                'question_type': question.question_type,
+                'game_use_type': question.game_use_type,
+                'difficulty': question.difficulty,
+                'rank': round(rank, 6),
+                'answers': [
+                    {'id': answer.id, 'text': answer.text, 'is_right': answer.is_right}
+                    for answer in question.questionanswer_set.all()
+                ],
+            })
+        return JsonResponse({
+            'query': term,
+            'count': total,
+            'page': page,
+            'page_size': page_size,
+            'results': results,
+        })
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class SqlStatsView(View):
+    """
+    Статистика SQL по эндпоинтам из SqlInstrumentationMiddleware (этого процесса).
+    GET — текущая статистика, POST — сбросить и начать заново.
+    """
+
+    def get(self, request):
+        if not settings.SQL_INSTRUMENTATION:
+            return JsonResponse({'error': 'SQL_INSTRUMENTATION выключен'}, status=404)
+        snapshot = sql_stats.snapshot()
+        # Сначала эндпоинты, которые дольше всех сидят в базе
+        endpoints = sorted(
+            snapshot['endpoints'].items(),
+            key=lambda item: item[1]['db_ms_avg'] * item[1]['requests'],
+            reverse=True,
+        )
+        return JsonResponse({'pid': os.getpid(), 'since': snapshot['since'], 'endpoints': dict(endpoints)})
+
+    def post(self, request):
+        sql_stats.reset()
+        return JsonResponse({'reset': True})
+
+
 class QuestionLikeView(APIView):
     """
     API для добавления лайка к вопросу
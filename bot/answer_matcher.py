@@ -0,0 +1,205 @@
+"""Проверка текстовых ответов игроков.
+
+Правильные ответы нормализуются один раз при построении матчера (NFKC,
+регистр, ё→е, пробелы и пунктуация, не меняющая смысла, по желанию
+транслитерация) и хранятся во frozenset, так что точное совпадение — один
+поиск в хеш-таблице. Матчер — только для открытых вопросов: вариант ответа
+сравнивается с правильным как есть (QuestionRecord.is_correct_option).
+Для открытых вопросов допускаются опечатки: ограниченное расстояние
+Левенштейна считается бит-параллельным алгоритмом Майерса, битовые маски
+символов правильных ответов тоже готовятся заранее. Числа опечатками не
+считаются: «1944» вместо «1945» — другой ответ, поэтому цифры в ответе
+должны совпасть с правильным точно.
+
+Самопроверка на наборе ответов:
+
+    python answer_matcher.py --selfcheck
+"""
+from __future__ import annotations
+
+import os
+import re
+import sys
+import unicodedata
+
+
+# Сравнивать ответы ещё и в латинской транслитерации («Moskva» == «Москва»)
+ANSWER_TRANSLIT = os.getenv("ANSWER_TRANSLIT", "false").lower() == "true"
+# Максимум опечаток для длинных ответов; 0 — только точное совпадение
+ANSWER_MAX_TYPOS = int(os.getenv("ANSWER_MAX_TYPOS", 2))
+
+_TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n',
+    'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f',
+    'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '',
+    'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'iu', 'я': 'ia',
+})
+
+# Пробелы и пунктуация, не меняющая смысла ответа: кавычки, скобки, !?;:
+# Знаки + - # / . , % и прочие символы остаются: «C++» и «C#», «-5» и «5»,
+# «1/2» и «1 2» — разные ответы
+_SEPARATORS = re.compile(r'[\s_!?;:…"\'`«»„“”‘’()\[\]{}]+')
+_NON_DIGITS = re.compile(r'\D+')
+# Варианты тире и минуса приводим к дефису
+_DASHES = str.maketrans({ch: '-' for ch in '‐‑‒–—―−'})
+
+
+def normalize_answer(text: str) -> str:
+    """Привести ответ к каноничному виду для сравнения."""
+    text = unicodedata.normalize('NFKC', text).casefold().replace('ё', 'е').translate(_DASHES)
+    # Точка или запятая в конце фразы («Москва.») — не часть ответа
+    normalized = _SEPARATORS.sub(' ', text).strip(' .,')
+    # Ответ из одних знаков («?», «!») сравниваем как есть
+    return normalized or text.strip()
+
+
+def transliterate(text: str) -> str:
+    return text.translate(_TRANSLIT)
+
+
+def digits(text: str) -> str:
+    """Цифры ответа подряд — они должны совпасть точно («100 000» == «100000»)."""
+    return _NON_DIGITS.sub('', text)
+
+
+def allowed_typos(length: int) -> int:
+    """Сколько опечаток прощаем в ответе такой длины."""
+    if length < 5:
+        return 0
+    if length < 9:
+        return min(1, ANSWER_MAX_TYPOS)
+    return ANSWER_MAX_TYPOS
+
+
+class _Pattern:
+    """Правильный ответ, подготовленный для алгоритма Майерса."""
+
+    __slots__ = ('text', 'length', 'digits', 'peq', 'last_bit', 'mask')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.length = len(text)
+        self.digits = digits(text)
+        peq: dict[str, int] = {}
+        for idx, ch in enumerate(text):
+            peq[ch] = peq.get(ch, 0) | (1 << idx)
+        self.peq = peq
+        self.last_bit = 1 << (self.length - 1)
+        self.mask = (1 << self.length) - 1
+
+    def within(self, text: str, max_distance: int) -> bool:
+        """Расстояние Левенштейна до text не больше max_distance."""
+        n = len(text)
+        if abs(n - self.length) > max_distance:
+            return False
+        peq, last_bit, mask = self.peq, self.last_bit, self.mask
+        pv, mv, score = mask, 0, self.length
+        for j, ch in enumerate(text):
+            eq = peq.get(ch, 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | (~(xh | pv) & mask)
+            mh = pv & xh
+            if ph & last_bit:
+                score += 1
+            elif mh & last_bit:
+                score -= 1
+            # Оставшиеся символы могут уменьшить счёт максимум на единицу каждый
+            if score - (n - j - 1) > max_distance:
+                return False
+            ph = ((ph << 1) | 1) & mask
+            mh = (mh << 1) & mask
+            pv = mh | (~(xv | ph) & mask)
+            mv = ph & xv
+        return score <= max_distance
+
+
+class AnswerMatcher:
+    __slots__ = ('exact', 'patterns', 'fuzzy', 'translit')
+
+    def __init__(self, correct_answers, fuzzy: bool = False, translit: bool = ANSWER_TRANSLIT):
+        forms = {normalize_answer(a) for a in correct_answers}
+        forms.discard('')
+        self.translit = translit
+        if translit:
+            forms |= {transliterate(f) for f in forms}
+        self.exact = frozenset(forms)
+        self.fuzzy = fuzzy and ANSWER_MAX_TYPOS > 0
+        # Для нечёткого сравнения при транслитерации сравниваем в латинице
+        fuzzy_forms = {transliterate(f) for f in forms} if translit else forms
+        self.patterns = tuple(_Pattern(f) for f in sorted(fuzzy_forms)) if self.fuzzy else ()
+
+    def matches(self, answer: str) -> bool:
+        text = normalize_answer(answer)
+        if not text:
+            return False
+        if text in self.exact:
+            return True
+        if self.translit:
+            text = transliterate(text)
+            if text in self.exact:
+                return True
+        if not self.fuzzy:
+            return False
+        answer_digits = digits(text)
+        for pattern in self.patterns:
+            if pattern.digits != answer_digits:
+                continue
+            typos = allowed_typos(pattern.length)
+            if typos and pattern.within(text, typos):
+                return True
+        return False
+
+
+# --- самопроверка ---
+
+# (правильные ответы, нечёткое сравнение, ответ игрока, ожидаемый результат)
+_CASES = [
+    (['Москва'], False, ' москва! ', True),
+    (['Ёлка'], False, 'елка', True),
+    (['Москва'], False, 'Масква', False),
+    (['Москва'], True, 'Масква', True),
+    (['кот'], True, 'кит', False),
+    (['Достоевский'], True, 'Дастаевский', True),
+    (['Достоевский'], True, 'Толстой', False),
+    (['1945 год'], True, '1945 год', True),
+    (['1945 год'], True, '1945 гот', True),
+    (['1945 год'], True, '1944 год', False),
+    (['1945 год'], True, '945 год', False),
+    (['100000'], True, '900000', False),
+    (['100000'], True, '1000000', False),
+    (['100 000'], True, '100000', True),
+    (['Аполлон 11'], True, 'Аполон 11', True),
+    (['Аполлон 11'], True, 'Аполлон 12', False),
+    (['Москва'], False, '«Москва».', True),
+    (['C++'], False, 'C#', False),
+    (['C++'], False, 'c++', True),
+    (['C#'], True, 'C#', True),
+    (['-5'], False, '5', False),
+    (['-5'], False, '−5', True),
+    (['1/2'], False, '1 2', False),
+    (['1/2'], False, '1/2', True),
+    (['3,14'], False, '314', False),
+    (['+'], False, '+', True),
+    (['?'], False, '?', True),
+]
+
+
+def _selfcheck() -> bool:
+    ok = True
+    for answers, fuzzy, answer, expected in _CASES:
+        got = AnswerMatcher(answers, fuzzy=fuzzy).matches(answer)
+        if got != expected:
+            print(f"FAIL: {answers} fuzzy={fuzzy} {answer!r}: {got}, ожидалось {expected}")
+            ok = False
+    print(f"Случаев: {len(_CASES)}")
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ['--selfcheck']:
+        print("usage: python answer_matcher.py --selfcheck")
+        sys.exit(2)
+    sys.exit(0 if _selfcheck() else 1)
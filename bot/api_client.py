@@ -1,12 +1,29 @@
+import asyncio
 import os
 import aiohttp
 from typing import Optional, Dict, List
 import requests
 
+import metrics
+import tracing
+
 
 BASE_URL = os.getenv('API_URL', 'http://localhost:8000')
 
 
+def _session(headers: dict | None = None) -> aiohttp.ClientSession:
+    """Сессия к API; в трассируемом обновлении добавляет заголовки trace (tracing)."""
+    return aiohttp.ClientSession(headers={**(headers or {}), **tracing.headers()})
+
+
+def api_call(func):
+    """Метрики и span трассировки для функции API."""
+    if not asyncio.iscoroutinefunction(func):
+        return metrics.observe_api(func)
+    return metrics.observe_api(tracing.traced(func))
+
+
+@api_call
 async def auth_player(
     telegram_id: int,
     first_name: str,
@@ -23,16 +40,17 @@ async def auth_player(
         'phone': phone,
         'lang_code': lang_code,
     }
-    async with aiohttp.ClientSession() as session:
+    async with _session() as session:
         async with session.post(f'{BASE_URL}/auth/player/', json=payload) as resp:
             resp.raise_for_status()
             data = await resp.json()
             return data['token']
 
 
+@api_call
 async def player_game_end(username: str | None, points: int, system_token: str, chat_id: int | None = None) -> dict:
     headers = {'Authorization': f'Token {system_token}'}
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with _session(headers) as session:
         payload = {'username': username, 'points': points}
         if chat_id is not None:
             payload['chat_id'] = chat_id
@@ -41,51 +59,57 @@ async def player_game_end(username: str | None, points: int, system_token: str,
             return await resp.json()
 
 
+@api_call
 async def players_game_end_bulk(results: list[dict], system_token: str) -> dict:
     headers = {'Authorization': f'Token {system_token}'}
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with _session(headers) as session:
         async with session.post(f'{BASE_URL}/player/game-end/', json={'results': results}) as resp:
             resp.raise_for_status()
             return await resp.json()
 
 
+@api_call
 async def chat_register(system_token: str, chat_id: int, chat_username: str | None) -> dict:
     headers = {'Authorization': f'Token {system_token}'}
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with _session(headers) as session:
         payload = {'chat_id': chat_id, 'chat_username': chat_username}
         async with session.post(f'{BASE_URL}/chat/register/', json=payload) as resp:
             resp.raise_for_status()
             return await resp.json()
 
 
+@api_call
 async def team_game_end(team_id: int, points: int, plan_team_quiz_id: int, system_token: str) -> dict:
     headers = {'Authorization': f'Token {system_token}'}
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with _session(headers) as session:
         async with session.post(f'{BASE_URL}/team/game-end/{team_id}/', json={'points': points, 'plan_team_quiz_id': plan_team_quiz_id}) as resp:
             resp.raise_for_status()
             return await resp.json()
 
 
+@api_call
 async def player_update_notifications(telegram_id: int, notification_is_on: bool, system_token: str) -> dict:
     headers = {'Authorization': f'Token {system_token}'}
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with _session(headers) as session:
         async with session.patch(f'{BASE_URL}/player/{telegram_id}/', json={'notification_is_on': notification_is_on}) as resp:
             resp.raise_for_status()
             return await resp.json()
 
 
+@api_call
 async def list_plan_team_quizzes(chat_username: str, token: str) -> list[dict]:
     headers = {'Authorization': f'Token {token}'}
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with _session(headers) as session:
         async with session.get(f'{BASE_URL}/game/plan-game/list/{chat_username}/') as resp:
             resp.raise_for_status()
             return await resp.json()
 
 
+@api_call
 async def player_leaderboard(token: str, usernames: List[str] = None, current_user_username: str | None = None) -> dict:
     """Получить лидерборд игроков. Если usernames указан, то только среди этих пользователей."""
     headers = {'Authorization': f'Token {token}'}
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with _session(headers) as session:
         if usernames and current_user_username:
             # POST запрос с списком username
             payload = {'usernames': usernames, 'current_user_username': current_user_username}
@@ -99,51 +123,61 @@ async def player_leaderboard(token: str, usernames: List[str] = None, current_us
                 return await resp.json()
 
 
+@api_call
 async def team_leaderboard(token: str, chat_username: str) -> dict:
     headers = {'Authorization': f'Token {token}'}
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with _session(headers) as session:
         async with session.get(f'{BASE_URL}/team/leaderboard/{chat_username}/') as resp:
             resp.raise_for_status()
             return await resp.json()
 
 
+@api_call
 async def chat_leaderboard(chat_id: int, system_token: str) -> dict:
     headers = {'Authorization': f'Token {system_token}'}
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with _session(headers) as session:
         async with session.get(f'{BASE_URL}/chat/{chat_id}/leaderboard/') as resp:
             resp.raise_for_status()
             return await resp.json()
 
 
+@api_call
 async def get_notify_list() -> list[dict]:
-    async with aiohttp.ClientSession() as session:
+    async with _session() as session:
         async with session.get(f'{BASE_URL}/player/notify-list/') as resp:
             resp.raise_for_status()
             return await resp.json()
 
 
+@api_call
 async def get_quiz_info(quiz_type: str, quiz_id: int | None = None) -> dict:
     params = {}
     if quiz_id is not None:
         params["quiz_id"] = quiz_id
-    async with aiohttp.ClientSession() as session:
+    async with _session() as session:
         async with session.get(f'{BASE_URL}/quiz/game/{quiz_type}/', params=params) as resp:
             resp.raise_for_status()
             return await resp.json()
 
 
-async def get_questions(token: str, quiz_id: int) -> dict:
+@api_call
+async def get_questions(token: str, quiz_id: int, team_id: int | None = None) -> dict:
+    """Вопросы квиза; с team_id API не повторяет вопросы, которые команда уже видела."""
     headers = {'Authorization': f'Token {token}'}
-    async with aiohttp.ClientSession(headers=headers) as session:
-        async with session.get(f'{BASE_URL}/question/list/', params={'quiz_id': quiz_id}) as resp:
+    params = {'quiz_id': quiz_id}
+    if team_id is not None:
+        params['team_id'] = team_id
+    async with _session(headers) as session:
+        async with session.get(f'{BASE_URL}/question/list/', params=params) as resp:
             resp.raise_for_status()
             data = await resp.json()
             return {"questions": data}
 
 
+@api_call
 async def get_quiz_list(quiz_type: str) -> List[Dict]:
     """Получить список всех квизов заданного типа."""
-    async with aiohttp.ClientSession() as session:
+    async with _session() as session:
         async with session.get(f'{BASE_URL}/quiz/list/{quiz_type}/') as resp:
             resp.raise_for_status()
             data = await resp.json()
@@ -153,6 +187,7 @@ async def get_quiz_list(quiz_type: str) -> List[Dict]:
 
 # --- Team -----------------------------------------------------------
 
+@api_call
 async def create_team(token: str, chat_username: str, name: str, player_id: int, city: str | None = None) -> dict:
     """Create a team and return its JSON representation."""
     headers = {'Authorization': f'Token {token}'}
@@ -162,16 +197,17 @@ async def create_team(token: str, chat_username: str, name: str, player_id: int,
         'chat_username': chat_username,
         'player_id': player_id,
     }
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with _session(headers) as session:
         async with session.post(f'{BASE_URL}/teams/', json=payload) as resp:
             resp.raise_for_status()
             return await resp.json()
 
 
+@api_call
 async def get_team(token: str, chat_username: str) -> Optional[Dict]:
     """Return team JSON or None if not exists."""
     headers = {'Authorization': f'Token {token}'}
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with _session(headers) as session:
         async with session.get(f'{BASE_URL}/team/{chat_username}/') as resp:
             if resp.status == 404:
                 return None
@@ -179,36 +215,51 @@ async def get_team(token: str, chat_username: str) -> Optional[Dict]:
             return await resp.json()
 
 
+@api_call
 async def get_players_total_points(usernames: list[str], system_token: str) -> list[dict]:
     """Возвращает список {username, total_xp} по списку usernames."""
     headers = {'Authorization': f'Token {system_token}'}
     payload = {'usernames': usernames}
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with _session(headers) as session:
         async with session.post(f'{BASE_URL}/player/list/total-points/', json=payload) as resp:
             resp.raise_for_status()
             return await resp.json()
 
 
+@api_call
 async def get_players_chat_points(usernames: list[str], chat_id: int, system_token: str) -> list[dict]:
     """Возвращает список {username, points} по списку usernames для конкретного чата."""
     headers = {'Authorization': f'Token {system_token}'}
     payload = {'usernames': usernames, 'chat_id': chat_id}
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with _session(headers) as session:
         async with session.post(f'{BASE_URL}/player/list/chat-points/', json=payload) as resp:
             resp.raise_for_status()
             return await resp.json()
 
 
+@api_call
 def get_bot_texts(system_token: str) -> dict:
-    headers = {'Authorization': f'Token {system_token}'}
+    headers = {'Authorization': f'Token {system_token}', **tracing.headers()}
     response = requests.get(f'{BASE_URL}/bot-texts/', headers=headers)
     response.raise_for_status()
 
     return response.json()
 
 
-async def get_rotated_questions_solo(system_token: str, telegram_id: int, size: int, time_to_answer: int = 10) -> dict:
-    """Получить вопросы для solo игры с ротацией"""
+@api_call
+async def get_rotated_questions_solo(
+    system_token: str,
+    telegram_id: int,
+    size: int,
+    time_to_answer: int = 10,
+    topic_ids: list[int] | None = None,
+    difficulty_mix: dict[int, int] | None = None,
+) -> dict:
+    """Получить вопросы для solo игры с ротацией.
+
+    topic_ids — только вопросы этих тем; difficulty_mix — сколько вопросов
+    каждой сложности, например {1: 3, 2: 5, 3: 2} (в сумме должно быть size).
+    """
     headers = {'Authorization': f'Token {system_token}'}
     payload = {
         'use_type': 'solo',
@@ -216,14 +267,30 @@ async def get_rotated_questions_solo(system_token: str, telegram_id: int, size:
         'size': size,
         'time_to_answer': time_to_answer
     }
-    async with aiohttp.ClientSession(headers=headers) as session:
+    if topic_ids:
+        payload['topic_ids'] = topic_ids
+    if difficulty_mix:
+        payload['difficulty_mix'] = {str(difficulty): count for difficulty, count in difficulty_mix.items()}
+    async with _session(headers) as session:
         async with session.post(f'{BASE_URL}/question/rotated/', json=payload) as resp:
             resp.raise_for_status()
             return await resp.json()
 
 
-async def get_rotated_questions_dm(system_token: str, chat_id: int, size: int, time_to_answer: int = 10) -> dict:
-    """Получить вопросы для dm игры с ротацией"""
+@api_call
+async def get_rotated_questions_dm(
+    system_token: str,
+    chat_id: int,
+    size: int,
+    time_to_answer: int = 10,
+    topic_ids: list[int] | None = None,
+    difficulty_mix: dict[int, int] | None = None,
+) -> dict:
+    """Получить вопросы для dm игры с ротацией.
+
+    topic_ids — только вопросы этих тем; difficulty_mix — сколько вопросов
+    каждой сложности, например {1: 3, 2: 5, 3: 2} (в сумме должно быть size).
+    """
     headers = {'Authorization': f'Token {system_token}'}
     payload = {
         'use_type': 'dm',
@@ -231,33 +298,40 @@ async def get_rotated_questions_dm(system_token: str, chat_id: int, size: int, t
         'size': size,
         'time_to_answer': time_to_answer
     }
-    async with aiohttp.ClientSession(headers=headers) as session:
+    if topic_ids:
+        payload['topic_ids'] = topic_ids
+    if difficulty_mix:
+        payload['difficulty_mix'] = {str(difficulty): count for difficulty, count in difficulty_mix.items()}
+    async with _session(headers) as session:
         async with session.post(f'{BASE_URL}/question/rotated/', json=payload) as resp:
             resp.raise_for_status()
             return await resp.json()
 
 
+@api_call
 async def get_configs(system_token: str) -> list[dict]:
     headers = {'Authorization': f'Token {system_token}'}
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with _session(headers) as session:
         async with session.get(f'{BASE_URL}/configs/') as resp:
             resp.raise_for_status()
             return await resp.json()
 
 
+@api_call
 async def question_like(question_id: int, token: str) -> dict:
     """Поставить лайк вопросу"""
     headers = {'Authorization': f'Token {token}'}
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with _session(headers) as session:
         async with session.post(f'{BASE_URL}/question/{question_id}/like/') as resp:
             resp.raise_for_status()
             return await resp.json()
 
 
+@api_call
 async def question_dislike(question_id: int, token: str) -> dict:
     """Поставить дизлайк вопросу"""
     headers = {'Authorization': f'Token {token}'}
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with _session(headers) as session:
         async with session.post(f'{BASE_URL}/question/{question_id}/dislike/') as resp:
             resp.raise_for_status()
             return await resp.json()
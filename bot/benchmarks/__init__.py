@@ -0,0 +1,12 @@
+"""Микробенчмарки горячих функций бота.
+
+Каждый замер вызывает функцию напрямую, без Telegram и сети: бот подменён
+заглушкой, игры и игроки создаются фикстурами нужного размера (от одной игры
+до 10 000 одновременных, от одного игрока до 1000 в игре). Результат
+сохраняется в JSON и сравнивается с сохранённым ранее базовым прогоном.
+
+Запуск из каталога bot/:
+
+    python -m benchmarks --json bench.json
+    python -m benchmarks --baseline bench.json --threshold 0.25
+"""
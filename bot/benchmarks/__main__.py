@@ -0,0 +1,176 @@
+"""CLI микробенчмарков.
+
+    python -m benchmarks --games 1,100,10000 --players 1,100,1000 --json bench.json
+    python -m benchmarks --baseline bench.json --threshold 0.25   # код выхода 1 при регрессии
+    python -m benchmarks --only process_answer,text_
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import inspect
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+
+def parse_sizes(raw: str) -> list[int]:
+    return [int(part) for part in raw.split(',') if part.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Микробенчмарки горячих функций бота")
+    parser.add_argument('--games', type=parse_sizes, default=[1, 100, 10000], help="Размеры фикстур по числу одновременных игр")
+    parser.add_argument('--players', type=parse_sizes, default=[1, 100, 1000], help="Размеры фикстур по числу игроков в игре")
+    parser.add_argument('--only', default=None, help="Запустить только замеры, чьё имя начинается с одного из префиксов через запятую")
+    parser.add_argument('--repeat', type=int, default=5, help="Сколько серий замера; в отчёт идут медиана и минимум")
+    parser.add_argument('--min-time', type=float, default=0.05, help="Минимальная длительность одной серии, сек.")
+    parser.add_argument('--json', dest='json_path', default=None, help="Сохранить результаты в JSON")
+    parser.add_argument('--baseline', default=None, help="JSON прошлого прогона для сравнения")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Допустимое замедление медианы относительно базы (0.25 = +25%%)")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args(argv)
+
+
+async def _timed(call, number: int, is_async: bool) -> float:
+    started = time.perf_counter()
+    if is_async:
+        for _ in range(number):
+            await call()
+    else:
+        for _ in range(number):
+            call()
+    return time.perf_counter() - started
+
+
+async def measure(call, repeat: int, min_time: float) -> tuple[int, list[float]]:
+    """Подобрать число вызовов на серию (как timeit) и вернуть время серий."""
+    is_async = inspect.iscoroutinefunction(call)
+    number = 1
+    while True:
+        elapsed = await _timed(call, number, is_async)
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number = min(1_000_000, max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2)))
+    return number, [await _timed(call, number, is_async) for _ in range(repeat)]
+
+
+async def run(args) -> dict:
+    from benchmarks.cases import CASES
+
+    prefixes = [p for p in (args.only or '').split(',') if p]
+    results = {}
+    for bench in CASES:
+        if prefixes and not any(bench.name.startswith(p) for p in prefixes):
+            continue
+        sizes = {'games': args.games, 'players': args.players}.get(bench.param, [None])
+        for size in sizes:
+            key = bench.name if size is None else f"{bench.name}[{bench.param}={size}]"
+            prepared = bench.setup(size)
+            gc.collect()
+            gc.disable()
+            try:
+                number, series = await measure(prepared.call, args.repeat, args.min_time)
+            finally:
+                gc.enable()
+                if prepared.teardown:
+                    prepared.teardown()
+            per_op = [elapsed / number / prepared.ops * 1e6 for elapsed in series]
+            results[key] = {
+                'case': bench.name,
+                'param': bench.param,
+                'size': size,
+                'calls': number,
+                'ops_per_call': prepared.ops,
+                'median_us': round(statistics.median(per_op), 3),
+                'min_us': round(min(per_op), 3),
+            }
+            print(f"  {key:44} {results[key]['median_us']:>12.3f} мкс/оп", file=sys.__stdout__, flush=True)
+    # Фоновая очистка сообщений получила удаления от заглушки — дождёмся её
+    from message_cleanup import wait_idle
+    await wait_idle()
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[dict]:
+    """Сравнить медианы с базой; вернуть строки сравнения по общим замерам."""
+    rows = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if not base or not base.get('median_us'):
+            continue
+        ratio = current['median_us'] / base['median_us']
+        rows.append({
+            'key': key,
+            'baseline_us': base['median_us'],
+            'current_us': current['median_us'],
+            'ratio': round(ratio, 3),
+            'regression': ratio > 1 + threshold,
+        })
+    return rows
+
+
+def print_comparison(rows: list[dict], threshold: float):
+    print(f"\nСравнение с базой (порог +{threshold:.0%}):")
+    print(f"  {'benchmark':44} {'база, мкс':>12} {'сейчас, мкс':>12} {'x':>7}")
+    for row in rows:
+        mark = '  РЕГРЕССИЯ' if row['regression'] else ''
+        print(f"  {row['key']:44} {row['baseline_us']:>12.3f} {row['current_us']:>12.3f} {row['ratio']:>7.2f}{mark}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+
+    os.environ.setdefault('BOT_TOKEN', '123456:BENCHMARK')
+    # Тексты бота загружаются из API при импорте static.answer_texts —
+    # отвечает заглушка нагрузочного стенда
+    from loadtest.stub_api import StubApi
+
+    stub = StubApi(questions_per_game=10, time_to_answer=60)
+    stub.start()
+    os.environ['API_URL'] = stub.base_url
+
+    print("Замеры (медиана на операцию):")
+    try:
+        # Обработчики печатают отладку на каждый ответ — в отчёте это шум
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            results = asyncio.run(run(args))
+    finally:
+        stub.stop()
+
+    report = {
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('json_path', 'baseline')},
+        'results': results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline.get('results', {}), args.threshold)
+        print_comparison(rows, args.threshold)
+        report['comparison'] = {'baseline': args.baseline, 'threshold': args.threshold, 'rows': rows}
+        regressions = [row['key'] for row in rows if row['regression']]
+        if regressions:
+            print(f"\nРегрессии: {', '.join(regressions)}")
+            exit_code = 1
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
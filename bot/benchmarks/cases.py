@@ -0,0 +1,224 @@
+"""Набор замеров.
+
+Каждый замер регистрируется декоратором case(): функция подготовки получает
+размер фикстуры (число игр или игроков, если замер от него зависит) и
+возвращает Prepared — вызываемый объект, число операций за вызов и уборку.
+"""
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from typing import Callable
+
+from benchmarks.fixtures import (
+    StubBot,
+    chat_id_for,
+    clear_games,
+    make_game,
+    player_names,
+    populate_games,
+    release_game,
+    reset_question,
+)
+
+
+@dataclass
+class Prepared:
+    call: Callable  # обычная функция или корутинная функция без аргументов
+    ops: int = 1  # сколько операций выполняет один вызов
+    teardown: Callable[[], None] | None = None
+
+
+@dataclass
+class Case:
+    name: str
+    setup: Callable[[int | None], Prepared]
+    param: str | None = None  # 'games' | 'players' | None
+
+
+CASES: list[Case] = []
+
+
+def case(name: str, param: str | None = None):
+    def decorator(setup: Callable[[int | None], Prepared]):
+        CASES.append(Case(name, setup, param))
+        return setup
+    return decorator
+
+
+@case('process_answer', param='players')
+def _process_answer(players: int) -> Prepared:
+    """Все игроки отвечают на вопрос; последний ответ закрывает вопрос итогом."""
+    from helpers import process_answer
+
+    bot = StubBot()
+    game_state = make_game(players)
+    chat_id = chat_id_for(0)
+    question = game_state.current_question()
+    wrong = question.wrong_answers[0]
+    # Примерно как в живой игре: большинство отвечает верно
+    answers = [(name, question.right_answer if i % 3 else wrong) for i, name in enumerate(player_names(players))]
+
+    async def call():
+        reset_question(game_state)
+        # Очки с прошлых прогонов иначе копятся и раздувают таблицу
+        game_state.scores.clear()
+        for name, answer in answers:
+            await process_answer(bot, chat_id, game_state, name, answer)
+
+    return Prepared(call, ops=players, teardown=lambda: release_game(game_state))
+
+
+@case('check_if_all_answered', param='players')
+def _check_if_all_answered(players: int) -> Prepared:
+    """Проверка после очередного ответа, когда ответила ещё не вся комната."""
+    from helpers import check_if_all_answered
+
+    bot = StubBot()
+    game_state = make_game(players)
+    game_state.answers_right.update(player_names(players)[: players - 1])
+    chat_id = chat_id_for(0)
+
+    async def call():
+        await check_if_all_answered(bot, chat_id, game_state)
+
+    return Prepared(call, teardown=lambda: release_game(game_state))
+
+
+@case('send_next_question')
+def _send_next_question(_) -> Prepared:
+    """Отправка вопроса с вариантами: текст, перемешивание, клавиатура, таймер."""
+    from helpers import send_next_question
+
+    bot = StubBot()
+    game_state = make_game(3)
+    chat_id = chat_id_for(0)
+
+    async def call():
+        await send_next_question(bot, chat_id, game_state)
+
+    return Prepared(call, teardown=lambda: release_game(game_state))
+
+
+@case('shuffle_options')
+def _shuffle_options(_) -> Prepared:
+    """Фрагмент send_next_question: варианты вопроса и перемешивание (клавиатура — create_variant_keyboard)."""
+    game_state = make_game(1)
+    question = game_state.current_question()
+
+    def call():
+        options = question.options
+        random.shuffle(options)
+
+    return Prepared(call, teardown=lambda: release_game(game_state))
+
+
+@case('create_variant_keyboard')
+def _create_variant_keyboard(_) -> Prepared:
+    from keyboards import create_variant_keyboard
+
+    short = ['Да', 'Нет', 'Возможно', 'Не знаю']
+    long = [f"Довольно длинный вариант ответа номер {i}" for i in range(4)]
+
+    def call():
+        create_variant_keyboard(short)
+        create_variant_keyboard(long)
+
+    return Prepared(call, ops=2)
+
+
+@case('text_question')
+def _text_question(_) -> Prepared:
+    from static.answer_texts import TextStatics
+
+    game_state = make_game(1)
+    question = game_state.current_question()
+
+    def call():
+        TextStatics.format_question_text(3, question.text, 60, 10)
+
+    return Prepared(call, teardown=lambda: release_game(game_state))
+
+
+@case('text_dm_registration', param='players')
+def _text_dm_registration(players: int) -> Prepared:
+    from static.answer_texts import TextStatics
+    from states.local_state import LARGE_ROOM_TOP_N
+
+    names = player_names(players)
+    max_listed = LARGE_ROOM_TOP_N if players >= 50 else None
+
+    def call():
+        TextStatics.dm_registration_message(names, 120, max_listed=max_listed)
+
+    return Prepared(call)
+
+
+@case('text_dm_question_result', param='players')
+def _text_dm_question_result(players: int) -> Prepared:
+    """Полный итог вопроса со списками, как в комнатах меньше LARGE_ROOM_THRESHOLD."""
+    from static.answer_texts import TextStatics
+
+    names = player_names(players)
+    right = names[1::3] + names[2::3]
+    wrong = names[::3]
+    totals = {name: i % 5 for i, name in enumerate(names)}
+
+    def call():
+        TextStatics.dm_quiz_question_result_message(
+            right_answer='Вариант 1',
+            not_answered=[],
+            wrong_answers=wrong,
+            right_answers=right,
+            totals=totals,
+            comment=None,
+        )
+
+    return Prepared(call)
+
+
+@case('get_game_key_for_chat', param='games')
+def _get_game_key_for_chat(games: int) -> Prepared:
+    """Поиск игры чата среди games одновременных игр: найденной и отсутствующей."""
+    from states.local_state import _get_game_key_for_chat
+
+    keys = populate_games(games, players=1)
+    last_chat = chat_id_for(games - 1)
+    missing_chat = chat_id_for(games + 1)
+
+    def call():
+        _get_game_key_for_chat(last_chat)
+        _get_game_key_for_chat(missing_chat)
+
+    return Prepared(call, ops=2, teardown=lambda: clear_games(keys))
+
+
+@case('games_stats', param='games')
+def _games_stats(games: int) -> Prepared:
+    from game_sweeper import games_stats
+
+    keys = populate_games(games, players=3)
+    return Prepared(games_stats, teardown=lambda: clear_games(keys))
+
+
+@case('games_stats_size', param='games')
+def _games_stats_size(games: int) -> Prepared:
+    """Та же сводка с примерным объёмом игр (/diag/stats?size=1)."""
+    from game_sweeper import games_stats
+
+    keys = populate_games(games, players=3)
+    return Prepared(lambda: games_stats(estimate_size=True), teardown=lambda: clear_games(keys))
+
+
+@case('callback_decode')
+def _callback_decode(_) -> Prepared:
+    """Разбор callback_data таблицей маршрутов, включая отклоняемые данные."""
+    from callback_codec import callbacks
+
+    samples = ['answer:2', 'reg:join', 'next_question', 'like', 'plan_team:15', 'answer:x', 'unknown:data', '']
+
+    def call():
+        for data in samples:
+            callbacks.decode(data)
+
+    return Prepared(call, ops=len(samples))
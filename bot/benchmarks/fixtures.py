@@ -0,0 +1,117 @@
+"""Фикстуры микробенчмарков: заглушка бота, вопросы, игры и игроки."""
+from __future__ import annotations
+
+from collections import Counter
+from types import SimpleNamespace
+
+from question_cache import question_cache
+from states.local_state import GameState, _games_state, drop_game
+from static.choices import QuestionTypeChoices
+
+
+QUESTIONS_PER_GAME = 10
+# Чаты фикстур заведомо не пересекаются с настоящими group id
+CHAT_ID_BASE = -(10**13)
+
+
+class StubBot:
+    """Бот без сети: любые методы Bot API сразу возвращают «сообщение»."""
+
+    def __init__(self):
+        self.calls: Counter[str] = Counter()
+        # Как в Telegram, id сообщений идут своей последовательностью в каждом чате
+        self._message_ids: Counter[int] = Counter()
+
+    def _message(self, chat_id) -> SimpleNamespace:
+        self._message_ids[chat_id] += 1
+        return SimpleNamespace(message_id=self._message_ids[chat_id], chat=SimpleNamespace(id=chat_id), photo=None)
+
+    async def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        self.calls['send_message'] += 1
+        return self._message(chat_id)
+
+    async def send_photo(self, chat_id, photo=None, caption=None, reply_markup=None, **kwargs):
+        self.calls['send_photo'] += 1
+        return self._message(chat_id)
+
+    def __getattr__(self, method: str):
+        # edit_message_text, delete_messages и прочее — просто считаем вызов
+        async def call(*args, **kwargs):
+            self.calls[method] += 1
+            return True
+        return call
+
+
+def question_data(qid: int, question_type: str = QuestionTypeChoices.VARIANT) -> dict:
+    """Вопрос в том виде, в каком его отдаёт API."""
+    is_text = question_type == QuestionTypeChoices.TEXT
+    correct = f"ответ {qid}" if is_text else f"Вариант {qid}"
+    return {
+        'id': qid,
+        'text': f"Вопрос для замера {qid}: какой ответ правильный?",
+        'comment': None,
+        'question_type': question_type,
+        'game_use_type': 'dm',
+        'wrong_answers': [] if is_text else [f"Неверно {qid}.{k}" for k in range(3)],
+        'correct_answer': correct,
+        'correct_answers': [correct],
+        'time_to_answer': 60,
+        'image_url': None,
+    }
+
+
+def player_names(count: int) -> list[str]:
+    return [f"player{i}" for i in range(count)]
+
+
+def chat_id_for(idx: int) -> int:
+    return CHAT_ID_BASE - idx
+
+
+def make_game(players: int, questions: int = QUESTIONS_PER_GAME, first_qid: int = 1) -> GameState:
+    """DM-игра в статусе playing на первом вопросе с players участниками."""
+    game_state = GameState(mode="dm", status="playing")
+    game_state.load_questions([question_data(first_qid + i) for i in range(questions)])
+    game_state.players.update(player_names(players))
+    for name in game_state.players:
+        game_state.scores[name] = 0
+    question = game_state.current_question()
+    game_state.current_options = question.options
+    game_state.current_question_id = question.id
+    game_state.current_correct_answer = question.right_answer
+    return game_state
+
+
+def release_game(game_state: GameState) -> None:
+    """Уборка игры, созданной make_game() вне общего состояния."""
+    if game_state.timer_task:
+        game_state.timer_task.cancel()
+        game_state.timer_task = None
+    question_cache.release(game_state.question_ids)
+    game_state.question_ids = []
+
+
+def reset_question(game_state: GameState) -> None:
+    """Снова открыть текущий вопрос, чтобы на него можно было ответить ещё раз."""
+    game_state.answers_right.clear()
+    game_state.answers_wrong.clear()
+    game_state.attempts_left_by_user.clear()
+    game_state.question_result_sent = False
+    game_state.waiting_next = False
+    game_state.cleanup_message_ids.clear()
+
+
+def populate_games(count: int, players: int = 3) -> list[str]:
+    """Завести count одновременных игр в общем состоянии; вернуть их ключи."""
+    keys = []
+    for idx in range(count):
+        key = f"{chat_id_for(idx)}_pending"
+        # Вопросы у всех игр общие — кеш хранит по одной записи на вопрос
+        _games_state[key] = make_game(players)
+        keys.append(key)
+    return keys
+
+
+def clear_games(keys: list[str]) -> None:
+    for key in keys:
+        drop_game(key)
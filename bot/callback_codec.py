@@ -0,0 +1,155 @@
+"""Кодек callback_data и единая таблица маршрутов нажатий кнопок.
+
+callback_data имеет вид «ключ» (например, «reg:join») или «ключ:значение» для
+кнопок с параметром («answer:2», «plan_team:15»). Вместо десятков
+callback_query-обработчиков с лямбда-фильтрами, которые aiogram перебирает по
+очереди, у диспетчера один обработчик: он разбирает данные, находит маршрут
+в словаре по ключу и вызывает первый подходящий обработчик. Данные, которые
+не разбираются (неизвестный ключ, неверный тип параметра), отклоняются сразу,
+до поиска игры.
+
+Обработчики регистрируются декоратором callbacks.route(); порядок регистрации
+внутри одного ключа совпадает с порядком подключения модулей (сначала соло,
+затем групповые), как было с роутерами.
+"""
+from __future__ import annotations
+
+import inspect
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable
+
+from aiogram import Router, types
+from aiogram.fsm.context import FSMContext
+
+
+# Ограничение Telegram на длину callback_data, байт
+CALLBACK_DATA_LIMIT = 64
+
+# Имя обработчика, выбранного для текущего нажатия (для метрик и отладки)
+current_callback_route: ContextVar[str | None] = ContextVar("current_callback_route", default=None)
+
+Handler = Callable[..., Awaitable[Any]]
+Condition = Callable[[types.CallbackQuery, FSMContext], Awaitable[bool] | bool]
+
+
+def encode(key: str, value: Any = None) -> str:
+    data = key if value is None else f"{key}:{value}"
+    if len(data.encode()) > CALLBACK_DATA_LIMIT:
+        raise ValueError(f"callback_data длиннее {CALLBACK_DATA_LIMIT} байт: {data!r}")
+    return data
+
+
+def in_state(*states) -> Condition:
+    """Условие маршрута: пользователь находится в одном из состояний FSM."""
+    names = {s.state if hasattr(s, 'state') else s for s in states}
+
+    async def condition(callback: types.CallbackQuery, state: FSMContext) -> bool:
+        return await state.get_state() in names
+
+    return condition
+
+
+def in_chat(*chat_types: str) -> Condition:
+    def condition(callback: types.CallbackQuery, state: FSMContext) -> bool:
+        return callback.message is not None and callback.message.chat.type in chat_types
+
+    return condition
+
+
+class _Target:
+    __slots__ = ('handler', 'condition', 'wants_state', 'wants_value')
+
+    def __init__(self, handler: Handler, condition: Condition | None):
+        self.handler = handler
+        self.condition = condition
+        params = inspect.signature(handler).parameters
+        self.wants_state = 'state' in params
+        self.wants_value = 'value' in params
+
+
+class _Route:
+    __slots__ = ('key', 'value_type', 'targets')
+
+    def __init__(self, key: str, value_type: type | None):
+        self.key = key
+        self.value_type = value_type
+        self.targets: list[_Target] = []
+
+
+class CallbackTable:
+    def __init__(self):
+        # Ключи без параметра ищутся по полным данным, с параметром — по префиксу
+        self._exact: dict[str, _Route] = {}
+        self._prefixed: dict[str, _Route] = {}
+        self.rejected = 0
+
+    def route(self, *keys: str, value: type | None = None, when: Condition | None = None):
+        """Зарегистрировать обработчик для ключей; value — тип параметра после «:»."""
+        def decorator(handler: Handler) -> Handler:
+            table = self._exact if value is None else self._prefixed
+            for key in keys:
+                route = table.get(key)
+                if route is None:
+                    route = table[key] = _Route(key, value)
+                route.targets.append(_Target(handler, when))
+            return handler
+        return decorator
+
+    def decode(self, data: str | None) -> tuple[_Route, Any] | None:
+        """Разобрать callback_data; None — данные некорректны или не нам."""
+        if not data or len(data) > CALLBACK_DATA_LIMIT:
+            return None
+        route = self._exact.get(data)
+        if route is not None:
+            return route, None
+        key, sep, raw = data.rpartition(':')
+        if not sep:
+            return None
+        route = self._prefixed.get(key)
+        if route is None:
+            return None
+        try:
+            return route, route.value_type(raw)
+        except (TypeError, ValueError):
+            return None
+
+    async def dispatch(self, callback: types.CallbackQuery, state: FSMContext):
+        decoded = self.decode(callback.data)
+        if decoded is None:
+            return await self._reject(callback)
+        route, value = decoded
+        for target in route.targets:
+            if target.condition is not None:
+                matched = target.condition(callback, state)
+                if inspect.isawaitable(matched):
+                    matched = await matched
+                if not matched:
+                    continue
+            current_callback_route.set(target.handler.__name__)
+            kwargs = {}
+            if target.wants_state:
+                kwargs['state'] = state
+            if target.wants_value:
+                kwargs['value'] = value
+            return await target.handler(callback, **kwargs)
+        # Ни одно условие не подошло: например, ответ на вопрос уже закончившейся игры
+        return await self._reject(callback)
+
+    async def _reject(self, callback: types.CallbackQuery):
+        self.rejected += 1
+        current_callback_route.set('rejected')
+        try:
+            # Снимаем «часики» с кнопки
+            await callback.answer()
+        except Exception:
+            pass
+
+
+callbacks = CallbackTable()
+
+router = Router(name="callbacks")
+
+
+@router.callback_query()
+async def dispatch_callback(callback: types.CallbackQuery, state: FSMContext):
+    await callbacks.dispatch(callback, state)
@@ -0,0 +1,88 @@
+"""Последовательная обработка событий групповой игры по чатам.
+
+У каждого активного чата есть свой почтовый ящик и задача-обработчик: ответы,
+таймауты, нажатия «Далее» и завершение игры ставятся в очередь и применяются
+строго по одному, поэтому обработчикам не нужны блокировки и повторные
+проверки флагов после ожидания.
+
+Событие не должно ждать другое событие того же чата (это взаимная блокировка):
+отложенные действия планируются отдельной задачей, которая затем сама
+ставит событие в очередь через post_chat_event.
+
+Событие выполняется в контексте (contextvars) того обновления, которое его
+поставило, а не того, что первым разбудило обработчик чата: иначе trace
+первого обновления достался бы всем последующим событиям чата.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import time
+import traceback
+from typing import Awaitable, Callable
+
+
+ChatEvent = Callable[[], Awaitable[None]]
+
+# Сколько секунд обработчик живёт без событий, прежде чем завершиться
+ACTOR_IDLE_TIMEOUT = 60
+
+_actors: dict[int, "ChatActor"] = {}
+
+# Наблюдатели за выполнением событий (нужны нагрузочному тесту):
+# observer(chat_id, context, posted_at, started_at, finished_at), время — time.perf_counter().
+# Пока список пуст, время не замеряется вовсе
+event_observers: list[Callable[[int, contextvars.Context, float, float, float], None]] = []
+
+
+class ChatActor:
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self._mailbox: asyncio.Queue[tuple[ChatEvent, contextvars.Context, float]] = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+
+    def post(self, event: ChatEvent) -> None:
+        posted_at = time.perf_counter() if event_observers else 0.0
+        self._mailbox.put_nowait((event, contextvars.copy_context(), posted_at))
+        if self._task is None or self._task.done():
+            # Сам обработчик чата не наследует контекст обновления, которое его запустило
+            self._task = asyncio.create_task(
+                self._run(), name=f"chat-actor-{self.chat_id}", context=contextvars.Context(),
+            )
+
+    @property
+    def pending(self) -> int:
+        return self._mailbox.qsize()
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                try:
+                    event, context, posted_at = await asyncio.wait_for(self._mailbox.get(), timeout=ACTOR_IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    return
+                started_at = time.perf_counter() if event_observers else 0.0
+                try:
+                    await asyncio.create_task(event(), name=f"chat-event-{self.chat_id}", context=context)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"chat_actor {self.chat_id}: ошибка при обработке события: {e}")
+                    traceback.print_exc()
+                if event_observers and posted_at:
+                    finished_at = time.perf_counter()
+                    for observer in event_observers:
+                        observer(self.chat_id, context, posted_at, started_at, finished_at)
+        finally:
+            # Между таймаутом ожидания и этим местом нет await, так что новых
+            # событий в ящике быть не может — обработчик можно забыть
+            if _actors.get(self.chat_id) is self:
+                del _actors[self.chat_id]
+
+
+def post_chat_event(chat_id: int, event: ChatEvent) -> None:
+    """Поставить событие в очередь чата; оно выполнится после всех предыдущих."""
+    actor = _actors.get(chat_id)
+    if actor is None:
+        actor = _actors[chat_id] = ChatActor(chat_id)
+    actor.post(event)
@@ -0,0 +1,206 @@
+"""Часы бота: настоящие или виртуальные.
+
+Все игровые таймеры (время на ответ, напоминания, паузы между вопросами,
+конец регистрации, перерисовка регистрации, сборщик брошенных игр) берут
+время и спят через этот модуль, а не напрямую через time/datetime/asyncio.
+По умолчанию это обычные часы. VirtualTimeLoop — цикл событий с
+виртуальным временем: когда делать больше нечего, он не ждёт, а сразу
+переводит часы к ближайшему таймеру. Игра из десяти вопросов по 120 секунд
+проходит за миллисекунды, а порядок событий на одной и той же сцене всегда
+один и тот же, поэтому гонки «ответ против таймаута» воспроизводятся.
+
+Для этого таймеры на одно и то же мгновение срабатывают в порядке, в котором
+их завели (в asyncio порядок равных таймеров зависит от формы кучи, то есть
+от таймеров других чатов). Настоящий ввод-вывод (запросы к API) занимает
+нулевое виртуальное время: часы не двигаются, пока он не завершится весь.
+События разных чатов в такое мгновение могут чередоваться по-разному,
+порядок внутри чата — нет. Если ввод-вывод не завершился за IO_WAIT_LIMIT,
+часы всё же переводятся, а случай считается в io_wait_timeouts — такой
+прогон уже не обязан повторяться.
+
+    import clock
+    result = clock.run_virtual(simulation())
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import selectors
+import time
+from datetime import datetime, timedelta
+
+
+class RealClock:
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def utcnow(self) -> datetime:
+        return datetime.utcnow()
+
+    async def sleep(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+
+
+class VirtualClock(RealClock):
+    """Часы, которые показывают время цикла VirtualTimeLoop."""
+
+    def __init__(self, loop: "VirtualTimeLoop", start: datetime):
+        self.loop = loop
+        self.start = start
+
+    def monotonic(self) -> float:
+        return self.loop.time()
+
+    def utcnow(self) -> datetime:
+        return self.start + timedelta(seconds=self.loop.time())
+
+    # sleep наследуется: asyncio.sleep в виртуальном цикле уже виртуальный
+
+
+_clock: RealClock = RealClock()
+
+
+def get_clock() -> RealClock:
+    return _clock
+
+
+def set_clock(new_clock: RealClock) -> RealClock:
+    """Подменить часы; возвращает прежние, чтобы их можно было вернуть."""
+    global _clock
+    previous, _clock = _clock, new_clock
+    return previous
+
+
+def monotonic() -> float:
+    return _clock.monotonic()
+
+
+def utcnow() -> datetime:
+    return _clock.utcnow()
+
+
+async def sleep(seconds: float) -> None:
+    await _clock.sleep(seconds)
+
+
+# Сколько настоящих секунд виртуальный цикл ждёт ввода-вывода, не двигая часы
+IO_WAIT_LIMIT = 5.0
+
+
+class _OrderedTimerHandle(asyncio.TimerHandle):
+    """Таймер, который при равном времени уступает заведённым раньше."""
+
+    __slots__ = ('_seq',)
+
+    def __init__(self, when, callback, args, loop, context, seq: int):
+        super().__init__(when, callback, args, loop, context)
+        self._seq = seq
+
+    def __lt__(self, other):
+        if self._when == other._when:
+            return self._seq < other._seq
+        return self._when < other._when
+
+    def __le__(self, other):
+        return self == other or self < other
+
+    def __gt__(self, other):
+        return other < self
+
+    def __ge__(self, other):
+        return self == other or other < self
+
+
+class _VirtualSelector(selectors.BaseSelector):
+    """Селектор, который вместо ожидания переводит виртуальные часы цикла."""
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self.loop: VirtualTimeLoop | None = None
+
+    def register(self, fileobj, events, data=None):
+        return self._selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        return self._selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        return self._selector.modify(fileobj, events, data)
+
+    def get_map(self):
+        return self._selector.get_map()
+
+    def close(self):
+        self._selector.close()
+
+    def select(self, timeout=None):
+        ready = self._selector.select(0)
+        if ready or timeout == 0:
+            return ready
+        if timeout is None:
+            return self._selector.select(None)
+        if not self.loop._idle():
+            # Идёт настоящий ввод-вывод (сеть, поток исполнителя): ждём его,
+            # не двигая часы, — для игры он занимает нулевое время. Часы
+            # переводим, только если ответа нет дольше IO_WAIT_LIMIT
+            ready = self._selector.select(IO_WAIT_LIMIT)
+            if ready:
+                return ready
+            self.loop.io_wait_timeouts += 1
+        self.loop._advance(timeout)
+        return []
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    def __init__(self):
+        selector = _VirtualSelector()
+        super().__init__(selector)
+        selector.loop = self
+        self._now = 0.0
+        self._executor_jobs = 0
+        self._timer_seq = itertools.count()
+        # Сколько раз часы переведены, не дождавшись ввода-вывода
+        self.io_wait_timeouts = 0
+
+    def time(self) -> float:
+        return self._now
+
+    def call_at(self, when, callback, *args, context=None):
+        # Как BaseEventLoop.call_at, но с порядковым номером таймера
+        if when is None:
+            raise TypeError("when cannot be None")
+        self._check_closed()
+        timer = _OrderedTimerHandle(when, callback, args, self, context, next(self._timer_seq))
+        if timer._source_traceback:
+            del timer._source_traceback[-1]
+        heapq.heappush(self._scheduled, timer)
+        timer._scheduled = True
+        return timer
+
+    def _advance(self, seconds: float) -> None:
+        self._now += seconds
+
+    def _idle(self) -> bool:
+        # Кроме служебного сокета самого цикла, никто не ждёт ввода-вывода
+        return self._executor_jobs == 0 and len(self._selector.get_map()) <= 1
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self._executor_jobs += 1
+        future.add_done_callback(self._executor_job_done)
+        return future
+
+    def _executor_job_done(self, _future) -> None:
+        self._executor_jobs -= 1
+
+
+def run_virtual(coro, start: datetime | None = None):
+    """Выполнить корутину в виртуальном времени с виртуальными часами бота."""
+    with asyncio.Runner(loop_factory=VirtualTimeLoop) as runner:
+        loop = runner.get_loop()
+        previous = set_clock(VirtualClock(loop, start or datetime(2025, 1, 1)))
+        try:
+            return runner.run(coro)
+        finally:
+            set_clock(previous)
@@ -0,0 +1,319 @@
+"""Диагностика бота на ходу: задержка цикла событий, перепись задач, снимки памяти.
+
+LoopLagMonitor раз в LOOP_LAG_INTERVAL проверяет, насколько позже срока
+проснулась его задача, — это задержка цикла событий. Отдельный поток следит
+за тем же сердцебиением: если цикл не отвечает дольше LOOP_LAG_THRESHOLD, он
+снимает стек потока цикла, то есть того кода, который сейчас его держит, и
+пишет его в лог. Пока задержка выше порога (и ещё LOOP_LAG_DEGRADED_FOR
+секунд после), /health отвечает «degraded».
+
+task_census() группирует asyncio.all_tasks() по имени корутины — видно, если
+копятся таймеры или очереди чатов. AllocationTracker включает tracemalloc по
+команде (/diag memory start, ?action=start) и показывает места с наибольшими
+выделениями памяти и прирост с прошлого снимка; выключается он тоже явно.
+
+Всё это доступно администраторам: по /diag/* с заголовком X-Diag-Token (если
+задан DIAG_TOKEN) и командой /diag в Telegram (ADMIN_USERS). Под той же
+защитой и /diag/stats веб-хука (main, sharding).
+"""
+from __future__ import annotations
+
+import asyncio
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import traceback
+from collections import Counter, deque
+
+from aiohttp import web
+
+
+# Период проверки задержки цикла, сек.
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", 0.5))
+# С какой задержки цикла пишем стек в лог и считаем бота degraded, сек.
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", 0.5))
+# Сколько секунд после последней большой задержки /health ещё отвечает degraded
+LOOP_LAG_DEGRADED_FOR = float(os.getenv("LOOP_LAG_DEGRADED_FOR", 60))
+# Токен для /diag/*; без него HTTP-диагностика выключена
+DIAG_TOKEN = os.getenv("DIAG_TOKEN", "")
+# Сколько кадров стека хранит tracemalloc
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", 10))
+
+STACK_LIMIT = 30
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.slow_total = 0
+        self.last_slow_at: float | None = None
+        self.last_slow_lag = 0.0
+        # Последние зависания цикла со стеком кода, который его держал
+        self.stalls: deque[dict] = deque(maxlen=20)
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run(), name="loop-lag-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - expected)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                self.slow_total += 1
+                self.last_slow_at = now
+                self.last_slow_lag = lag
+                logger.warning(f"Задержка цикла событий {lag:.3f} с")
+
+    def _watch(self):
+        # Стек снимаем один раз на каждое зависание, а не на каждую проверку
+        sampled_heartbeat = None
+        while not self._stop.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or heartbeat == sampled_heartbeat:
+                continue
+            sampled_heartbeat = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = ''.join(traceback.format_stack(frame, limit=STACK_LIMIT))
+            self.stalls.append({'at': time.time(), 'stalled_s': round(stalled, 3), 'stack': stack})
+            logger.warning(f"Цикл событий не отвечает {stalled:.2f} с, сейчас выполняется:\n{stack}")
+
+    def current_stall(self) -> float:
+        """Сколько секунд цикл уже не отвечает сверх обычного интервала."""
+        if self._task is None:
+            return 0.0
+        return max(0.0, time.monotonic() - self._heartbeat - self.interval)
+
+    def degraded_reason(self) -> str | None:
+        stall = self.current_stall()
+        if stall >= self.threshold:
+            return f"цикл событий не отвечает {stall:.2f} с"
+        if self.last_slow_at is not None and time.monotonic() - self.last_slow_at < LOOP_LAG_DEGRADED_FOR:
+            ago = time.monotonic() - self.last_slow_at
+            return f"задержка цикла событий {self.last_slow_lag:.2f} с {ago:.0f} с назад (порог {self.threshold} с)"
+        return None
+
+    def stats(self) -> dict:
+        return {
+            'running': self._task is not None,
+            'interval_s': self.interval,
+            'threshold_s': self.threshold,
+            'last_lag_ms': round(self.last_lag * 1000, 2),
+            'max_lag_ms': round(self.max_lag * 1000, 2),
+            'slow_total': self.slow_total,
+            'current_stall_ms': round(self.current_stall() * 1000, 2),
+            'degraded': self.degraded_reason(),
+            'stalls': list(self.stalls),
+        }
+
+
+loop_monitor = LoopLagMonitor()
+
+
+def _coroutine_name(task: asyncio.Task) -> str:
+    coro = task.get_coro()
+    return getattr(coro, '__qualname__', None) or type(coro).__name__
+
+
+def task_census(limit: int = 30) -> dict:
+    """Задачи цикла событий по имени корутины, самые многочисленные — первыми."""
+    tasks = asyncio.all_tasks()
+    by_coroutine = Counter(_coroutine_name(task) for task in tasks)
+    return {
+        'total': len(tasks),
+        'by_coroutine': dict(by_coroutine.most_common(limit)),
+    }
+
+
+class AllocationTracker:
+    """Снимки tracemalloc по требованию; трассировка замедляет бота, поэтому выключена по умолчанию."""
+
+    # Выделения самой диагностики и импорта модулей — шум
+    _FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    )
+
+    def __init__(self):
+        self._previous: tracemalloc.Snapshot | None = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = TRACEMALLOC_FRAMES) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self._previous = None
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self._previous = None
+
+    def snapshot(self, limit: int = 15) -> dict:
+        """Топ мест выделения памяти и прирост с прошлого снимка."""
+        if not tracemalloc.is_tracing():
+            return {'tracing': False}
+        snapshot = tracemalloc.take_snapshot().filter_traces(self._FILTERS)
+        current, peak = tracemalloc.get_traced_memory()
+        report = {
+            'tracing': True,
+            'current_kb': round(current / 1024, 1),
+            'peak_kb': round(peak / 1024, 1),
+            'top': [
+                {'where': str(stat.traceback), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:limit]
+            ],
+        }
+        if self._previous is not None:
+            report['growth'] = [
+                {'where': str(stat.traceback), 'size_diff_kb': round(stat.size_diff / 1024, 1), 'count_diff': stat.count_diff}
+                for stat in snapshot.compare_to(self._previous, 'lineno')[:limit]
+                if stat.size_diff > 0
+            ]
+        self._previous = snapshot
+        return report
+
+
+allocations = AllocationTracker()
+
+
+def summary_text() -> str:
+    """Короткая сводка для команды /diag."""
+    lag = loop_monitor.stats()
+    lines = [
+        f"Цикл событий: задержка {lag['last_lag_ms']} мс, максимум {lag['max_lag_ms']} мс, "
+        f"превышений порога {lag['slow_total']}",
+        f"Состояние: {lag['degraded'] or 'ok'}",
+    ]
+    census = task_census(limit=10)
+    lines.append(f"\nЗадачи ({census['total']}):")
+    lines.extend(f"  {count} × {name}" for name, count in census['by_coroutine'].items())
+    return '\n'.join(lines)
+
+
+def memory_text(action: str | None = None) -> str:
+    """Ответ на /diag memory [start|stop]; снимок долгий, вызывать из потока.
+
+    Трассировку включают и выключают явно: снимок сразу после включения почти
+    пуст, а полезен он, когда tracemalloc проработал какое-то время.
+    """
+    if action == 'start':
+        allocations.start()
+        return "Трассировка памяти включена. Снимок — /diag memory, выключить — /diag memory stop"
+    if action == 'stop':
+        allocations.stop()
+        return "Трассировка памяти выключена"
+    if action is not None:
+        return "Использование: /diag memory [start|stop]"
+    snapshot = allocations.snapshot(limit=10)
+    if not snapshot['tracing']:
+        return "Трассировка памяти выключена, включить — /diag memory start"
+    lines = [f"Память (tracemalloc): {snapshot['current_kb']} КБ, пик {snapshot['peak_kb']} КБ"]
+    for stat in snapshot.get('growth') or snapshot['top']:
+        size = stat.get('size_diff_kb', stat.get('size_kb'))
+        lines.append(f"  {size} КБ — {stat['where']}")
+    return '\n'.join(lines)
+
+
+# --- HTTP: /diag/* ---
+
+def auth_headers() -> dict[str, str]:
+    """Заголовок для запроса к /diag/* другого процесса бота (фронт → шард)."""
+    return {'X-Diag-Token': DIAG_TOKEN} if DIAG_TOKEN else {}
+
+
+def _authorized(request: web.Request) -> bool:
+    token = request.headers.get('X-Diag-Token', '')
+    return bool(DIAG_TOKEN) and hmac.compare_digest(token, DIAG_TOKEN)
+
+
+def _query_limit(request: web.Request, default: int) -> int:
+    try:
+        limit = int(request.query.get('limit', default))
+    except ValueError:
+        raise web.HTTPBadRequest(text="limit должен быть целым числом")
+    if limit <= 0:
+        raise web.HTTPBadRequest(text="limit должен быть больше нуля")
+    return limit
+
+
+def guarded(handler):
+    """Обработчик только для администраторов: 404 без DIAG_TOKEN, 403 без верного X-Diag-Token."""
+    async def wrapper(request: web.Request):
+        if not DIAG_TOKEN:
+            raise web.HTTPNotFound()
+        if not _authorized(request):
+            raise web.HTTPForbidden()
+        return await handler(request)
+    return wrapper
+
+
+@guarded
+async def loop_handler(request: web.Request):
+    return web.json_response(loop_monitor.stats())
+
+
+@guarded
+async def tasks_handler(request: web.Request):
+    return web.json_response(task_census(limit=_query_limit(request, 30)))
+
+
+@guarded
+async def memory_handler(request: web.Request):
+    # ?action=start|stop включает и выключает tracemalloc, без него — снимок
+    action = request.query.get('action')
+    if action == 'start':
+        allocations.start()
+        return web.json_response({'tracing': True})
+    if action == 'stop':
+        allocations.stop()
+        return web.json_response({'tracing': False})
+    if action is not None:
+        raise web.HTTPBadRequest(text="action: start или stop")
+    limit = _query_limit(request, 15)
+    # Снимок занимает заметное время — не держим цикл событий
+    snapshot = await asyncio.to_thread(allocations.snapshot, limit)
+    return web.json_response(snapshot)
+
+
+def add_routes(app: web.Application) -> None:
+    app.router.add_get('/diag/loop', loop_handler)
+    app.router.add_get('/diag/tasks', tasks_handler)
+    app.router.add_get('/diag/memory', memory_handler)
@@ -0,0 +1,142 @@
+"""Сборщик брошенных групповых игр.
+
+Игры, застрявшие в регистрации или посреди вопросов (ошибка в обработчике,
+бота удалили из чата, никто не нажал «Далее»), иначе навсегда остаются в
+_games_state вместе с таймерами и закреплёнными вопросами. Сборщик
+периодически ищет игры без активности игроков дольше GAME_IDLE_TIMEOUT и без
+работающего таймера: идущие игры завершает с публикацией результатов,
+остальные просто удаляет. Снятие игры выполняется событием в очереди чата,
+чтобы не пересечься с обработкой ответа.
+
+Заодно сборщик снимает закрепление вопросов соло-игр, в которых игрок ничего
+не делал дольше SOLO_IDLE_TIMEOUT (question_cache.expire_leases).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+
+import clock
+from chat_actor import post_chat_event
+from message_cleanup import schedule_delete
+from question_cache import question_cache
+from states.local_state import GameState, _games_state, drop_game
+
+
+# Сколько секунд без действий игроков игра считается брошенной
+GAME_IDLE_TIMEOUT = int(os.getenv("GAME_IDLE_TIMEOUT", 1800))
+# Сколько секунд без действий держим в кеше вопросы соло-игры
+SOLO_IDLE_TIMEOUT = int(os.getenv("SOLO_IDLE_TIMEOUT", 3600))
+# Период проверки, сек.
+GAME_SWEEP_INTERVAL = int(os.getenv("GAME_SWEEP_INTERVAL", 60))
+
+logger = logging.getLogger(__name__)
+
+
+def _chat_id_from_key(game_key: str) -> int | None:
+    try:
+        return int(str(game_key).split('_', 1)[0])
+    except ValueError:
+        return None
+
+
+def is_abandoned(game_state: GameState, now: float | None = None) -> bool:
+    if game_state.status == "finished":
+        # Завершённая игра сама удаляет себя; если она ещё здесь — это утечка
+        return True
+    if game_state.timer_task is not None and not game_state.timer_task.done():
+        # Идёт регистрация или вопрос — игра сама продвинется по таймеру
+        return False
+    return game_state.idle_for(now) > GAME_IDLE_TIMEOUT
+
+
+async def _sweep_game(bot, chat_id: int, game_key: str, game_state: GameState):
+    # Пока событие ждало очереди, игра могла ожить или смениться новой
+    if _games_state.get(game_key) is not game_state or not is_abandoned(game_state):
+        return
+    logger.info(f"Сборщик: снимаем игру {game_key} (статус {game_state.status}, простой {int(game_state.idle_for())} с)")
+    if game_state.status == "playing":
+        from helpers import finalize_game
+
+        # Результаты публикуются как при обычном завершении; игра удалится в finalize_game
+        await finalize_game(bot, chat_id, game_state)
+        return
+    stale_ids = list(game_state.registration_message_ids)
+    stale_ids.append(game_state.message_id)
+    drop_game(game_key)
+    schedule_delete(bot, chat_id, stale_ids)
+
+
+def sweep_games(bot) -> int:
+    """Поставить в очереди чатов снятие всех брошенных игр; вернуть их число."""
+    now = clock.monotonic()
+    swept = 0
+    for game_key, game_state in list(_games_state.items()):
+        if not is_abandoned(game_state, now):
+            continue
+        swept += 1
+        chat_id = _chat_id_from_key(game_key)
+        if chat_id is None:
+            # Ключ без чата (например, "None_pending") — писать некуда
+            drop_game(game_key)
+            continue
+        post_chat_event(chat_id, lambda k=game_key, g=game_state, c=chat_id: _sweep_game(bot, c, k, g))
+    return swept
+
+
+def games_stats(estimate_size: bool = False) -> dict:
+    """Живые игры по статусам.
+
+    estimate_size — ещё и примерный объём в памяти: обход всех игр через
+    getsizeof, на тысячах игр это миллисекунды в цикле событий, поэтому
+    только по явному запросу.
+    """
+    games = list(_games_state.values())
+    by_status: dict[str, int] = {}
+    for game_state in games:
+        by_status[game_state.status] = by_status.get(game_state.status, 0) + 1
+    stats = {
+        'live': len(games),
+        'by_status': by_status,
+    }
+    if estimate_size:
+        stats['estimated_bytes'] = sum(game_state.estimated_size() for game_state in games)
+    return stats
+
+
+def games_by_mode() -> dict[tuple[str, str], int]:
+    """Живые групповые игры по (режим, статус); соло-игры живут в FSM и сюда не входят."""
+    counts: dict[tuple[str, str], int] = {}
+    for game_state in list(_games_state.values()):
+        key = (game_state.mode, game_state.status)
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def pending_timers() -> dict[tuple[str], int]:
+    """Незавершённые таймеры игр (регистрация, время на ответ, пауза) по режиму."""
+    counts: dict[tuple[str], int] = {}
+    for game_state in list(_games_state.values()):
+        if game_state.timer_task is not None and not game_state.timer_task.done():
+            counts[(game_state.mode,)] = counts.get((game_state.mode,), 0) + 1
+    return counts
+
+
+async def run_game_sweeper(bot, interval: float = GAME_SWEEP_INTERVAL):
+    while True:
+        await clock.sleep(interval)
+        try:
+            swept = sweep_games(bot)
+            expired = question_cache.expire_leases(SOLO_IDLE_TIMEOUT)
+            stats = games_stats()
+            logger.info(
+                f"Игры в памяти: {stats['live']} {stats['by_status']}, снято брошенных: {swept}, "
+                f"соло-игр с освобождёнными вопросами: {expired}"
+            )
+        except Exception as e:
+            logger.error(f"Ошибка сборщика игр: {e}")
+
+
+def start_game_sweeper(bot) -> asyncio.Task:
+    return asyncio.create_task(run_game_sweeper(bot), name="game-sweeper")
@@ -25,7 +25,12 @@ from api_client import (
 from keyboards import main_menu_keyboard, confirm_start_keyboard, create_variant_keyboard, private_menu_keyboard, question_result_keyboard, new_chat_welcome_keyboard, existing_chat_welcome_keyboard
 from static.answer_texts import TextStatics
 from static import answer_texts
-from helpers import fetch_question_and_cancel, load_and_send_image, stop_quiz
+from helpers import fetch_question_and_cancel, load_and_send_image, stop_quiz, clear_solo_state, get_difficulty_mix, solo_question
+from message_cleanup import schedule_delete
+import clock
+import diagnostics
+from callback_codec import callbacks, in_chat, in_state
+from question_cache import QuestionRecord, question_cache
 from static.choices import QuestionTypeChoices
 
 
@@ -56,39 +61,39 @@ async def on_my_chat_member(update: types.ChatMemberUpdated, state: FSMContext):
         pass
 
 
-def schedule_question_timeout_solo(delay: int, state: FSMContext, index: int, q: dict, message: types.Message, send_question_fn) -> asyncio.Task:
+def schedule_question_timeout_solo(delay: int, state: FSMContext, index: int, q: QuestionRecord, message: types.Message, send_question_fn) -> asyncio.Task:
     async def timer():
         message_30 = None
         message_10 = None
         try:
             # Промежуточные уведомления на 30 и 10 секунд
             if delay > 30:
-                await asyncio.sleep(delay - 30)
+                await clock.sleep(delay - 30)
                 curr_data = await state.get_data()
                 if (await state.get_state()) == SoloGameStates.WAITING_ANSWER and curr_data.get('current_index', 0) == index:
                     message_30 = await message.answer(TextStatics.time_left_30())
             
             if delay > 10:
-                await asyncio.sleep(20)  # Дополнительные 20 секунд до 10 секунд остатка
+                await clock.sleep(20)  # Дополнительные 20 секунд до 10 секунд остатка
                 curr_data = await state.get_data()
                 if (await state.get_state()) == SoloGameStates.WAITING_ANSWER and curr_data.get('current_index', 0) == index:
                     message_10 = await message.answer(TextStatics.time_left_10())
             
             # Финальное ожидание до конца времени
-            await asyncio.sleep(10)
+            await clock.sleep(10)
             curr_data = await state.get_data()
             if (await state.get_state()) == SoloGameStates.WAITING_ANSWER and curr_data.get('current_index', 0) == index:
                 # Проверяем, является ли это последним вопросом
-                questions = curr_data.get('questions', [])
-                is_last_question = (index + 1) >= len(questions)
+                question_ids = curr_data.get('question_ids', [])
+                is_last_question = (index + 1) >= len(question_ids)
                 
                 # В соло показываем тот же подробный формат, но без списков участников
                 result_text = TextStatics.dm_quiz_question_result_message(
-                    right_answer=q.get("correct_answers", [q["correct_answer"]])[0],
+                    right_answer=q.right_answer,
                     not_answered=[],
                     wrong_answers=[],
                     right_answers=[],
-                    comment=q.get('comment', None),
+                    comment=q.comment,
                 )
                 await message.answer(result_text, reply_markup=question_result_keyboard(is_last_question=is_last_question))
                 await state.update_data(incorrect=curr_data.get('incorrect', 0) + 1)
@@ -127,10 +132,10 @@ def schedule_question_timeout_solo(delay: int, state: FSMContext, index: int, q:
 async def send_question(message: types.Message, state: FSMContext):
     data = await state.get_data()
     index = data.get('current_index', 0)
-    questions = data.get('questions', [])
+    question_ids = data.get('question_ids', [])
     quiz_info = data.get('quiz_info', {})
 
-    if index >= len(questions):
+    if index >= len(question_ids):
         correct = data.get('correct', 0)
         incorrect = data.get('incorrect', 0)
         # Сначала отправим результат на backend, чтобы получить актуальный стрик
@@ -155,54 +160,38 @@ async def send_question(message: types.Message, state: FSMContext):
             pass
         final_text = TextStatics.get_single_game_answer(correct, incorrect) + streak_suffix
         await message.answer(final_text)
-        await state.clear()
+        await clear_solo_state(state)
         return
 
-    q = questions[index]
-    text = q['text']
-    q_type = q['question_type']
+    q = await solo_question(state, question_ids[index])
+    if q is None:
+        await message.answer("Игра прервана из-за долгого простоя. Начните новую")
+        return
+    text = q.text
+    q_type = q.question_type
     time_limit = quiz_info.get('time_to_answer', 10)
     
     # Сохраняем ID текущего вопроса для лайков/дизлайков и массив сообщений к удалению
-    await state.update_data(current_question_id=q.get('id'))
-    cleanup_ids = (data.get('cleanup_message_ids') or [])
-    # Перед отправкой нового вопроса — удалим старые вспомогательные, ответы пользователей и вопрос
-    for mid in cleanup_ids + [data.get('last_question_msg_id')]:
-        if mid:
-            try:
-                await message.bot.delete_message(message.chat.id, mid)
-            except Exception:
-                pass  # Нет прав или сообщение уже удалено
+    await state.update_data(current_question_id=q.id)
+    # Старые вспомогательные сообщения, ответы пользователей и вопрос удалим после отправки нового
+    stale_ids = (data.get('cleanup_message_ids') or []) + [data.get('last_question_msg_id')]
     await state.update_data(cleanup_message_ids=[])
 
-    question_text = TextStatics.format_question_text(index + 1, text, time_limit, len(questions))
+    question_text = TextStatics.format_question_text(index + 1, text, time_limit, len(question_ids))
+    # Проверяем, есть ли изображение в вопросе
+    image_url = q.image_url
     if q_type == QuestionTypeChoices.VARIANT:
-        options = q['wrong_answers'] + [q['correct_answer']]
+        options = q.options
         random.shuffle(options)
         markup = create_variant_keyboard(options)
         await state.update_data(current_options=options)
-        # Удаляем предыдущий вопрос
-        if data.get('last_question_msg_id'):
-            try:
-                await message.bot.delete_message(message.chat.id, data['last_question_msg_id'])
-            except Exception:
-                pass
-        # Проверяем, есть ли изображение в вопросе
-        image_url = q.get("image_url")
         sent = await load_and_send_image(message.bot, message.chat.id, image_url, question_text, reply_markup=markup)
-        await state.update_data(last_question_msg_id=sent.message_id)
     else:
         # Сброс попыток для текстового вопроса в соло
         await state.update_data(attempts_left=2)
-        if data.get('last_question_msg_id'):
-            try:
-                await message.bot.delete_message(message.chat.id, data['last_question_msg_id'])
-            except Exception:
-                pass
-        # Проверяем, есть ли изображение в вопросе
-        image_url = q.get("image_url")
         sent = await load_and_send_image(message.bot, message.chat.id, image_url, question_text)
-        await state.update_data(last_question_msg_id=sent.message_id)
+    await state.update_data(last_question_msg_id=sent.message_id)
+    schedule_delete(message.bot, message.chat.id, stale_ids)
 
     task = schedule_question_timeout_solo(time_limit, state, index, q, message, send_question)
     await state.update_data(timer_task=task)
@@ -315,7 +304,7 @@ async def quizplease_command(message: types.Message, state: FSMContext):
         await message.answer(TextStatics.select_mode_message(), reply_markup=main_menu_keyboard())
 
 
-@router.callback_query(lambda c: c.data == 'game:solo')
+@callbacks.route('game:solo')
 async def callback_solo(callback: types.CallbackQuery, state: FSMContext):
 
     if await state.get_state():
@@ -344,22 +333,27 @@ async def callback_solo(callback: types.CallbackQuery, state: FSMContext):
 
     configs = await get_configs(system_token)
     amount_questions = int([config['value'] for config in configs if config['name'] == 'amount_questions_solo'][0])
+    difficulty_mix = get_difficulty_mix(configs, 'difficulty_mix_solo')
 
     questions_data = await get_rotated_questions_solo(
         system_token=system_token,
         telegram_id=callback.from_user.id,
-        size=amount_questions,
-        time_to_answer=quiz['time_to_answer']
+        size=sum(difficulty_mix.values()) if difficulty_mix else amount_questions,
+        time_to_answer=quiz['time_to_answer'],
+        difficulty_mix=difficulty_mix,
     )
 
     if not questions_data.get('questions'):
         await callback.message.answer("Нет доступных вопросов для solo игр")
         return
     
-    await state.update_data(quiz_info=quiz, questions=questions_data['questions'], current_index=0, correct=0, incorrect=0, last_question_msg_id=None)
+    # В FSM храним только id: сами вопросы лежат в общем кеше. Аренда по ключу
+    # FSM снимает закрепление прошлой, брошенной соло-игры этого игрока
+    question_ids = question_cache.lease(state.key, questions_data['questions'])
+    await state.update_data(quiz_info=quiz, question_ids=question_ids, current_index=0, correct=0, incorrect=0, last_question_msg_id=None)
 
     start_text = TextStatics.get_solo_start_text(
-        "Соло викторина", len(questions_data['questions'])
+        "Соло викторина", len(question_ids)
     )
     await callback.message.edit_text(start_text, reply_markup=confirm_start_keyboard())
     await state.set_state(SoloGameStates.WAITING_CONFIRM)
@@ -368,15 +362,15 @@ async def callback_solo(callback: types.CallbackQuery, state: FSMContext):
 
 
 
-@router.callback_query(SoloGameStates.WAITING_CONFIRM, lambda c: c.data == 'game:solo:start')
+@callbacks.route('game:solo:start', when=in_state(SoloGameStates.WAITING_CONFIRM))
 async def confirm_start(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
     # Start the quiz
     await send_question(callback.message, state)
 
 
-@router.callback_query(SoloGameStates.WAITING_ANSWER, lambda c: c.data and c.data.startswith('answer:'))
-async def answer_callback(callback: types.CallbackQuery, state: FSMContext):
+@callbacks.route('answer', value=int, when=in_state(SoloGameStates.WAITING_ANSWER))
+async def answer_callback(callback: types.CallbackQuery, state: FSMContext, value: int):
     await callback.answer()
     index, q = await fetch_question_and_cancel(state)
 
@@ -384,41 +378,37 @@ async def answer_callback(callback: types.CallbackQuery, state: FSMContext):
         return
 
     data = await state.get_data()
-    selected = callback.data.split(':', 1)[1]
-    try:
-        selected_idx = int(selected)
-    except ValueError:
-        selected_idx = -1
-    options = (await state.get_data()).get('current_options') or (q['wrong_answers'] + [q['correct_answer']])
-    is_correct = 0 <= selected_idx < len(options) and options[selected_idx] == q['correct_answer']
+    selected_idx = value
+    options = (await state.get_data()).get('current_options') or q.options
+    is_correct = 0 <= selected_idx < len(options) and options[selected_idx] == q.correct_answer
     username = callback.from_user.username or str(callback.from_user.id)
     
     # Проверяем, является ли это последним вопросом
-    questions = data.get('questions', [])
-    is_last_question = (index + 1) >= len(questions)
+    question_ids = data.get('question_ids', [])
+    is_last_question = (index + 1) >= len(question_ids)
     
     if is_correct:
         # Формат результата как в DM, с указанием текущих баллов игрока
         totals = {username: (data.get('correct', 0) + 1)}
         result_text = TextStatics.dm_quiz_question_result_message(
-            right_answer=q["correct_answer"],
+            right_answer=q.correct_answer,
             not_answered=[],
             wrong_answers=[],
             right_answers=[username],
             totals=totals,
-            comment=q.get('comment', None),
+            comment=q.comment,
         )
         await callback.message.answer(result_text, reply_markup=question_result_keyboard(is_last_question=is_last_question))
         await state.update_data(correct=data.get('correct', 0) + 1)
     else:
         totals = {username: (data.get('correct', 0))}
         result_text = TextStatics.dm_quiz_question_result_message(
-            right_answer=q["correct_answer"],
+            right_answer=q.correct_answer,
             not_answered=[],
             wrong_answers=[username],
             right_answers=[],
             totals=totals,
-            comment=q.get('comment', None),
+            comment=q.comment,
         )
         await callback.message.answer(result_text, reply_markup=question_result_keyboard(is_last_question=is_last_question))
         await state.update_data(incorrect=data.get('incorrect', 0) + 1)
@@ -427,7 +417,7 @@ async def answer_callback(callback: types.CallbackQuery, state: FSMContext):
     await state.set_state(SoloGameStates.WAITING_NEXT)
 
 
-@router.callback_query(lambda c: c.data == 'finish_quiz')
+@callbacks.route('finish_quiz')
 async def finish_quiz_now(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
     data = await state.get_data()
@@ -457,7 +447,7 @@ async def finish_quiz_now(callback: types.CallbackQuery, state: FSMContext):
     except Exception:
         pass
     await callback.message.answer(TextStatics.get_single_game_answer(correct, incorrect) + streak_suffix)
-    await state.clear()
+    await clear_solo_state(state)
 
 
 @router.message(
@@ -482,18 +472,16 @@ async def text_answer(message: types.Message, state: FSMContext):
             return
         user_answer = parts[1].strip()
 
-    if q['question_type'] != QuestionTypeChoices.TEXT:
+    if q.question_type != QuestionTypeChoices.TEXT:
         return
 
     # Проверяем, является ли это последним вопросом
-    questions = data.get('questions', [])
-    is_last_question = (index + 1) >= len(questions)
+    question_ids = data.get('question_ids', [])
+    is_last_question = (index + 1) >= len(question_ids)
 
     # реализуем механику 2 попыток
     attempts_left = data.get('attempts_left', 2)
-    correct_answers = [a.lower().strip() for a in q['correct_answers']]
-
-    if user_answer.lower().strip() in correct_answers:
+    if q.matcher.matches(user_answer):
         # Сохраняем ID сообщения пользователя для удаления при переходе к следующему вопросу
         cleanup_ids = data.get('cleanup_message_ids', [])
         cleanup_ids.append(message.message_id)
@@ -508,7 +496,7 @@ async def text_answer(message: types.Message, state: FSMContext):
             wrong_answers=[],
             right_answers=[username],
             totals=totals,
-            comment=q.get('comment', None),
+            comment=q.comment,
         )
         await message.answer(result_text, reply_markup=question_result_keyboard(is_last_question=is_last_question))
         await state.update_data(correct=data.get('correct', 0) + 1)
@@ -525,12 +513,12 @@ async def text_answer(message: types.Message, state: FSMContext):
             username = message.from_user.username or str(message.from_user.id)
             totals = {username: (data.get('correct', 0))}
             result_text = TextStatics.dm_quiz_question_result_message(
-                right_answer=q["correct_answers"][0],
+                right_answer=q.right_answer,
                 not_answered=[],
                 wrong_answers=[username],
                 right_answers=[],
                 totals=totals,
-                comment=q.get('comment', None),
+                comment=q.comment,
             )
             await message.answer(result_text, reply_markup=question_result_keyboard(is_last_question=is_last_question))
             await state.update_data(incorrect=data.get('incorrect', 0) + 1, current_index=index + 1)
@@ -538,10 +526,10 @@ async def text_answer(message: types.Message, state: FSMContext):
             await send_question(message, state)
         else:
             await state.update_data(attempts_left=attempts_left)
-            await message.answer(TextStatics.dm_text_wrong_attempt(attempts_left, q.get("correct_answers", [q["correct_answer"]])[0]))
+            await message.answer(TextStatics.dm_text_wrong_attempt(attempts_left, q.right_answer))
 
 
-@router.callback_query(lambda c: c.data == 'next_question' and c.message.chat.type == 'private')
+@callbacks.route('next_question', when=in_chat('private'))
 async def next_question(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
     # Обрабатываем этот хэндлер ТОЛЬКО в личных чатах (solo). В группах используется DM/Team хэндлер.
@@ -552,13 +540,13 @@ async def next_question(callback: types.CallbackQuery, state: FSMContext):
     await state.set_state(SoloGameStates.WAITING_ANSWER)
 
 
-@router.callback_query(lambda c: c.data == 'back')
+@callbacks.route('back')
 async def go_back(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
     await stop_quiz(callback.message, state)
 
 
-@router.callback_query(lambda c: c.data in ('like', 'dislike'))
+@callbacks.route('like', 'dislike')
 async def rate_question(callback: types.CallbackQuery, state: FSMContext):
     user_id = str(callback.from_user.id)
     
@@ -619,7 +607,7 @@ async def rate_question(callback: types.CallbackQuery, state: FSMContext):
         await callback.answer("Ошибка при оценке вопроса")
 
 
-@router.callback_query(lambda c: c.data == 'notify:mute')
+@callbacks.route('notify:mute')
 async def notify_mute(callback: types.CallbackQuery):
     await callback.answer()
     try:
@@ -646,29 +634,56 @@ async def update_texts(message: types.Message):
     if str(message.from_user.id) not in admin_users:
         return
 
-    answer_texts._current_bot_texts = {list(item.keys())[0]: list(item.values())[0] for item in get_bot_texts(os.getenv('BOT_TOKEN'))}
-    await message.answer("Тексты обновлены")
+    # Синхронный запрос к API — в отдельном потоке, чтобы не держать цикл событий
+    problems = answer_texts.load_bot_texts(await asyncio.to_thread(get_bot_texts, os.getenv('BOT_TOKEN')))
+    if problems:
+        await message.answer("Тексты обновлены, но часть отклонена (используются тексты по умолчанию):\n" + "\n".join(problems))
+    else:
+        await message.answer("Тексты обновлены")
+
+
+@router.message(Command('diag'))
+async def diag_command(message: types.Message):
+    """Сводка диагностики для администраторов.
+
+    /diag memory start|stop включает и выключает tracemalloc, /diag memory —
+    сводка и снимок памяти.
+    """
+    admin_users = os.getenv('ADMIN_USERS', '').split(' ')
+
+    if str(message.from_user.id) not in admin_users:
+        return
+
+    args = (message.text or '').split()[1:]
+    if args[:1] == ['memory'] and len(args) > 1:
+        await message.answer(await asyncio.to_thread(diagnostics.memory_text, args[1]))
+        return
+    text = diagnostics.summary_text()
+    if args[:1] == ['memory']:
+        text += '\n\n' + await asyncio.to_thread(diagnostics.memory_text)
+    # Лимит Telegram на длину сообщения
+    await message.answer(text[:4000])
 
 
-@router.callback_query(lambda c: c.data == 'help')
+@callbacks.route('help')
 async def help_callback(callback: types.CallbackQuery):
     await callback.answer()
     await callback.message.answer(TextStatics.get_help_message())
 
 
-@router.callback_query(lambda c: c.data == 'quizplease')
+@callbacks.route('quizplease')
 async def quizplease_callback(callback: types.CallbackQuery):
     await callback.answer()
     await callback.message.answer(TextStatics.get_start_menu(), reply_markup=main_menu_keyboard())
 
 
-@router.callback_query(lambda c: c.data == 'start_game')
+@callbacks.route('start_game')
 async def start_game_callback(callback: types.CallbackQuery):
     await callback.answer()
     await callback.message.answer(TextStatics.select_mode_message(), reply_markup=main_menu_keyboard())
 
 
-@router.callback_query(lambda c: c.data == 'notify:enable')
+@callbacks.route('notify:enable')
 async def notify_enable_callback(callback: types.CallbackQuery):
     await callback.answer()
     try:
@@ -4,22 +4,126 @@ import traceback
 from pathlib import Path
 
 import asyncio
+import random
 from datetime import datetime
 import pytz
 
 from aiogram import types
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
 from states.fsm import SoloGameStates
-from states.local_state import GameState, get_game_state, _get_game_key_for_chat, _games_state
+from states.local_state import GameState, get_game_state, drop_game, _get_game_key_for_chat, LARGE_ROOM_TOP_N
+from question_cache import QuestionRecord, question_cache
 from static.answer_texts import TextStatics
 from static.choices import QuestionTypeChoices
 from keyboards import create_variant_keyboard, question_result_keyboard, game_finished_keyboard
+from message_cleanup import schedule_delete
+from chat_actor import post_chat_event
+import clock
 from api_client import players_game_end_bulk, team_game_end, auth_player, create_team, get_players_total_points, get_players_chat_points
 
 
+# Пауза (сек.) перед показом следующего вопроса после нажатия «Далее»
+NEXT_QUESTION_PAUSE = 1
+# Лимит длины текстового сообщения и подписи к фото в Telegram
+MESSAGE_LIMIT = 4096
+CAPTION_LIMIT = 1024
+# Режим экономии сообщений: напоминания и итоги вопроса редактируют сообщение
+# вопроса вместо отправки и последующего удаления отдельных сообщений
+GROUP_MESSAGE_BUDGET = os.getenv("GROUP_MESSAGE_BUDGET", "false").lower() == "true"
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Разбить длинный текст на части не длиннее limit, по возможности по строкам."""
+    if len(text) <= limit:
+        return [text]
+    parts = []
+    current = ''
+    for line in text.split('\n'):
+        # Строку длиннее лимита режем как есть
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ''
+            parts.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            parts.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        parts.append(current)
+    return parts
+
+
+async def send_long_message(bot, chat_id: int, text: str, reply_markup=None) -> list[int]:
+    """Отправить текст частями; клавиатура прикрепляется к последней части."""
+    parts = split_message(text)
+    sent_ids = []
+    for idx, part in enumerate(parts):
+        sent = await bot.send_message(chat_id, part, reply_markup=reply_markup if idx == len(parts) - 1 else None)
+        sent_ids.append(sent.message_id)
+    return sent_ids
+
+
+async def edit_question_message(bot, chat_id: int, game_state: GameState, footer: str, reply_markup=None) -> bool:
+    """Показать footer под текстом текущего вопроса, заменив клавиатуру.
+
+    Возвращает False, если отредактировать не удалось (нет сообщения, текст
+    не влезает в лимит, ошибка Telegram) — тогда нужно отправить сообщение.
+    """
+    message_id = game_state.current_question_msg_id
+    if not message_id or game_state.current_question_text is None:
+        return False
+    text = f"{game_state.current_question_text}\n\n{footer}"
+    try:
+        if game_state.current_question_is_photo:
+            if len(text) > CAPTION_LIMIT:
+                return False
+            await bot.edit_message_caption(chat_id=chat_id, message_id=message_id, caption=text, reply_markup=reply_markup)
+        else:
+            if len(text) > MESSAGE_LIMIT:
+                return False
+            await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, reply_markup=reply_markup)
+    except TelegramBadRequest as e:
+        if "message is not modified" in str(e):
+            return True
+        print(f"Не удалось отредактировать вопрос в чате {chat_id}: {e}")
+        return False
+    except Exception as e:
+        print(f"Ошибка при редактировании вопроса в чате {chat_id}: {e}")
+        return False
+    return True
+
+
+async def send_question_notice(bot, chat_id: int, game_state: GameState, text: str):
+    """Промежуточное уведомление по вопросу (напоминание о времени, попытки)."""
+    if GROUP_MESSAGE_BUDGET and await edit_question_message(bot, chat_id, game_state, text, game_state.current_question_markup):
+        return
+    _sent = await bot.send_message(chat_id, text)
+    game_state.cleanup_message_ids.append(_sent.message_id)
+
+
+async def send_question_result(bot, chat_id: int, game_state: GameState, text: str, reply_markup=None):
+    """Итог вопроса: в режиме экономии — в сообщении вопроса, иначе отдельным сообщением."""
+    if GROUP_MESSAGE_BUDGET and await edit_question_message(bot, chat_id, game_state, text, reply_markup):
+        return
+    game_state.cleanup_message_ids.extend(await send_long_message(bot, chat_id, text, reply_markup=reply_markup))
+
+
+def _read_image(file_path: Path) -> bytes | None:
+    """Содержимое файла изображения или None, если файла нет."""
+    if not file_path.is_file():
+        return None
+    with open(file_path, 'rb') as image_file:
+        return image_file.read()
+
+
 async def load_and_send_image(bot, chat_id: int, image_url: str, text: str, reply_markup=None):
     """Загружает изображение с локального диска и отправляет его с текстом."""
     if not image_url:
@@ -34,12 +138,9 @@ async def load_and_send_image(bot, chat_id: int, image_url: str, text: str, repl
         clean_image_url = image_url.lstrip('/')
         file_path = Path(media_root) / clean_image_url
 
-        # Проверяем, что файл существует
-        if file_path.exists() and file_path.is_file():
-            # Читаем файл с диска
-            with open(file_path, 'rb') as image_file:
-                image_data = image_file.read()
-
+        # Читаем файл с диска в отдельном потоке, чтобы не держать цикл событий
+        image_data = await asyncio.to_thread(_read_image, file_path)
+        if image_data is not None:
             # Определяем имя файла
             filename = file_path.name
 
@@ -63,28 +164,16 @@ async def load_and_send_image(bot, chat_id: int, image_url: str, text: str, repl
 
 async def start_game_questions(callback: types.CallbackQuery, game_state: GameState):
     """Начать игру - показать первый вопрос."""
-    if not game_state.questions:
+    if not game_state.question_ids:
         await finalize_game(callback.message.bot, callback.message.chat.id, game_state)
         return
 
-    # Удаляем сообщения регистрации и подготовки сразу при начале игры
-    try:
-        for mid in getattr(game_state, 'registration_message_ids', []) or []:
-            try:
-                await callback.message.bot.delete_message(callback.message.chat.id, mid)
-            except Exception:
-                pass
-        game_state.registration_message_ids = []
-        
-        # Удаляем основное сообщение регистрации/подготовки
-        if game_state.message_id:
-            try:
-                await callback.message.bot.delete_message(callback.message.chat.id, game_state.message_id)
-            except Exception:
-                pass
-            game_state.message_id = None
-    except Exception:
-        pass
+    # Удаляем сообщения регистрации и подготовки сразу при начале игры (в фоне)
+    stale_ids = list(game_state.registration_message_ids)
+    stale_ids.append(game_state.message_id)
+    game_state.registration_message_ids.clear()
+    game_state.message_id = None
+    schedule_delete(callback.message.bot, callback.message.chat.id, stale_ids)
 
     # Проверяем, что есть участники
     if game_state.mode == "dm":
@@ -92,16 +181,16 @@ async def start_game_questions(callback: types.CallbackQuery, game_state: GameSt
             await callback.message.bot.send_message(callback.message.chat.id, TextStatics.no_players_cannot_start())
             # Очищаем состояние
             game_key = _get_game_key_for_chat(callback.message.chat.id)
-            if game_key and game_key in _games_state:
-                del _games_state[game_key]
+            if game_key:
+                drop_game(game_key)
             return
     else:
         if not game_state.teams:
             await callback.message.bot.send_message(callback.message.chat.id, TextStatics.no_teams_cannot_start())
             # Очищаем состояние
             game_key = _get_game_key_for_chat(callback.message.chat.id)
-            if game_key and game_key in _games_state:
-                del _games_state[game_key]
+            if game_key:
+                drop_game(game_key)
             return
 
     # Инициализируем счет
@@ -117,12 +206,12 @@ async def start_game_questions(callback: types.CallbackQuery, game_state: GameSt
 
 async def send_next_question(bot, chat_id: int, game_state: GameState):
     """Отправить следующий вопрос."""
-    if game_state.current_q_idx >= len(game_state.questions):
+    if game_state.current_q_idx >= len(game_state.question_ids):
         # Игра окончена
         await finalize_game(bot, chat_id, game_state)
         return
     
-    question = game_state.questions[game_state.current_q_idx]
+    question = game_state.current_question()
     
     # Очищаем ответы на предыдущий вопрос
     game_state.answers_right.clear()
@@ -133,7 +222,7 @@ async def send_next_question(bot, chat_id: int, game_state: GameState):
     game_state.question_dislikes.clear()
     
     # Формируем текст вопроса. Для командных открытых вопросов добавляем подсказку про команды и 2 попытки
-    if game_state.mode == "team" and question["question_type"] == QuestionTypeChoices.TEXT:
+    if game_state.mode == "team" and question.question_type == QuestionTypeChoices.TEXT:
         # Берем капитана (одного, исходя из текущей модели одной команды на чат)
         try:
             captain_username = list(game_state.captains.values())[0]
@@ -143,23 +232,22 @@ async def send_next_question(bot, chat_id: int, game_state: GameState):
         text = TextStatics.team_quiz_question_template(
             current_q_idx=game_state.current_q_idx + 1,
             username=mention,
-            text=question["text"],
-            timer=question.get("time_to_answer", 120),
+            text=question.text,
+            timer=game_state.time_to_answer,
             total_questions=game_state.total_questions,
         )
     else:
         text = TextStatics.format_question_text(
             game_state.current_q_idx + 1,
-            question["text"],
-            question.get("time_to_answer", 120),
+            question.text,
+            game_state.time_to_answer,
             game_state.total_questions,
         )
 
-    if question["question_type"] == QuestionTypeChoices.VARIANT:
+    if question.question_type == QuestionTypeChoices.VARIANT:
         # Собираем все варианты ответов
-        options = question["wrong_answers"] + [question["correct_answer"]]
-        import random
-        random.shuffle(options)
+        options = question.options
+        (game_state.rng or random).shuffle(options)
         kb = create_variant_keyboard(options)
         # Сохраняем порядок вариантов для корректной интерпретации индекса
         game_state.current_options = options
@@ -171,16 +259,14 @@ async def send_next_question(bot, chat_id: int, game_state: GameState):
     token = game_state.question_token
     game_state.question_result_sent = False
     # Сохраним снимок правильного ответа/идентификатора
-    try:
-        game_state.current_correct_answer = question.get("correct_answers", [question["correct_answer"]])[0]
-    except Exception:
-        game_state.current_correct_answer = None
+    game_state.current_correct_answer = question.right_answer
     
     # Сохраняем ID текущего вопроса для лайков/дизлайков
-    game_state.current_question_id = question.get("id")
+    game_state.current_question_id = question.id
 
-    # Удаляем предыдущее сообщение с вопросом и гасим предыдущий таймер
-    if game_state.current_question_msg_id:
+    # Гасим предыдущий таймер; предыдущий вопрос удалим после отправки нового
+    previous_question_msg_id = game_state.current_question_msg_id
+    if previous_question_msg_id:
         if game_state.timer_task:
             try:
                 game_state.timer_task.cancel()
@@ -188,11 +274,9 @@ async def send_next_question(bot, chat_id: int, game_state: GameState):
                 pass
             game_state.timer_task = None
 
-        await bot.delete_message(chat_id, game_state.current_question_msg_id)
-
     try:
         # Проверяем, есть ли изображение в вопросе
-        image_url = question.get("image_url")
+        image_url = question.image_url
         sent_msg = await load_and_send_image(bot, chat_id, image_url, text, reply_markup=kb)
     except asyncio.CancelledError as e:
         print("send_next_question: CancelledError; state=", game_state.status, "q_idx=", game_state.current_q_idx)
@@ -203,98 +287,54 @@ async def send_next_question(bot, chat_id: int, game_state: GameState):
         return
 
     game_state.current_question_msg_id = sent_msg.message_id
-    # Инициализируем контейнер для последующего удаления вспомогательных сообщений
-    if not hasattr(game_state, 'cleanup_message_ids'):
-        game_state.cleanup_message_ids = []
+    game_state.current_question_text = text
+    game_state.current_question_markup = kb
+    game_state.current_question_is_photo = bool(getattr(sent_msg, 'photo', None))
+    schedule_delete(bot, chat_id, [previous_question_msg_id])
     game_state.waiting_next = False
     game_state.attempts_left_by_user.clear()
     # Сбрасываем списки ответов для следующего вопроса
     game_state.answers_right.clear()
     game_state.answers_wrong.clear()
     
-    # Запускаем таймер на вопрос
+    # Запускаем таймер на вопрос; само закрытие вопроса выполняется в очереди чата
+    async def close_on_timeout():
+        if token != game_state.question_token or game_state.status != "playing":
+            return
+        if game_state.question_result_sent:
+            return
+        # Таймер уже отработал — отменять нечего
+        game_state.timer_task = None
+        game_state.question_result_sent = True
+        game_state.waiting_next = True
+
+        is_last_question = (game_state.current_q_idx + 1) >= len(game_state.question_ids)
+        if game_state.mode == "team":
+            # Отправляем сообщение о таймауте для командного режима
+            correct_answer = question.right_answer
+            comment = question.comment
+            earned_xp = 0  # При таймауте команда не получает очков
+            timeout_text = TextStatics.team_timeout_message(correct_answer, comment, earned_xp)
+            await send_question_result(bot, chat_id, game_state, timeout_text, question_result_keyboard(include_finish=False, is_last_question=is_last_question))
+        else:
+            await _send_dm_question_result(bot, chat_id, game_state, question)
+
     async def on_timeout():
-        try:
-            # Атомарная секция: проверяем актуальность и помечаем результат выведенным
-            if game_state.transition_lock is None:
-                game_state.transition_lock = asyncio.Lock()
-            should_send_dm = False
-            should_advance_team = False
-            if token != game_state.question_token or game_state.is_finishing or game_state.status != "playing":
-                return
-            async with game_state.transition_lock:
-                if token != game_state.question_token or game_state.is_finishing or game_state.status != "playing":
-                    return
-                if game_state.question_result_sent:
-                    return
-                # Отменяем таймер
-                if game_state.timer_task:
-                    game_state.timer_task = None
+        post_chat_event(chat_id, close_on_timeout)
 
-                game_state.question_result_sent = True
-                if game_state.mode == "team":
-                    should_advance_team = True
-                    # Отправляем сообщение о таймауте для командного режима
-                    correct_answer = question.get("correct_answers", [game_state.current_correct_answer])[0]
-                    comment = question.get('comment', None)
-                    earned_xp = 0  # При таймауте команда не получает очков
-                    timeout_text = TextStatics.team_timeout_message(correct_answer, comment, earned_xp)
-                    
-                    # Проверяем, является ли это последним вопросом
-                    is_last_question = (game_state.current_q_idx + 1) >= len(game_state.questions)
-                    _sent = await bot.send_message(chat_id, timeout_text, reply_markup=question_result_keyboard(include_finish=False, is_last_question=is_last_question))
-                    try:
-                        game_state.cleanup_message_ids.append(_sent.message_id)
-                    except Exception:
-                        pass
-                else:
-                    game_state.waiting_next = True
-                    should_send_dm = True
-
-            # Для команд результат уже отправлен выше, переходим к следующему вопросу
-            if game_state.mode == "team":
-                game_state.waiting_next = True
-                return
-
-            if should_send_dm:
-                right_list = sorted(list(game_state.answers_right))
-                wrong_list = sorted(list(game_state.answers_wrong))
-                not_answered_list = [p for p in sorted(list(game_state.players)) if p not in game_state.answers_right and p not in game_state.answers_wrong]
-                totals = {u: int(game_state.scores.get(u, 0)) for u in set(right_list + wrong_list)}
-                
-                # Проверяем, является ли это последним вопросом
-                is_last_question = (game_state.current_q_idx + 1) >= len(game_state.questions)
-                
-                result_text = TextStatics.dm_quiz_question_result_message(
-                    right_answer=question.get("correct_answers", [game_state.current_correct_answer])[0],
-                    not_answered=not_answered_list,
-                    wrong_answers=wrong_list,
-                    right_answers=right_list,
-                    totals=totals,
-                    comment=question.get('comment', None),
-                )
-                _sent = await bot.send_message(chat_id, result_text, reply_markup=question_result_keyboard(include_finish=False, is_last_question=is_last_question))
-                try:
-                    game_state.cleanup_message_ids.append(_sent.message_id)
-                except Exception:
-                    pass
-                # Явно включаем фазу ожидания Next (на случай гонок)
-                game_state.waiting_next = True
-                game_state.question_result_sent = True
-        except Exception as e:
-            print(f"Ошибка в on_timeout: {e}")
-            traceback.print_exc()
-    
-    timeout_seconds = question.get("time_to_answer", 120)
+    timeout_seconds = game_state.time_to_answer
     game_state.timer_task = await schedule_question_timeout(
         timeout_seconds, on_timeout, bot, chat_id, game_state=game_state, token=token
     )
 
 
 async def move_to_next_question(bot, chat_id: int, game_state: GameState):
-    """Перейти к следующему вопросу или завершить игру."""
+    """Перейти к следующему вопросу или завершить игру.
+
+    Вызывается только из очереди событий чата (см. chat_actor).
+    """
     # Если финализация началась, не двигаем вопросы
-    if game_state.is_finishing or game_state.status != "playing":
+    if game_state.status != "playing":
         return
     # Инвалидация токена, чтобы старые таймеры точно не сработали на старом вопросе
     try:
@@ -302,45 +342,31 @@ async def move_to_next_question(bot, chat_id: int, game_state: GameState):
     except Exception:
         pass
     game_state.current_q_idx += 1
-    
-    # Небольшая пауза перед следующим вопросом
-    await asyncio.sleep(1)
 
-    # Удаляем вспомогательные сообщения, ответы пользователей и предыдущий вопрос
-    try:
-        # Удаляем вспомогательные сообщения (результаты, таймеры)
-        for mid in getattr(game_state, 'cleanup_message_ids', []) or []:
-            try:
-                await bot.delete_message(chat_id, mid)
-            except Exception:
-                pass
-        game_state.cleanup_message_ids = []
-        
-        # Удаляем ответы пользователей (если бот имеет права админа)
-        for mid in getattr(game_state, 'user_answer_message_ids', []) or []:
-            try:
-                await bot.delete_message(chat_id, mid)
-            except Exception:
-                pass  # Нет прав или сообщение уже удалено
-        game_state.user_answer_message_ids = []
-        
-        # Удаляем предыдущий вопрос
-        if game_state.current_question_msg_id:
-            try:
-                await bot.delete_message(chat_id, game_state.current_question_msg_id)
-            except Exception:
-                pass
-            game_state.current_question_msg_id = None
-    except Exception:
-        pass
-    
-    if game_state.current_q_idx >= len(game_state.questions):
+    # Вспомогательные сообщения, ответы пользователей и предыдущий вопрос
+    # удаляем пакетно уже после отправки следующего вопроса
+    stale_ids = _take_stale_message_ids(game_state)
+
+    if game_state.current_q_idx >= len(game_state.question_ids):
         # Игра завершена
         await finalize_game(bot, chat_id, game_state)
     else:
         # Показываем следующий вопрос
         await send_next_question(bot, chat_id, game_state)
 
+    schedule_delete(bot, chat_id, stale_ids)
+
+
+def _take_stale_message_ids(game_state: GameState) -> list[int]:
+    """Забрать из состояния id сообщений, подлежащих удалению, и очистить буферы."""
+    stale_ids = list(game_state.cleanup_message_ids)
+    stale_ids.extend(game_state.user_answer_message_ids)
+    stale_ids.append(game_state.current_question_msg_id)
+    game_state.cleanup_message_ids.clear()
+    game_state.user_answer_message_ids.clear()
+    game_state.current_question_msg_id = None
+    return stale_ids
+
 
 async def show_final_results(bot, chat_id: int, game_state: GameState):
     """Сформировать текст финальных результатов без очистки состояния."""
@@ -356,12 +382,17 @@ async def show_final_results(bot, chat_id: int, game_state: GameState):
         if not game_state.scores:
             text = TextStatics.no_participants_game_finished()
         else:
-            sorted_scores = sorted(game_state.scores.items(), key=lambda x: x[1], reverse=True)
+            if game_state.large_room:
+                # Большая комната: только топ, и общие баллы в чате запрашиваем лишь для него
+                sorted_scores = game_state.scores.top(LARGE_ROOM_TOP_N)
+                usernames = [name for name, _ in sorted_scores]
+            else:
+                sorted_scores = sorted(game_state.scores.items(), key=lambda x: x[1], reverse=True)
+                usernames = list(game_state.players)
             participants_total_points = None
             players_totals = None
             try:
                 system_token = os.getenv('BOT_SYSTEM_TOKEN') or os.getenv('BOT_TOKEN', '')
-                usernames = list(game_state.players)
                 if usernames and system_token:
                     api_items = await get_players_chat_points(usernames, chat_id, system_token)
                     # api_items: list of {username, points}
@@ -381,16 +412,18 @@ async def show_final_results(bot, chat_id: int, game_state: GameState):
                 registered_count=len(game_state.players),
                 participants_total_points=participants_total_points,
                 players_totals=players_totals,
+                participated=len(game_state.scores),
             )
     return text
 
 
 async def finalize_game(bot, chat_id: int, game_state: GameState):
     """Единая финализация игры: отмена таймеров, отправка на бэкенд, один финальный месседж, очистка состояния."""
-    # Не допускаем повторной финализации
-    if game_state.finished_sent or game_state.is_finishing:
+    # Не допускаем повторной финализации: статус меняется до первого await,
+    # поэтому все последующие события чата увидят игру уже завершённой
+    if game_state.status == "finished":
         return
-    game_state.is_finishing = True
+    game_state.status = "finished"
     try:
         # Отменить активный таймер
         if game_state.timer_task:
@@ -424,84 +457,47 @@ async def finalize_game(bot, chat_id: int, game_state: GameState):
                 pass
 
         # Сформировать текст и отправить ровно один раз
-        if game_state.finished_sent:
-            return
         final_text = await show_final_results(bot, chat_id, game_state)
-        game_state.finished_sent = True
-        await bot.send_message(chat_id, final_text, reply_markup=game_finished_keyboard())
-        # Очистка всех сообщений после окончания игры
-        try:
-            # Удаляем вспомогательные сообщения результатов
-            for mid in getattr(game_state, 'cleanup_message_ids', []) or []:
-                try:
-                    await bot.delete_message(chat_id, mid)
-                except Exception:
-                    pass
-            game_state.cleanup_message_ids = []
-            
-            # Удаляем оставшиеся ответы пользователей
-            for mid in getattr(game_state, 'user_answer_message_ids', []) or []:
-                try:
-                    await bot.delete_message(chat_id, mid)
-                except Exception:
-                    pass  # Нет прав или сообщение уже удалено
-            game_state.user_answer_message_ids = []
-            
-            # Удаляем текущий вопрос
-            if game_state.current_question_msg_id:
-                try:
-                    await bot.delete_message(chat_id, game_state.current_question_msg_id)
-                except Exception:
-                    pass
-                game_state.current_question_msg_id = None
-        except Exception:
-            pass
+        await send_long_message(bot, chat_id, final_text, reply_markup=game_finished_keyboard())
+        # Очистка всех сообщений после окончания игры (в фоне, пакетно)
+        schedule_delete(bot, chat_id, _take_stale_message_ids(game_state))
     finally:
-        # Очистить состояние
-            game_key = _get_game_key_for_chat(chat_id)
-            if not game_key:
-                return
-            game_state = get_game_state(game_key)
-            if game_state and game_state.timer_task:
-                try:
-                    game_state.timer_task.cancel()
-                except Exception:
-                    pass
-            if game_key in _games_state:
-                del _games_state[game_key]
+        # Очистить состояние и освободить вопросы игры в кеше
+        game_key = _get_game_key_for_chat(chat_id)
+        if game_key:
+            drop_game(game_key)
 
 
 async def process_answer(bot, chat_id: int, game_state: GameState, username: str, answer: str, callback: types.CallbackQuery | None = None):
-    """Обработать ответ игрока."""
-    if game_state.is_finishing or game_state.status != "playing":
+    """Обработать ответ игрока (из очереди событий чата)."""
+    if game_state.status != "playing":
         if callback:
             await callback.answer()
         return
-    if game_state.current_q_idx >= len(game_state.questions):
+    if game_state.current_q_idx >= len(game_state.question_ids):
         if callback:
             await callback.answer()
         return
 
-    current_question = game_state.questions[game_state.current_q_idx]
+    current_question = game_state.current_question()
 
     # Проверяем правильность ответа
     is_correct = False
 
-    if current_question["question_type"] == QuestionTypeChoices.TEXT:
+    if current_question.question_type == QuestionTypeChoices.TEXT:
         print("current_question", current_question)
 
-    correct_answers = [a.lower().strip() for a in current_question["correct_answers"]]
-    is_correct = answer.lower().strip() in correct_answers
+    is_correct = current_question.is_correct(answer)
 
     # Инициализируем попытки для пользователя/капитана (для TEXT вопросов)
-    if current_question["question_type"] == QuestionTypeChoices.TEXT and username not in game_state.attempts_left_by_user:
+    if current_question.question_type == QuestionTypeChoices.TEXT and username not in game_state.attempts_left_by_user:
         game_state.attempts_left_by_user[username] = 2
 
     # Обновляем статистику и Баллы
     if is_correct:
         game_state.answers_right.add(username)
         # Подсчет очков с учетом попыток для TEXT
-        if current_question["question_type"] == QuestionTypeChoices.TEXT:
+        if current_question.question_type == QuestionTypeChoices.TEXT:
             attempts_left = game_state.attempts_left_by_user.get(username, 2)
             gain = 2 if attempts_left == 2 else 1
         else:
@@ -526,18 +522,17 @@ async def process_answer(bot, chat_id: int, game_state: GameState, username: str
                 pass
 
             # Проверяем, является ли это последним вопросом
-            is_last_question = (game_state.current_q_idx + 1) >= len(game_state.questions)
+            is_last_question = (game_state.current_q_idx + 1) >= len(game_state.question_ids)
 
+            game_state.question_result_sent = True
             game_state.waiting_next = True
-            _sent = await bot.send_message(
+            await send_question_result(
+                bot,
                 chat_id,
-                TextStatics.show_right_answer_only(current_question.get("correct_answers", [game_state.current_correct_answer])[0], current_question.get('comment', None), gain),
-                reply_markup=question_result_keyboard(include_finish=False, is_last_question=is_last_question)
+                game_state,
+                TextStatics.show_right_answer_only(current_question.right_answer, current_question.comment, gain),
+                question_result_keyboard(include_finish=False, is_last_question=is_last_question),
             )
-            try:
-                game_state.cleanup_message_ids.append(_sent.message_id)
-            except Exception:
-                pass
             return
         else:
             # DM режим — просто ответим на клик
@@ -545,7 +540,7 @@ async def process_answer(bot, chat_id: int, game_state: GameState, username: str
                 await callback.answer(TextStatics.correct_inline_hint())
     else:
         # Неправильный ответ
-        if current_question["question_type"] == QuestionTypeChoices.TEXT:
+        if current_question.question_type == QuestionTypeChoices.TEXT:
             game_state.attempts_left_by_user[username] = game_state.attempts_left_by_user.get(username, 2) - 1
             attempts_left = game_state.attempts_left_by_user[username]
 
@@ -553,13 +548,13 @@ async def process_answer(bot, chat_id: int, game_state: GameState, username: str
             earned_scores = 0  # При неправильном ответе команда не получает очков
             wrong_text = TextStatics.team_quiz_question_wrong_answer(
                 attempts_left,
-                current_question.get("correct_answers", [current_question["correct_answer"]])[0],
-                current_question.get('comment', None),
+                current_question.right_answer,
+                current_question.comment,
                 earned_scores
             ) if game_state.mode == "team" else TextStatics.dm_text_wrong_attempt(
                 attempts_left,
-                current_question.get("correct_answers", [current_question["correct_answer"]])[0],
-                current_question.get('comment', None)
+                current_question.right_answer,
+                current_question.comment
             )
 
             # Если попыток больше нет
@@ -573,22 +568,15 @@ async def process_answer(bot, chat_id: int, game_state: GameState, username: str
                         game_state.timer_task = None
 
                     # Проверяем, является ли это последним вопросом
-                    is_last_question = (game_state.current_q_idx + 1) >= len(game_state.questions)
-                    
+                    is_last_question = (game_state.current_q_idx + 1) >= len(game_state.question_ids)
+
+                    game_state.question_result_sent = True
                     game_state.waiting_next = True
-                    _sent = await bot.send_message(chat_id, wrong_text, reply_markup=question_result_keyboard(include_finish=False, is_last_question=is_last_question))
-                    try:
-                        game_state.cleanup_message_ids.append(_sent.message_id)
-                    except Exception:
-                        pass
+                    await send_question_result(bot, chat_id, game_state, wrong_text, question_result_keyboard(include_finish=False, is_last_question=is_last_question))
                     return
                 # В DM режиме — ждём остальных через общий механизм
             else:
-                _sent = await bot.send_message(chat_id, wrong_text)
-                try:
-                    game_state.cleanup_message_ids.append(_sent.message_id)
-                except Exception:
-                    pass
+                await send_question_notice(bot, chat_id, game_state, wrong_text)
         else:
             # Для вариантов — сразу отмечаем как неправильный
             game_state.answers_wrong.add(username)
@@ -601,10 +589,10 @@ async def process_answer(bot, chat_id: int, game_state: GameState, username: str
 
 async def check_if_all_answered(bot, chat_id: int, game_state: GameState):
     """Проверить, ответили ли все игроки на текущий вопрос."""
-    if game_state.is_finishing or game_state.status != "playing":
+    if game_state.status != "playing" or game_state.question_result_sent:
         return
     total_answered = len(game_state.answers_right) + len(game_state.answers_wrong)
-    current_question = game_state.questions[game_state.current_q_idx]
+    current_question = game_state.current_question()
 
     if game_state.mode == "dm":
         # В DM режиме ждем всех зарегистрированных игроков
@@ -612,68 +600,101 @@ async def check_if_all_answered(bot, chat_id: int, game_state: GameState):
     else:
         # В Team режиме ждем ответов от всех команд (только капитаны отвечают)
         total_players = len(game_state.teams)
-    
-    if total_answered >= total_players:
-        # Атомарно закрываем вопрос, чтобы не было дублей
-        if game_state.transition_lock is None:
-            game_state.transition_lock = asyncio.Lock()
-        should_send_dm = False
-        should_advance_team = False
-        async with game_state.transition_lock:
-            if game_state.is_finishing or game_state.status != "playing":
-                return
-            if game_state.question_result_sent:
-                return
-            # Все ответили — отменим таймер
-            if game_state.timer_task:
-                try:
-                    game_state.timer_task.cancel()
-                except Exception:
-                    pass
-                game_state.timer_task = None
-            game_state.question_result_sent = True
-            if game_state.mode == "team":
-                should_advance_team = True
-            else:
-                game_state.waiting_next = True
-                should_send_dm = True
 
-        if game_state.mode == "team":
-            # В командном режиме не отправляем дополнительное сообщение когда все ответили
-            # Результат покажет таймер или будет показан при переходе к следующему вопросу
-            return
+    if total_answered < total_players:
+        return
 
-        if should_send_dm:
-            right_list = sorted(list(game_state.answers_right))
-            wrong_list = sorted(list(game_state.answers_wrong))
-            not_answered_list = [p for p in sorted(list(game_state.players)) if p not in game_state.answers_right and p not in game_state.answers_wrong]
-            totals = {u: int(game_state.scores.get(u, 0)) for u in set(right_list + wrong_list)}
-            
-            # Проверяем, является ли это последним вопросом
-            is_last_question = (game_state.current_q_idx + 1) >= len(game_state.questions)
-            
-            result_text = TextStatics.dm_quiz_question_result_message(
-                right_answer=current_question.get('correct_answers', [game_state.current_correct_answer])[0],
-                not_answered=not_answered_list,
-                wrong_answers=wrong_list,
-                right_answers=right_list,
-                totals=totals,
-                comment=current_question.get('comment', None),
-            )
-            _sent = await bot.send_message(chat_id, result_text, reply_markup=question_result_keyboard(include_finish=False, is_last_question=is_last_question))
-            try:
-                game_state.cleanup_message_ids.append(_sent.message_id)
-            except Exception:
-                pass
+    # Все ответили — отменим таймер и закроем вопрос
+    if game_state.timer_task:
+        try:
+            game_state.timer_task.cancel()
+        except Exception:
+            pass
+        game_state.timer_task = None
+    game_state.question_result_sent = True
+    game_state.waiting_next = True
+
+    if game_state.mode == "team":
+        # В командном режиме не отправляем дополнительное сообщение когда все ответили
+        return
+
+    await _send_dm_question_result(bot, chat_id, game_state, current_question)
+
+
+async def _send_dm_question_result(bot, chat_id: int, game_state: GameState, question: QuestionRecord):
+    """Итог вопроса в DM режиме: кто ответил верно, неверно и не ответил."""
+    # Проверяем, является ли это последним вопросом
+    is_last_question = (game_state.current_q_idx + 1) >= len(game_state.question_ids)
+    keyboard = question_result_keyboard(include_finish=False, is_last_question=is_last_question)
+
+    if game_state.large_room:
+        # Большая комната: счётчики вместо списков, лидеры из таблицы очков
+        right_count = len(game_state.answers_right)
+        wrong_count = len(game_state.answers_wrong)
+        result_text = TextStatics.dm_quiz_question_result_summary(
+            right_answer=question.right_answer,
+            right_count=right_count,
+            wrong_count=wrong_count,
+            not_answered_count=max(0, len(game_state.players) - right_count - wrong_count),
+            top=game_state.scores.top(LARGE_ROOM_TOP_N),
+            comment=question.comment,
+        )
+        await send_question_result(bot, chat_id, game_state, result_text, keyboard)
+        return
+
+    right_list = sorted(list(game_state.answers_right))
+    wrong_list = sorted(list(game_state.answers_wrong))
+    not_answered_list = [p for p in sorted(list(game_state.players)) if p not in game_state.answers_right and p not in game_state.answers_wrong]
+    totals = {u: int(game_state.scores.get(u, 0)) for u in set(right_list + wrong_list)}
+
+    result_text = TextStatics.dm_quiz_question_result_message(
+        right_answer=question.right_answer,
+        not_answered=not_answered_list,
+        wrong_answers=wrong_list,
+        right_answers=right_list,
+        totals=totals,
+        comment=question.comment,
+    )
+    await send_question_result(bot, chat_id, game_state, result_text, keyboard)
 
 
 async def question_transition_delay(bot, chat_id: int, game_state: GameState, delay: int = 3):
-    sent = await bot.send_message(chat_id, TextStatics.question_transition_delay())
-    await asyncio.sleep(delay)
-    await bot.delete_message(chat_id, sent.message_id)
+    # В режиме экономии уведомление показывается во всплывающем ответе на «Далее»
+    if not GROUP_MESSAGE_BUDGET:
+        sent = await bot.send_message(chat_id, TextStatics.question_transition_delay())
+        # Удалится вместе с остальными вспомогательными сообщениями вопроса
+        game_state.cleanup_message_ids.append(sent.message_id)
+    await clock.sleep(delay)
 
-    await move_to_next_question(bot, chat_id, game_state)
-    game_state.next_in_progress = False
+
+def schedule_move_to_next_question(bot, chat_id: int, game_state: GameState) -> asyncio.Task:
+    """Запланировать переход к следующему вопросу после паузы.
+
+    Ожидание идёт в отдельной задаче, а сам переход ставится событием в очередь
+    чата, поэтому очередь не блокируется на время паузы. Задача хранится в
+    timer_task, чтобы завершение или остановка игры могли её отменить.
+    """
+    token = game_state.question_token
+
+    async def do_move():
+        if token != game_state.question_token:
+            return
+        await move_to_next_question(bot, chat_id, game_state)
+
+    async def wait_and_move():
+        try:
+            if game_state.current_q_idx < len(game_state.question_ids) - 1:
+                await question_transition_delay(bot, chat_id, game_state)
+            # Небольшая пауза перед следующим вопросом
+            await clock.sleep(NEXT_QUESTION_PAUSE)
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            print(f"Ошибка при переходе к следующему вопросу: {e}")
+        post_chat_event(chat_id, do_move)
+
+    game_state.timer_task = asyncio.create_task(wait_and_move())
+    return game_state.timer_task
 
 
 async def schedule_question_timeout(timeout_seconds: int, on_timeout_callback, bot=None, chat_id=None, game_state: GameState | None = None, token: int | None = None) -> asyncio.Task:
@@ -687,34 +708,47 @@ async def schedule_question_timeout(timeout_seconds: int, on_timeout_callback, b
     def cancelled() -> bool:
         if not game_state:
             return False
-        if game_state.is_finishing or game_state.status != "playing":
+        if game_state.status != "playing":
             return True
         if token is not None and token != game_state.question_token:
             return True
         return False
 
+    # В режиме экономии напоминание правит сообщение вопроса; правка идёт через
+    # очередь чата, чтобы не затереть уже показанный итог вопроса
+    edit_reminders = GROUP_MESSAGE_BUDGET and game_state is not None
+
+    async def show_reminder(text: str):
+        if cancelled() or game_state.question_result_sent:
+            return
+        await send_question_notice(bot, chat_id, game_state, text)
+
     async def timer():
         nonlocal message_30, message_10
         try:
             # Промежуточные уведомления на 30 и 10 секунд
             if timeout_seconds > 30 and bot and chat_id:
-                await asyncio.sleep(timeout_seconds - 30)
-                if not cancelled():
+                await clock.sleep(timeout_seconds - 30)
+                if not cancelled() and edit_reminders:
+                    post_chat_event(chat_id, lambda: show_reminder(TextStatics.time_left_30()))
+                elif not cancelled():
                     try:
                         message_30 = await bot.send_message(chat_id, TextStatics.time_left_30())
                     except Exception:
                         pass
             
             if timeout_seconds > 10 and bot and chat_id:
-                await asyncio.sleep(20)  # Дополнительные 20 секунд до 10 секунд остатка
-                if not cancelled():
+                await clock.sleep(20)  # Дополнительные 20 секунд до 10 секунд остатка
+                if not cancelled() and edit_reminders:
+                    post_chat_event(chat_id, lambda: show_reminder(TextStatics.time_left_10()))
+                elif not cancelled():
                     try:
                         message_10 = await bot.send_message(chat_id, TextStatics.time_left_10())
                     except Exception:
                         pass
             
             # Финальное ожидание до конца времени
-            await asyncio.sleep(10)
+            await clock.sleep(10)
 
             if message_30 and bot is not None and chat_id is not None:
                 try:
@@ -744,30 +778,49 @@ async def schedule_question_timeout(timeout_seconds: int, on_timeout_callback, b
     return asyncio.create_task(timer())
 
 
-async def fetch_question_and_cancel(state: FSMContext) -> tuple[int, dict] | tuple[None, None]:
+async def fetch_question_and_cancel(state: FSMContext) -> tuple[int, QuestionRecord] | tuple[None, None]:
     data = await state.get_data()
     index = data.get('current_index', 0)
-    questions = data.get('questions', [])
+    question_ids = data.get('question_ids', [])
 
-    if index >= len(questions):
+    if index >= len(question_ids):
         return None, None
 
-    q = questions[index]
     task = data.get('timer_task')
 
     if task:
         task.cancel()
 
+    q = await solo_question(state, question_ids[index])
+    if q is None:
+        return None, None
+
     return index, q
 
 
+async def solo_question(state: FSMContext, question_id: int) -> QuestionRecord | None:
+    """Вопрос соло-игры из кеша; None, если игра простояла так долго, что её вопросы сняты."""
+    question_cache.touch(state.key)
+    try:
+        return question_cache.get(question_id)
+    except KeyError:
+        await clear_solo_state(state)
+        return None
+
+
+async def clear_solo_state(state: FSMContext):
+    """Сбросить FSM соло-игры и освободить её вопросы в кеше."""
+    question_cache.drop_lease(state.key)
+    await state.clear()
+
+
 async def schedule_registration_end(ends_at: datetime, on_expire):
     """Возвращает task, который спит до конца регистрации и затем вызывает on_expire()."""
 
     async def _sleep():
         try:
-            delay = max(0, (ends_at - datetime.utcnow()).total_seconds())
-            await asyncio.sleep(delay)
+            delay = max(0, (ends_at - clock.utcnow()).total_seconds())
+            await clock.sleep(delay)
             await on_expire()
         except asyncio.CancelledError:
             pass
@@ -775,8 +828,11 @@ async def schedule_registration_end(ends_at: datetime, on_expire):
     return asyncio.create_task(_sleep())
 
 
-def format_dm_registration(players: set[str], time_left: int, quiz_name: str) -> str:
-    players_text = "\n".join(f"— {p}" for p in players) or "—"
+def format_dm_registration(players: set[str], time_left: int, quiz_name: str, max_listed: int | None = None) -> str:
+    listed = list(players) if max_listed is None else list(players)[:max_listed]
+    players_text = "\n".join(f"— {p}" for p in listed) or "—"
+    if len(listed) < len(players):
+        players_text += f"\n…и ещё {len(players) - len(listed)}"
     return (
         f"Регистрация на игру ({quiz_name}). Старт через {time_left} сек.\n\n"
         f"Участники:\n{players_text}"
@@ -815,9 +871,10 @@ def is_captain(username: str, game_state) -> bool:
 def format_game_status(game_state, question_text: str | None = None) -> str:
     """Return human-readable status of current game."""
     if game_state.status == 'reg':
-        seconds_left = int((game_state.registration_ends_at - datetime.utcnow()).total_seconds())
+        seconds_left = int((game_state.registration_ends_at - clock.utcnow()).total_seconds())
         if game_state.mode == 'dm':
-            return format_dm_registration(game_state.players, seconds_left, game_state.quiz_name)
+            max_listed = LARGE_ROOM_TOP_N if game_state.large_room else None
+            return format_dm_registration(game_state.players, seconds_left, game_state.quiz_name, max_listed)
         return format_team_registration(game_state.teams, seconds_left, game_state.quiz_name)
 
     if game_state.status == 'playing':
@@ -832,7 +889,13 @@ def format_game_status(game_state, question_text: str | None = None) -> str:
         if game_state.mode == 'dm':
             total_players = len(game_state.players)
             lines.append(f"📊 Ответили: {total_answered}/{total_players}")
-            
+
+            if game_state.large_room:
+                lines.append(f"✅ Правильно: {len(game_state.answers_right)}")
+                lines.append(f"❌ Неправильно: {len(game_state.answers_wrong)}")
+                lines.append(f"⏳ Ждем ответа: {total_players - total_answered}")
+                return '\n'.join(lines)
+
             if game_state.answers_right:
                 lines.append(f"✅ Правильно: {', '.join(game_state.answers_right)}")
             if game_state.answers_wrong:
@@ -915,6 +978,25 @@ def get_nearest_game_avaliable(plans: list[dict]) -> dict | None:
     return nearest[0] if nearest else None
 
 
+def get_difficulty_mix(configs: list[dict], name: str) -> dict[int, int] | None:
+    """Разбивка вопросов по сложности из конфига вида "1:3, 2:5, 3:2".
+
+    None — конфига нет или он записан с ошибкой: вопросы берутся без разбивки.
+    """
+    value = next((config['value'] for config in configs if config['name'] == name), None)
+    if not value:
+        return None
+    try:
+        mix = {}
+        for part in str(value).split(','):
+            difficulty, count = part.split(':')
+            mix[int(difficulty)] = int(count)
+    except ValueError:
+        print(f"Некорректный конфиг {name}: {value!r}")
+        return None
+    return mix or None
+
+
 async def stop_quiz(message: types.Message, state: FSMContext):
 
     if message.chat.type == 'private':
@@ -925,21 +1007,22 @@ async def stop_quiz(message: types.Message, state: FSMContext):
                 task.cancel()
             except Exception:
                 pass
-        await state.clear()
+        await clear_solo_state(state)
         await message.answer(TextStatics.stopped_quiz())
         return
 
-    # GROUP (dm/team): удаляем игру из _games_state
+    # GROUP (dm/team): удаляем игру из _games_state в очереди событий чата,
+    # чтобы остановка не пересеклась с обработкой ответа или переходом
+    post_chat_event(message.chat.id, lambda: _stop_group_game(message))
+
+
+async def _stop_group_game(message: types.Message):
     game_key = _get_game_key_for_chat(message.chat.id)
     if not game_key:
         await message.answer(TextStatics.no_active_game())
         return
     game_state = get_game_state(game_key)
-    if game_state and game_state.timer_task:
-        try:
-            game_state.timer_task.cancel()
-        except Exception:
-            pass
-    if game_key in _games_state:
-        del _games_state[game_key]
+    # Уже поставленные в очередь события этой игры ничего не сделают
+    game_state.status = "finished"
+    drop_game(game_key)
     await message.answer(TextStatics.stopped_quiz())
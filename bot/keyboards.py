@@ -1,5 +1,11 @@
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from callback_codec import encode
+
+# Клавиатуры без параметров (или с парой флагов) собираются один раз и
+# переиспользуются через lru_cache: разметка после создания нигде не меняется
 
 
 def create_variant_keyboard(options: list) -> InlineKeyboardMarkup:
@@ -9,7 +15,7 @@ def create_variant_keyboard(options: list) -> InlineKeyboardMarkup:
     MAX_LENGTH_FOR_TWO_COLUMNS = 20
     
     for idx, opt in enumerate(options):
-        builder.button(text=opt, callback_data=f'answer:{idx}')
+        builder.button(text=opt, callback_data=encode('answer', idx))
     
     # Если есть кнопки с длинным текстом, размещаем их в одну колонку
     has_long_text = any(len(opt) > MAX_LENGTH_FOR_TWO_COLUMNS for opt in options)
@@ -22,6 +28,7 @@ def create_variant_keyboard(options: list) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def main_menu_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура главного меню с выбором типа игры"""
     builder = InlineKeyboardBuilder()
@@ -33,6 +40,7 @@ def main_menu_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def private_menu_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text='🤖 Соло', callback_data='game:solo')
@@ -40,6 +48,7 @@ def private_menu_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def question_result_keyboard(include_finish: bool = True, is_last_question: bool = False) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
 
@@ -60,6 +69,7 @@ def question_result_keyboard(include_finish: bool = True, is_last_question: bool
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def quiz_registration_dm_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text='Участвовать', callback_data='reg:join')
@@ -85,12 +95,13 @@ def team_plans_keyboard(plans: list[dict]) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     for p in plans:
         text = p.get('quiz_name') or f"Квиз #{p.get('quiz')}"
-        builder.button(text=text, callback_data=f"plan_team:{p.get('id')}")
+        builder.button(text=text, callback_data=encode('plan_team', p.get('id')))
     builder.button(text='🔙Назад', callback_data='back')
     builder.adjust(1)
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def team_start_game_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для начала командной игры"""
     builder = InlineKeyboardBuilder()
@@ -100,6 +111,7 @@ def team_start_game_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def confirm_start_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура подтверждения начала игры"""
     builder = InlineKeyboardBuilder()
@@ -108,6 +120,7 @@ def confirm_start_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def finish_quiz_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text='🏁 Завершить викторину', callback_data='finish_quiz')
@@ -115,6 +128,7 @@ def finish_quiz_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def registration_dm_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text='✅ Участвовать', callback_data='reg:join')
@@ -124,6 +138,7 @@ def registration_dm_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def cancel_game_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text='🔙Отменить игру', callback_data='game:cancel')
@@ -148,6 +163,7 @@ def team_registration_keyboard(team_name: str) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def skip_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text='Пропустить', callback_data='team:skip_city')
@@ -155,6 +171,7 @@ def skip_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def notify_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text='🔕 Не напоминать', callback_data='notify:mute')
@@ -162,6 +179,7 @@ def notify_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def new_chat_welcome_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для приветствия в новом чате"""
     builder = InlineKeyboardBuilder()
@@ -170,6 +188,7 @@ def new_chat_welcome_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def existing_chat_welcome_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для приветствия в существующем чате"""
     builder = InlineKeyboardBuilder()
@@ -179,6 +198,7 @@ def existing_chat_welcome_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def city_selection_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для выбора города"""
     builder = InlineKeyboardBuilder()
@@ -187,6 +207,7 @@ def city_selection_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def game_finished_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для окончания игры"""
     builder = InlineKeyboardBuilder()
@@ -195,6 +216,7 @@ def game_finished_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def no_planned_games_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура когда нет запланированных игр"""
     builder = InlineKeyboardBuilder()
@@ -0,0 +1,8 @@
+"""Нагрузочный стенд бота: фейковый Telegram Bot API, заглушка Django API и
+синтетические групповые игры, которые прогоняются через настоящий Dispatcher
+из main.py.
+
+Запуск из каталога bot/:
+
+    python -m loadtest --chats 1000 --players 5
+"""
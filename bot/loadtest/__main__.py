@@ -0,0 +1,193 @@
+"""CLI нагрузочного стенда.
+
+    python -m loadtest --chats 1000 --players 5 --team-share 0.3
+    python -m loadtest --api-url http://127.0.0.1:8000   # реальный API (DEBUG=true, SQLite)
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон групповых игр бота")
+    parser.add_argument('--chats', type=int, default=200, help="Сколько групповых чатов играет одновременно")
+    parser.add_argument('--players', type=int, default=5, help="Игроков в DM-игре")
+    parser.add_argument('--team-share', type=float, default=0.3, help="Доля командных игр")
+    parser.add_argument('--questions', type=int, default=5, help="Вопросов в игре")
+    parser.add_argument('--time-to-answer', type=int, default=60, help="Секунд на ответ")
+    parser.add_argument('--concurrency', type=int, default=0, help="Максимум одновременно идущих игр (0 — все сразу)")
+    parser.add_argument('--ramp-up', type=float, default=5.0, help="За сколько секунд стартуют все игры")
+    parser.add_argument('--think-time', type=float, default=0.0, help="Случайная пауза игрока перед действием, сек.")
+    parser.add_argument('--correct-share', type=float, default=0.7, help="Доля правильных ответов")
+    parser.add_argument('--answer-delay', type=float, default=0.0, help="Пауза перед ответами на каждый вопрос, сек.")
+    parser.add_argument('--message-budget', action='store_true', help="Включить режим экономии сообщений (GROUP_MESSAGE_BUDGET)")
+    parser.add_argument('--tg-latency', type=float, default=0.0, help="Задержка ответа фейкового Telegram, сек.")
+    parser.add_argument('--step-timeout', type=float, default=120.0, help="Сколько ждать реакции бота, прежде чем считать игру зависшей")
+    parser.add_argument('--api-url', default=None, help="Использовать реальный API вместо заглушки")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', dest='json_path', default=None, help="Сохранить отчёт в JSON")
+    parser.add_argument('--verbose', action='store_true', help="Не глушить отладочный вывод бота во время прогона")
+    return parser.parse_args(argv)
+
+
+async def run(args) -> dict:
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    from loadtest.fake_telegram import FakeTelegramServer
+    from loadtest.scenario import HandlerTimingMiddleware, LoadScenario, latency_summary
+    from loadtest.stub_api import build_question_bank
+
+    telegram = FakeTelegramServer(latency=args.tg_latency)
+    await telegram.start()
+
+    # Импортируем после настройки окружения: main поднимает диспетчер и роутеры
+    import chat_actor
+    import main
+    from game_sweeper import games_stats
+    from message_cleanup import wait_idle
+    from question_cache import question_cache
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    bot = Bot(
+        token=os.environ['BOT_TOKEN'],
+        session=AiohttpSession(api=TelegramAPIServer.from_base(telegram.base_url)),
+    )
+    timing = HandlerTimingMiddleware()
+    main.dp.message.middleware(timing)
+    main.dp.callback_query.middleware(timing)
+    chat_actor.event_observers.append(timing.observe_chat_event)
+
+    scenario = LoadScenario(
+        main.dp,
+        bot,
+        telegram,
+        build_question_bank(500),
+        correct_share=args.correct_share,
+        think_time=args.think_time,
+        step_timeout=args.step_timeout,
+        answer_delay=args.answer_delay,
+    )
+
+    limiter = asyncio.Semaphore(args.concurrency or args.chats)
+
+    async def one_game(idx: int):
+        await asyncio.sleep(args.ramp_up * idx / max(args.chats, 1))
+        mode = 'team' if random.random() < args.team_share else 'dm'
+        chat_id = -(10**12 + idx)
+        players = [idx * 1000 + p + 1 for p in range(args.players if mode == 'dm' else 1)]
+        async with limiter:
+            await scenario.play(mode, chat_id, players)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_game(i) for i in range(args.chats)))
+    elapsed = time.perf_counter() - started
+    await wait_idle()
+    chat_actor.event_observers.remove(timing.observe_chat_event)
+
+    await bot.session.close()
+    await telegram.stop()
+
+    finished = sum(scenario.games_finished.values())
+    report = {
+        'config': vars(args),
+        'elapsed_s': round(elapsed, 3),
+        'updates_total': scenario.updates_total,
+        'update_errors': scenario.update_errors,
+        'updates_per_sec': round(scenario.updates_total / elapsed, 2) if elapsed else 0.0,
+        'games_finished': dict(scenario.games_finished),
+        'games_stalled': dict(scenario.games_stalled),
+        'game_duration': latency_summary(scenario.game_durations),
+        'feed_update_latency': latency_summary(scenario.feed_latency),
+        'handler_latency': {name: latency_summary(values) for name, values in sorted(timing.samples.items())},
+        'chat_event_latency': {name: latency_summary(values) for name, values in sorted(timing.event_samples.items())},
+        'handler_end_to_end_latency': {name: latency_summary(values) for name, values in sorted(timing.end_to_end_samples.items())},
+        'telegram_calls': dict(telegram.calls.most_common()),
+        'telegram_calls_per_game': round(sum(telegram.calls.values()) / finished, 2) if finished else None,
+        'questions_played': scenario.questions_played,
+        # Без getMe и ответов на нажатия кнопок: только сообщения в чатах
+        'telegram_chat_calls_per_question': round(
+            sum(count for method, count in telegram.calls.items() if method not in ('getMe', 'answerCallbackQuery')) / scenario.questions_played, 2
+        ) if scenario.questions_played else None,
+        'question_cache': question_cache.stats(),
+        'games_left': games_stats(estimate_size=True),
+    }
+    return report
+
+
+def print_latency_table(title: str, table: dict):
+    print(f"\n{title}")
+    print(f"  {'handler':32} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for name, stats in table.items():
+        print(f"  {name:32} {stats['count']:>7} {stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['max_ms']:>9}")
+
+
+def print_report(report: dict):
+    print(f"\nИгр завершено: {report['games_finished']}, зависло: {report['games_stalled']}")
+    print(f"Обновлений: {report['updates_total']} за {report['elapsed_s']} с — {report['updates_per_sec']} updates/sec, ошибок: {report['update_errors']}")
+    game = report['game_duration']
+    print(f"Длительность игры: p50 {game['p50_ms'] / 1000:.1f} с, p95 {game['p95_ms'] / 1000:.1f} с")
+    feed = report['feed_update_latency']
+    print(f"feed_update: p50 {feed['p50_ms']} мс, p95 {feed['p95_ms']} мс, p99 {feed['p99_ms']} мс, max {feed['max_ms']} мс")
+    print_latency_table("Задержка обработчиков (мс):", report['handler_latency'])
+    print_latency_table("Выполнение событий очереди чата, поставленных обработчиком (мс):", report['chat_event_latency'])
+    print_latency_table("От входа в обработчик до завершения его событий в очереди чата (мс):", report['handler_end_to_end_latency'])
+    print(f"Кеш вопросов: {report['question_cache']}")
+    print(f"Игр осталось в памяти: {report['games_left']}")
+    print(f"\nВызовы Telegram API (на игру: {report['telegram_calls_per_game']}, сообщений в чате на вопрос: {report['telegram_chat_calls_per_question']}):")
+    for method, count in report['telegram_calls'].items():
+        print(f"  {method:32} {count:>7}")
+    if 'api_calls' in report:
+        print("\nВызовы Django API:")
+        for path, count in report['api_calls'].items():
+            print(f"  {path:40} {count:>7}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+
+    # Бот не должен обращаться к настоящему Telegram ни при каких настройках .env
+    os.environ['BOT_TOKEN'] = '123456:LOADTEST'
+    if args.message_budget:
+        os.environ['GROUP_MESSAGE_BUDGET'] = 'true'
+
+    stub = None
+    if args.api_url:
+        os.environ['API_URL'] = args.api_url
+    else:
+        from loadtest.stub_api import StubApi
+
+        stub = StubApi(args.questions, args.time_to_answer)
+        stub.start()
+        os.environ['API_URL'] = stub.base_url
+
+    try:
+        # Обработчики печатают отладку на каждый ответ — на тысячах чатов это шум
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else open(os.devnull, 'w')):
+            report = asyncio.run(run(args))
+    finally:
+        if stub is not None:
+            stub.stop()
+    if stub is not None:
+        report['api_calls'] = dict(stub.calls.most_common())
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if not report['games_stalled'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Локальная подмена Telegram Bot API.
+
+Принимает запросы бота вида /bot<token>/<method>, отвечает правдоподобными
+объектами Message, считает вызовы по методам и пересылает каждое исходящее
+сообщение в очередь чата, чтобы синтетические игроки могли на него реагировать.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+
+BOT_USER = {'id': 4242, 'is_bot': True, 'first_name': 'LoadTestBot', 'username': 'loadtest_bot'}
+
+
+@dataclass
+class OutboundEvent:
+    method: str
+    chat_id: int
+    message_id: int | None
+    text: str = ''
+    # (текст кнопки, callback_data) для inline-кнопок с callback
+    buttons: list[tuple[str, str]] = field(default_factory=list)
+    has_url_button: bool = False
+
+    def has_button(self, prefix: str) -> bool:
+        return any(data.startswith(prefix) for _, data in self.buttons)
+
+
+def _parse_keyboard(raw) -> tuple[list[tuple[str, str]], bool]:
+    if not raw:
+        return [], False
+    markup = json.loads(raw) if isinstance(raw, str) else raw
+    buttons = []
+    has_url = False
+    for row in markup.get('inline_keyboard', []):
+        for button in row:
+            if button.get('callback_data'):
+                buttons.append((button.get('text', ''), button['callback_data']))
+            elif button.get('url'):
+                has_url = True
+    return buttons, has_url
+
+
+class FakeTelegramServer:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self.calls_by_chat: Counter[int] = Counter()
+        self._message_ids: defaultdict[int, int] = defaultdict(int)
+        self._listeners: dict[int, asyncio.Queue[OutboundEvent]] = {}
+        self._runner: web.AppRunner | None = None
+        self.port: int | None = None
+
+    # --- API для сценариев ---
+
+    def next_message_id(self, chat_id: int) -> int:
+        self._message_ids[chat_id] += 1
+        return self._message_ids[chat_id]
+
+    def subscribe(self, chat_id: int) -> asyncio.Queue[OutboundEvent]:
+        queue = self._listeners[chat_id] = asyncio.Queue()
+        return queue
+
+    def unsubscribe(self, chat_id: int) -> None:
+        self._listeners.pop(chat_id, None)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    # --- HTTP ---
+
+    async def start(self):
+        app = web.Application(client_max_size=20 * 1024 * 1024)
+        app.router.add_post('/bot{token}/{method}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _read_params(self, request) -> dict:
+        if request.content_type == 'application/json':
+            return await request.json()
+        form = await request.post()
+        # Файлы (sendPhoto) не нужны — оставляем только скалярные поля
+        return {key: value for key, value in form.items() if isinstance(value, str)}
+
+    def _message(self, chat_id: int, message_id: int, params: dict) -> dict:
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'supergroup' if chat_id < 0 else 'private', 'title': f'loadtest {chat_id}'},
+            'from': BOT_USER,
+        }
+        if 'caption' in params:
+            message['caption'] = params['caption']
+            message['photo'] = [{'file_id': 'photo', 'file_unique_id': 'photo', 'width': 1, 'height': 1}]
+        else:
+            message['text'] = params.get('text', '')
+        if params.get('reply_markup'):
+            markup = params['reply_markup']
+            message['reply_markup'] = json.loads(markup) if isinstance(markup, str) else markup
+        return message
+
+    def _publish(self, method: str, chat_id: int, message_id: int | None, params: dict):
+        queue = self._listeners.get(chat_id)
+        if queue is None:
+            return
+        buttons, has_url = _parse_keyboard(params.get('reply_markup'))
+        queue.put_nowait(OutboundEvent(
+            method=method,
+            chat_id=chat_id,
+            message_id=message_id,
+            text=params.get('text') or params.get('caption') or '',
+            buttons=buttons,
+            has_url_button=has_url,
+        ))
+
+    async def _handle(self, request):
+        method = request.match_info['method']
+        params = await self._read_params(request)
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        chat_id = params.get('chat_id')
+        chat_id = int(chat_id) if chat_id not in (None, '') else None
+        if chat_id is not None:
+            self.calls_by_chat[chat_id] += 1
+
+        if method == 'getMe':
+            result = BOT_USER
+        elif method in ('sendMessage', 'sendPhoto'):
+            message_id = self.next_message_id(chat_id)
+            result = self._message(chat_id, message_id, params)
+            self._publish(method, chat_id, message_id, params)
+        elif method in ('editMessageText', 'editMessageCaption', 'editMessageReplyMarkup'):
+            message_id = int(params['message_id'])
+            result = self._message(chat_id, message_id, params)
+            self._publish(method, chat_id, message_id, params)
+        else:
+            # answerCallbackQuery, deleteMessage(s), setWebhook и прочее
+            result = True
+        return web.json_response({'ok': True, 'result': result})
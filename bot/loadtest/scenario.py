@@ -0,0 +1,299 @@
+"""Синтетические групповые игры (DM и командные) поверх настоящего Dispatcher.
+
+Игроки реагируют на исходящие сообщения бота так же, как живые участники:
+жмут «Участвовать», отвечают кнопками или реплаями, нажимают «Далее» и ждут
+финального сообщения с результатами.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import itertools
+import random
+import re
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from callback_codec import current_callback_route
+from loadtest.fake_telegram import BOT_USER, FakeTelegramServer, OutboundEvent
+
+
+_QUESTION_MARKER = re.compile(r"\[lt-q(\d+)\]")
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def latency_summary(values: list[float]) -> dict:
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p95_ms': round(percentile(values, 95) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'max_ms': round(max(values) * 1000, 3) if values else 0.0,
+    }
+
+
+class _HandlerRun:
+    __slots__ = ('name', 'started', 'finished')
+
+    def __init__(self, started: float):
+        self.name: str | None = None
+        self.started = started
+        self.finished: float | None = None
+
+
+# Текущий вызов обработчика; события чата выполняются в скопированном контексте
+# того, кто их поставил, поэтому видят обработчик-источник
+_handler_run: contextvars.ContextVar[_HandlerRun | None] = contextvars.ContextVar('loadtest_handler_run', default=None)
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Inner-middleware: время выполнения каждого обработчика по его имени.
+
+    Ответы и «Далее» только ставят событие в очередь чата, поэтому время самого
+    обработчика для них — это постановка в очередь. Реальная обработка считается
+    отдельно через chat_actor.event_observers: время выполнения события
+    (event_samples) и путь от входа в обработчик до завершения его события
+    (end_to_end_samples). События, поставленные уже после выхода из обработчика
+    (таймеры, запущенные им), в эти цифры не попадают.
+    """
+
+    def __init__(self):
+        self.samples: defaultdict[str, list[float]] = defaultdict(list)
+        # (обработчик, выполнение события, от входа в обработчик до конца события);
+        # имя обработчика может стать известно позже завершения события
+        self._events: list[tuple[_HandlerRun, float, float]] = []
+
+    def observe_chat_event(self, chat_id: int, context: contextvars.Context, posted_at: float, started_at: float, finished_at: float) -> None:
+        run = context.get(_handler_run)
+        if run is None or (run.finished is not None and posted_at > run.finished):
+            return
+        self._events.append((run, finished_at - started_at, finished_at - run.started))
+
+    @property
+    def event_samples(self) -> dict[str, list[float]]:
+        return self._group(1)
+
+    @property
+    def end_to_end_samples(self) -> dict[str, list[float]]:
+        return self._group(2)
+
+    def _group(self, index: int) -> dict[str, list[float]]:
+        grouped: defaultdict[str, list[float]] = defaultdict(list)
+        for record in self._events:
+            grouped[record[0].name or 'unknown'].append(record[index])
+        return grouped
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        # Сбрасываем имя прошлого нажатия; не возвращаем прежнее значение после
+        # обработчика, чтобы его увидели и внешние middleware
+        current_callback_route.set(None)
+        run = _HandlerRun(time.perf_counter())
+        token = _handler_run.set(run)
+        try:
+            return await handler(event, data)
+        finally:
+            run.finished = time.perf_counter()
+            _handler_run.reset(token)
+            handler_object = data.get('handler')
+            # Нажатия кнопок идут через одну таблицу — берём имя выбранного в ней обработчика
+            run.name = current_callback_route.get() or getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+            self.samples[run.name].append(run.finished - run.started)
+
+
+class GameStalled(Exception):
+    pass
+
+
+class LoadScenario:
+    def __init__(
+        self,
+        dispatcher,
+        bot,
+        telegram: FakeTelegramServer,
+        question_bank: dict[int, dict],
+        correct_share: float = 0.7,
+        think_time: float = 0.0,
+        step_timeout: float = 60.0,
+        answer_delay: float = 0.0,
+    ):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.telegram = telegram
+        self.question_bank = question_bank
+        self.correct_share = correct_share
+        self.think_time = think_time
+        self.step_timeout = step_timeout
+        self.answer_delay = answer_delay
+        self._update_ids = itertools.count(1)
+        self.updates_total = 0
+        self.update_errors = 0
+        self.feed_latency: list[float] = []
+        self.games_finished: defaultdict[str, int] = defaultdict(int)
+        self.games_stalled: defaultdict[str, int] = defaultdict(int)
+        self.game_durations: list[float] = []
+        self.questions_played = 0
+
+    # --- построение обновлений ---
+
+    def _chat(self, chat_id: int) -> dict:
+        return {'id': chat_id, 'type': 'supergroup', 'title': f'loadtest {chat_id}'}
+
+    def _user(self, user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f'u{user_id}', 'username': f'u{user_id}', 'language_code': 'ru'}
+
+    def _callback(self, chat_id: int, user_id: int, data: str, message_id: int) -> dict:
+        update_id = next(self._update_ids)
+        return {
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id),
+                'from': self._user(user_id),
+                'chat_instance': str(chat_id),
+                'data': data,
+                'message': {
+                    'message_id': message_id,
+                    'date': int(time.time()),
+                    'chat': self._chat(chat_id),
+                    'from': BOT_USER,
+                    'text': '…',
+                },
+            },
+        }
+
+    def _reply(self, chat_id: int, user_id: int, text: str, reply_to: int) -> dict:
+        return {
+            'update_id': next(self._update_ids),
+            'message': {
+                'message_id': self.telegram.next_message_id(chat_id),
+                'date': int(time.time()),
+                'chat': self._chat(chat_id),
+                'from': self._user(user_id),
+                'text': text,
+                'reply_to_message': {
+                    'message_id': reply_to,
+                    'date': int(time.time()),
+                    'chat': self._chat(chat_id),
+                    'from': BOT_USER,
+                    'text': '…',
+                },
+            },
+        }
+
+    async def feed(self, data: dict):
+        if self.think_time:
+            await asyncio.sleep(random.uniform(0, self.think_time))
+        update = Update.model_validate(data, context={'bot': self.bot})
+        started = time.perf_counter()
+        try:
+            await self.dispatcher.feed_update(self.bot, update)
+        except Exception:
+            self.update_errors += 1
+        finally:
+            self.feed_latency.append(time.perf_counter() - started)
+            self.updates_total += 1
+
+    async def _expect(self, events: asyncio.Queue[OutboundEvent], predicate) -> OutboundEvent:
+        deadline = time.monotonic() + self.step_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise GameStalled()
+            try:
+                event = await asyncio.wait_for(events.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                raise GameStalled()
+            if predicate(event):
+                return event
+
+    # --- игры ---
+
+    async def play(self, mode: str, chat_id: int, players: list[int]):
+        events = self.telegram.subscribe(chat_id)
+        started = time.monotonic()
+        try:
+            if mode == 'team':
+                await self._team_game(chat_id, players, events)
+            else:
+                await self._dm_game(chat_id, players, events)
+            self.games_finished[mode] += 1
+            self.game_durations.append(time.monotonic() - started)
+        except GameStalled:
+            self.games_stalled[mode] += 1
+        finally:
+            self.telegram.unsubscribe(chat_id)
+
+    async def _dm_game(self, chat_id: int, players: list[int], events):
+        starter = players[0]
+        menu_id = self.telegram.next_message_id(chat_id)
+        await self.feed(self._callback(chat_id, starter, 'game:dm', menu_id))
+        registration = await self._expect(events, lambda e: e.has_button('reg:join'))
+        for player in players:
+            await self.feed(self._callback(chat_id, player, 'reg:join', registration.message_id))
+        await self.feed(self._callback(chat_id, starter, 'reg:end', registration.message_id))
+        await self._play_questions(chat_id, players, starter, events)
+
+    async def _team_game(self, chat_id: int, players: list[int], events):
+        captain = players[0]
+        menu_id = self.telegram.next_message_id(chat_id)
+        await self.feed(self._callback(chat_id, captain, 'game:team', menu_id))
+        plans = await self._expect(events, lambda e: e.has_button('plan_team:'))
+        plan_data = next(data for _, data in plans.buttons if data.startswith('plan_team:'))
+        await self.feed(self._callback(chat_id, captain, plan_data, plans.message_id))
+        prep = await self._expect(events, lambda e: e.has_button('team:start_game'))
+        await self.feed(self._callback(chat_id, captain, 'team:start_game', prep.message_id))
+        # Отвечает только капитан
+        await self._play_questions(chat_id, [captain], captain, events)
+
+    async def _play_questions(self, chat_id: int, answerers: list[int], leader: int, events):
+        while True:
+            event = await self._expect(
+                events,
+                lambda e: e.has_url_button or (e.method.startswith('send') and (_QUESTION_MARKER.search(e.text) or e.has_button('answer:'))),
+            )
+            if event.has_url_button:
+                # Финальное сообщение с результатами
+                return
+            # С реальным API вопросы без метки: варианты выбираем наугад, а
+            # текстовые не распознаём — их закроет таймер вопроса
+            marker = _QUESTION_MARKER.search(event.text)
+            question = self.question_bank.get(int(marker.group(1))) if marker else None
+            if question is None:
+                question = {'question_type': 'variant', 'correct_answer': None}
+            self.questions_played += 1
+            if self.answer_delay:
+                # Игроки думают над вопросом — успевают сработать напоминания таймера
+                await asyncio.sleep(self.answer_delay)
+            for player in answerers:
+                await self._answer(chat_id, player, question, event)
+            result = await self._expect(events, lambda e: e.has_button('next_question'))
+            await self.feed(self._callback(chat_id, leader, 'next_question', result.message_id))
+
+    async def _answer(self, chat_id: int, player: int, question: dict, event: OutboundEvent):
+        correct = random.random() < self.correct_share
+        if question['question_type'] == 'text':
+            answer = question['correct_answers'][0] if correct else 'не знаю'
+            await self.feed(self._reply(chat_id, player, answer, event.message_id))
+            if not correct:
+                # Вторая попытка, чтобы вопрос гарантированно закрылся ответами
+                await self.feed(self._reply(chat_id, player, 'всё ещё не знаю', event.message_id))
+            return
+        options = [(text, data) for text, data in event.buttons if data.startswith('answer:')]
+        wanted = [data for text, data in options if (text == question['correct_answer']) == correct]
+        choice = random.choice(wanted or [data for _, data in options])
+        await self.feed(self._callback(chat_id, player, choice, event.message_id))
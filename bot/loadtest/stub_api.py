@@ -0,0 +1,208 @@
+"""Заглушка Django API для нагрузочного стенда.
+
+Отвечает на те же маршруты, что использует api_client, фиксированными данными
+и считает обращения по маршрутам. Работает в отдельном потоке со своим
+циклом событий: тексты бота загружаются синхронно при импорте
+static.answer_texts, поэтому API должен отвечать ещё до импорта main.
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+from collections import Counter
+from datetime import datetime
+
+from aiohttp import web
+
+
+DM_QUIZ_ID = 1
+TEAM_QUIZ_ID = 2
+TEAM_PLAN_ID = 1
+
+
+def question_marker(question_id: int) -> str:
+    """Метка в тексте вопроса, по которой игроки узнают вопрос в исходящих сообщениях."""
+    return f"[lt-q{question_id}]"
+
+
+def build_question_bank(size: int, text_share: float = 0.3, seed: int = 1) -> dict[int, dict]:
+    rnd = random.Random(seed)
+    bank = {}
+    for qid in range(1, size + 1):
+        is_text = rnd.random() < text_share
+        correct = f"ответ{qid}" if is_text else f"Вариант {qid}"
+        bank[qid] = {
+            'id': qid,
+            'text': f"Синтетический вопрос {qid} {question_marker(qid)}",
+            'comment': None,
+            'question_type': 'text' if is_text else 'variant',
+            'game_use_type': 'dm',
+            'wrong_answers': [] if is_text else [f"Неверно {qid}.{k}" for k in range(3)],
+            'correct_answer': correct,
+            'correct_answers': [correct],
+            'time_to_answer': None,
+            'image_url': None,
+        }
+    return bank
+
+
+class StubApi:
+    def __init__(self, questions_per_game: int, time_to_answer: int, bank_size: int = 500):
+        self.questions_per_game = questions_per_game
+        self.time_to_answer = time_to_answer
+        self.bank = build_question_bank(bank_size)
+        # В командном режиме используем только текстовые вопросы: неверный
+        # вариант в команде закрывает вопрос без сообщения и кнопки «Далее»
+        self.team_bank = [q for q in self.bank.values() if q['question_type'] == 'text']
+        self.calls: Counter[str] = Counter()
+        self.port: int | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._runner: web.AppRunner | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    # --- жизненный цикл в отдельном потоке ---
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start_server())
+            ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='stub-api', daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=10)
+
+    async def _start_server(self):
+        app = web.Application()
+        routes = [
+            ('GET', '/bot-texts/', self.bot_texts),
+            ('POST', '/auth/player/', self.auth_player),
+            ('GET', '/configs/', self.configs),
+            ('GET', '/quiz/list/{quiz_type}/', self.quiz_list),
+            ('GET', '/quiz/game/{quiz_type}/', self.quiz_game),
+            ('POST', '/question/rotated/', self.rotated_questions),
+            ('GET', '/question/list/', self.question_list),
+            ('GET', '/team/{chat_username}/', self.team),
+            ('GET', '/game/plan-game/list/{chat_username}/', self.plan_list),
+            ('POST', '/player/game-end/', self.game_end),
+            ('POST', '/team/game-end/{team_id}/', self.team_game_end),
+            ('POST', '/player/list/chat-points/', self.chat_points),
+            ('POST', '/player/list/total-points/', self.chat_points),
+            ('POST', '/chat/register/', self.empty),
+            ('POST', '/question/{question_id}/like/', self.empty),
+            ('POST', '/question/{question_id}/dislike/', self.empty),
+        ]
+        for method, path, handler in routes:
+            app.router.add_route(method, path, self._counted(path, handler))
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def _counted(self, path, handler):
+        async def wrapper(request):
+            self.calls[path] += 1
+            return await handler(request)
+        return wrapper
+
+    # --- маршруты ---
+
+    async def bot_texts(self, request):
+        return web.json_response([])
+
+    async def empty(self, request):
+        return web.json_response({})
+
+    async def auth_player(self, request):
+        data = await request.json()
+        return web.json_response({'token': f"player-{data.get('telegram_id')}"})
+
+    async def configs(self, request):
+        items = {
+            # Регистрация завершается кнопкой, таймер не должен сработать раньше
+            'seconds_before_dm_game_start': 600,
+            'seconds_before_team_game_start': 600,
+            'amount_questions_dm': self.questions_per_game,
+            'dm_category_name': 'Нагрузочный тест',
+        }
+        return web.json_response([
+            {'id': idx, 'name': name, 'value': str(value)}
+            for idx, (name, value) in enumerate(items.items(), start=1)
+        ])
+
+    def _quiz(self, quiz_type: str) -> dict:
+        return {
+            'id': TEAM_QUIZ_ID if quiz_type == 'team' else DM_QUIZ_ID,
+            'name': f"Нагрузочный {quiz_type}",
+            'description': '',
+            'quiz_type': quiz_type,
+            'amount_questions': self.questions_per_game,
+            'time_to_answer': self.time_to_answer,
+        }
+
+    async def quiz_list(self, request):
+        return web.json_response([self._quiz(request.match_info['quiz_type'])])
+
+    async def quiz_game(self, request):
+        return web.json_response(self._quiz(request.match_info['quiz_type']))
+
+    def _sample(self, pool: list[dict], time_to_answer: int) -> list[dict]:
+        picked = random.sample(pool, min(self.questions_per_game, len(pool)))
+        return [dict(q, time_to_answer=time_to_answer) for q in picked]
+
+    async def rotated_questions(self, request):
+        data = await request.json()
+        time_to_answer = int(data.get('time_to_answer') or self.time_to_answer)
+        return web.json_response({'questions': self._sample(list(self.bank.values()), time_to_answer)})
+
+    async def question_list(self, request):
+        return web.json_response(self._sample(self.team_bank, self.time_to_answer))
+
+    async def team(self, request):
+        chat_username = request.match_info['chat_username']
+        return web.json_response({
+            'id': abs(hash(chat_username)) % 10**9,
+            'name': f"Команда {chat_username}",
+            'chat_username': chat_username,
+            'captain_username': None,
+            'total_scores': 0,
+            'city': None,
+            'city_name': None,
+        })
+
+    async def plan_list(self, request):
+        return web.json_response([{
+            'id': TEAM_PLAN_ID,
+            'quiz': TEAM_QUIZ_ID,
+            'quiz_name': 'Нагрузочный team',
+            'time_to_answer': self.time_to_answer,
+            'always_active': True,
+            'scheduled_datetime': datetime.now().astimezone().isoformat(),
+        }])
+
+    async def game_end(self, request):
+        return web.json_response({'updated': []})
+
+    async def team_game_end(self, request):
+        return web.json_response({})
+
+    async def chat_points(self, request):
+        data = await request.json()
+        return web.json_response([{'username': u, 'points': 0} for u in data.get('usernames', [])])
@@ -5,6 +5,12 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import Update
 from handlers import router as solo_router
 from team_handlers import router as team_router
+from callback_codec import router as callback_router
+from update_pool import UpdatePool, SubmitResult
+from game_sweeper import games_by_mode, games_stats, pending_timers, start_game_sweeper
+import metrics
+import diagnostics
+import tracing
 from dotenv import load_dotenv
 from aiohttp import web, web_runner
 import os
@@ -23,15 +29,43 @@ WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # URL где будет работать
 WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")  # Путь для webhook
 WEBAPP_HOST = os.getenv("WEBAPP_HOST", "localhost")
 WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", 8080))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 16))  # Параллельных обработчиков обновлений
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", 1000))  # Максимум обновлений в очереди
+UPDATE_DEDUPE_TTL = int(os.getenv("UPDATE_DEDUPE_TTL", 600))  # Сколько секунд помним update_id
+BOT_SHARDS = int(os.getenv("BOT_SHARDS", os.cpu_count() or 1))  # Число процессов-шардов в режиме sharded
+SHARD_SOCKET_DIR = os.getenv("SHARD_SOCKET_DIR", "/tmp/quizbot-shards")  # Каталог unix-сокетов шардов
 
 # Initialize bot and dispatcher
 bot = Bot(token=TOKEN)
+# Исходящие вызовы Telegram и ответы 429 — в метрики
+bot.session.middleware(metrics.TelegramRequestMetrics())
 
 # Use memory storage for FSM and register handlers
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 dp.include_router(solo_router)
 dp.include_router(team_router)
+# Все нажатия кнопок маршрутизируются одной таблицей (callback_codec)
+dp.include_router(callback_router)
+# Время каждого обработчика — в метрики
+metrics.install_handler_metrics(dp)
+# Трассировка обновлений сквозь вызовы API (если задан BOT_TRACE_FILE)
+tracing.install(dp, bot)
+
+# Очередь обновлений для webhook-режима: быстрый ответ Telegram, обработка в пуле
+update_pool = UpdatePool(
+    dp,
+    bot,
+    workers=WEBHOOK_WORKERS,
+    max_queue=WEBHOOK_QUEUE_SIZE,
+    dedupe_ttl=UPDATE_DEDUPE_TTL,
+)
+
+metrics.gauge('bot_live_games', 'Групповые игры в памяти', games_by_mode, ('mode', 'status'))
+metrics.gauge('bot_pending_timers', 'Незавершённые таймеры групповых игр', pending_timers, ('mode',))
+metrics.gauge('bot_webhook_queue_depth', 'Обновления в очереди веб-хука', lambda: update_pool.depth)
+metrics.gauge('bot_event_loop_lag_seconds', 'Последняя измеренная задержка цикла событий', lambda: diagnostics.loop_monitor.last_lag)
+metrics.gauge('bot_webhook_workers_busy', 'Занятые обработчики очереди веб-хука', lambda: update_pool.stats()['workers_busy'])
 
 async def setup_webhook(webhook_url: str):
     """Настройка вебхука для бота"""
@@ -71,29 +105,70 @@ async def get_webhook_info():
 
 
 async def telegram_webhook_handler(request):
-    """Прямой обработчик веб-хуков от Telegram"""
+    """Прямой обработчик веб-хуков от Telegram: валидируем, ставим в очередь и сразу отвечаем"""
     try:
-        # Читаем JSON напрямую для максимальной скорости
         update_data = await request.json()
-        update = Update(**update_data)
-        
-        # Обрабатываем обновление через диспетчер
-        await dp.feed_update(bot, update)
-        
-        # Возвращаем минимальный ответ
-        return web.Response(text="OK", content_type="text/plain")
+        update = Update.model_validate(update_data, context={"bot": bot})
     except Exception as e:
-        logging.error(f"Ошибка при обработке веб-хука: {e}")
-        return web.Response(text="Error", status=500, content_type="text/plain")
+        logging.error(f"Некорректное обновление в веб-хуке: {e}")
+        return web.Response(text="Bad Request", status=400, content_type="text/plain")
+
+    result = update_pool.submit(update)
+    if result == SubmitResult.rejected:
+        # Очередь переполнена — Telegram повторит доставку позже
+        logging.warning(f"Очередь обновлений переполнена: {update_pool.stats()}")
+        return web.Response(text="Busy", status=503, content_type="text/plain")
+
+    # Возвращаем минимальный ответ (в т.ч. для повторно доставленных дублей)
+    return web.Response(text="OK", content_type="text/plain")
+
+
+@diagnostics.guarded
+async def webhook_stats_handler(request):
+    """Метрики очереди обновлений и игр в памяти; ?size=1 — с примерным объёмом игр"""
+    estimate_size = request.query.get('size') in ('1', 'true')
+    return web.json_response({**update_pool.stats(), 'games': games_stats(estimate_size=estimate_size)})
+
+
+async def metrics_handler(request):
+    """Метрики в текстовом формате Prometheus"""
+    return web.Response(body=metrics.registry.render().encode(), headers={'Content-Type': metrics.CONTENT_TYPE})
 
 
 async def health_check_handler(request):
-    """Health check для мониторинга"""
+    """Health check для мониторинга: 503, пока цикл событий не успевает"""
+    reason = diagnostics.loop_monitor.degraded_reason()
+    if reason:
+        return web.Response(text=f"Bot is degraded: {reason}", status=503, content_type="text/plain")
     return web.Response(text="Bot is running", content_type="text/plain")
 
 
-async def init_webhook():
-    """Инициализация веб-хука"""
+async def _start_update_pool(app):
+    await update_pool.start()
+
+
+async def _stop_update_pool(app):
+    await update_pool.stop()
+
+
+async def _start_game_sweeper(app):
+    app['game_sweeper'] = start_game_sweeper(bot)
+
+
+async def _stop_game_sweeper(app):
+    app['game_sweeper'].cancel()
+
+
+async def _start_loop_monitor(app):
+    diagnostics.loop_monitor.start()
+
+
+async def _stop_loop_monitor(app):
+    diagnostics.loop_monitor.stop()
+
+
+def create_webhook_app():
+    """Веб-приложение приёма обновлений (без регистрации веб-хука в Telegram)"""
     # Создаем веб-приложение с минимальными настройками для максимальной скорости
     app = web.Application(
         client_max_size=1024*1024,  # 1MB max request size
@@ -105,7 +180,27 @@ async def init_webhook():
     
     # Дополнительные эндпоинты
     app.router.add_get('/health', health_check_handler)
-    
+    app.router.add_get('/metrics', metrics_handler)
+    # Диагностика для администраторов (нужен DIAG_TOKEN); не под WEBHOOK_PATH,
+    # который nginx открывает наружу
+    app.router.add_get('/diag/stats', webhook_stats_handler)
+    diagnostics.add_routes(app)
+
+    # Пул обработчиков живёт вместе с веб-приложением
+    app.on_startup.append(_start_update_pool)
+    app.on_cleanup.append(_stop_update_pool)
+    # Сборщик брошенных игр работает там же, где живут игры
+    app.on_startup.append(_start_game_sweeper)
+    app.on_cleanup.append(_stop_game_sweeper)
+    app.on_startup.append(_start_loop_monitor)
+    app.on_cleanup.append(_stop_loop_monitor)
+    return app
+
+
+async def init_webhook():
+    """Инициализация веб-хука"""
+    app = create_webhook_app()
+
     # Настраиваем веб-хук в Telegram
     if WEBHOOK_URL:
         webhook_url = f"{WEBHOOK_URL}{WEBHOOK_PATH}"
@@ -122,7 +217,13 @@ async def start_polling():
     """Запуск в режиме polling (для разработки)"""
     logging.info("Запуск бота в режиме polling...")
     await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    sweeper = start_game_sweeper(bot)
+    diagnostics.loop_monitor.start()
+    try:
+        await dp.start_polling(bot)
+    finally:
+        sweeper.cancel()
+        diagnostics.loop_monitor.stop()
 
 
 async def start_webhook():
@@ -147,11 +248,51 @@ async def start_webhook():
         await runner.cleanup()
 
 
+async def start_shard_worker():
+    """Воркер шарда: принимает обновления от фронта через unix-сокет"""
+    socket_path = os.environ["SHARD_SOCKET"]
+    logging.info(f"Запуск шарда {os.getenv('SHARD_INDEX')} на {socket_path}...")
+    runner = web_runner.AppRunner(create_webhook_app())
+    await runner.setup()
+    site = web.UnixSite(runner, socket_path)
+    await site.start()
+    try:
+        await asyncio.Future()
+    finally:
+        await runner.cleanup()
+
+
+async def start_sharded():
+    """Запуск фронта и воркеров, обновления распределяются по chat_id"""
+    from sharding import run_sharded
+
+    async def on_ready():
+        if WEBHOOK_URL:
+            await setup_webhook(f"{WEBHOOK_URL}{WEBHOOK_PATH}")
+        else:
+            logging.warning("WEBHOOK_URL не задан в переменных окружения")
+
+    logging.info(f"Запуск бота в режиме sharded ({BOT_SHARDS} шардов)...")
+    await run_sharded(
+        BOT_SHARDS,
+        SHARD_SOCKET_DIR,
+        WEBAPP_HOST,
+        WEBAPP_PORT,
+        WEBHOOK_PATH,
+        os.path.abspath(__file__),
+        on_ready=on_ready,
+    )
+
+
 if __name__ == "__main__":
     # Определяем режим работы из переменных окружения
-    mode = os.getenv("BOT_MODE", "polling")  # polling или webhook
-    
+    mode = os.getenv("BOT_MODE", "polling")  # polling, webhook, sharded (shard_worker — внутренний)
+
     if mode == "webhook":
         asyncio.run(start_webhook())
+    elif mode == "sharded":
+        asyncio.run(start_sharded())
+    elif mode == "shard_worker":
+        asyncio.run(start_shard_worker())
     else:
         asyncio.run(start_polling())
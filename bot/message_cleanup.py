@@ -0,0 +1,70 @@
+"""Фоновая пакетная очистка сообщений.
+
+Идентификаторы сообщений копятся по чатам и удаляются через deleteMessages
+(до 100 id за вызов) отдельной задачей, чтобы не задерживать отправку
+следующего вопроса.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+from typing import Iterable
+
+from aiogram.exceptions import TelegramBadRequest
+
+
+# Лимит Telegram Bot API на один вызов deleteMessages
+DELETE_BATCH_SIZE = 100
+
+_pending: dict[int, list[int]] = {}
+_workers: dict[int, asyncio.Task] = {}
+
+
+def schedule_delete(bot, chat_id: int, message_ids: Iterable[int | None]) -> None:
+    """Поставить сообщения в очередь на удаление, не дожидаясь результата."""
+    ids = [mid for mid in message_ids if mid]
+    if not ids:
+        return
+    _pending.setdefault(chat_id, []).extend(ids)
+    worker = _workers.get(chat_id)
+    if worker is None or worker.done():
+        # Очередь чата обслуживает много обновлений — без контекста (trace) первого из них
+        _workers[chat_id] = asyncio.create_task(_drain(bot, chat_id), context=contextvars.Context())
+
+
+async def _delete_batch(bot, chat_id: int, batch: list[int]) -> None:
+    try:
+        await bot.delete_messages(chat_id, batch)
+    except TelegramBadRequest:
+        # Пакет целиком отклонён (например, нет прав на чужие сообщения) —
+        # удаляем по одному, чтобы не потерять собственные сообщения бота
+        if len(batch) == 1:
+            return
+        for mid in batch:
+            try:
+                await bot.delete_message(chat_id, mid)
+            except Exception:
+                pass
+    except Exception as e:
+        print(f"message_cleanup: deleteMessages failed for chat {chat_id}: {e}")
+
+
+async def _drain(bot, chat_id: int) -> None:
+    try:
+        while True:
+            ids = _pending.pop(chat_id, None)
+            if not ids:
+                break
+            # Убираем дубли, сохраняя порядок
+            ids = list(dict.fromkeys(ids))
+            for i in range(0, len(ids), DELETE_BATCH_SIZE):
+                await _delete_batch(bot, chat_id, ids[i:i + DELETE_BATCH_SIZE])
+    finally:
+        if _workers.get(chat_id) is asyncio.current_task():
+            del _workers[chat_id]
+
+
+async def wait_idle() -> None:
+    """Дождаться, пока все накопленные удаления будут отправлены."""
+    while _workers:
+        await asyncio.gather(*list(_workers.values()), return_exceptions=True)
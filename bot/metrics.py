@@ -0,0 +1,324 @@
+"""Метрики бота в текстовом формате Prometheus.
+
+Обычные счётчики в памяти процесса, без клиента prometheus и внешних
+сервисов: веб-приложение отдаёт их на /metrics (main.metrics_handler).
+Гистограммы копят время обработчиков, запросов к API и вызовов Telegram;
+gauge-метрики (живые игры, таймеры, очередь веб-хука) не хранят значение,
+а считают его функцией в момент запроса /metrics.
+
+В режиме sharded у каждого шарда свои метрики; фронт собирает их с меткой
+shard (sharding.merge_shard_metrics) или отдаёт один шард по /metrics?shard=N.
+"""
+from __future__ import annotations
+
+import functools
+import inspect
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import TelegramObject
+
+from callback_codec import current_callback_route
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Границы корзин гистограмм, сек.: от быстрых обработчиков до долгих запросов к API
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict[str, Any]) -> tuple:
+        return tuple(labels[name] for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def lines(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def lines(self) -> list[str]:
+        return [
+            f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [счётчики по корзинам (последняя — +Inf), сумма]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def lines(self) -> list[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Gauge(_Metric):
+    """Значение считается при каждом запросе /metrics.
+
+    collect возвращает число (метрика без меток) или словарь
+    {кортеж значений меток: число}.
+    """
+
+    kind = 'gauge'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], float | dict[tuple, float]],
+        labelnames: tuple[str, ...] = (),
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def lines(self) -> list[str]:
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+            for key, value in sorted(values.items())
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        # Повторная регистрация (например, второй create_webhook_app) заменяет метрику
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                body = metric.lines()
+            except Exception as e:
+                # Сломанный сборщик не должен ронять весь /metrics
+                print(f"metrics: не удалось собрать {metric.name}: {e}")
+                continue
+            lines.extend(metric.header())
+            lines.extend(body)
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def gauge(name: str, documentation: str, collect: Callable, labelnames: tuple[str, ...] = ()) -> Gauge:
+    return registry.register(Gauge(name, documentation, collect, labelnames))
+
+
+handler_duration = histogram(
+    'bot_handler_duration_seconds', 'Время обработчика обновления', ('handler',),
+)
+handler_errors = counter(
+    'bot_handler_errors_total', 'Обработчики, завершившиеся исключением', ('handler',),
+)
+api_duration = histogram(
+    'bot_api_request_duration_seconds', 'Время вызова API бэкенда', ('endpoint',),
+)
+api_requests = counter(
+    'bot_api_requests_total', 'Вызовы API бэкенда по результату: ok, HTTP-код ошибки или error', ('endpoint', 'status'),
+)
+telegram_duration = histogram(
+    'bot_telegram_request_duration_seconds', 'Время вызова Telegram Bot API', ('method',),
+)
+telegram_requests = counter(
+    'bot_telegram_requests_total', 'Вызовы Telegram Bot API по результату: ok, 429 или error', ('method', 'status'),
+)
+telegram_retry_after = counter(
+    'bot_telegram_retry_after_seconds_total', 'Сколько секунд Telegram просил подождать в ответах 429', ('method',),
+)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware: время каждого обработчика по его имени.
+
+    Нажатия кнопок идут через одну таблицу callback_codec, поэтому для них
+    берётся имя выбранного в ней обработчика.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        # Сбрасываем имя прошлого нажатия; не возвращаем прежнее значение после
+        # обработчика, чтобы его увидели и внешние middleware
+        current_callback_route.set(None)
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await handler(event, data)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            handler_object = data.get('handler')
+            name = current_callback_route.get() or getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+            handler_duration.observe(time.perf_counter() - started, handler=name)
+            if failed:
+                handler_errors.inc(handler=name)
+
+
+def install_handler_metrics(dispatcher) -> None:
+    """Повесить HandlerMetricsMiddleware на все типы событий диспетчера.
+
+    Inner-middleware родительского роутера действуют и на обработчики
+    вложенных роутеров.
+    """
+    middleware = HandlerMetricsMiddleware()
+    for name, observer in dispatcher.observers.items():
+        if name not in ('update', 'error'):
+            observer.middleware(middleware)
+
+
+class TelegramRequestMetrics(BaseRequestMiddleware):
+    """Middleware сессии бота: исходящие вызовы Telegram и ответы 429."""
+
+    async def __call__(self, make_request, bot, method):
+        name = getattr(method, '__api_method__', type(method).__name__)
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            response = await make_request(bot, method)
+            status = 'ok'
+            return response
+        except TelegramRetryAfter as e:
+            status = '429'
+            telegram_retry_after.inc(e.retry_after, method=name)
+            raise
+        finally:
+            telegram_duration.observe(time.perf_counter() - started, method=name)
+            telegram_requests.inc(method=name, status=status)
+
+
+def _api_status(error: Exception) -> str:
+    # aiohttp.ClientResponseError — .status, requests.HTTPError — .response.status_code
+    status = getattr(error, 'status', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return str(status) if status is not None else 'error'
+
+
+def observe_api(func):
+    """Декоратор функций api_client: время и результат вызова по имени функции."""
+    endpoint = func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            status = 'ok'
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                status = _api_status(e)
+                raise
+            finally:
+                api_duration.observe(time.perf_counter() - started, endpoint=endpoint)
+                api_requests.inc(endpoint=endpoint, status=status)
+        return wrapper
+
+    @functools.wraps(func)
+    def sync_wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        status = 'ok'
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            status = _api_status(e)
+            raise
+        finally:
+            api_duration.observe(time.perf_counter() - started, endpoint=endpoint)
+            api_requests.inc(endpoint=endpoint, status=status)
+    return sync_wrapper
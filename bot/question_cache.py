@@ -0,0 +1,176 @@
+"""Общий кеш вопросов процесса.
+
+Вопросы из API превращаются в компактные неизменяемые записи и хранятся один
+раз на процесс; игры и FSM-сессии держат только id. Кеш ограничен по размеру
+(LRU), но вопросы идущих игр закреплены счётчиком ссылок и не вытесняются:
+игра берёт вопросы через acquire() и отдаёт через release() при завершении.
+
+Соло-игры живут в FSM, и конец у них бывает не всегда: игрок бросает игру
+или начинает новую. Поэтому их вопросы закрепляются арендой по ключу FSM
+(lease): новая аренда того же игрока снимает прежнюю, а аренды без
+активности дольше SOLO_IDLE_TIMEOUT снимает сборщик (game_sweeper).
+"""
+from __future__ import annotations
+
+import os
+from collections import OrderedDict
+from typing import Hashable, Iterable
+
+import clock
+from answer_matcher import AnswerMatcher
+from static.choices import QuestionTypeChoices
+
+
+# Сколько незакреплённых вопросов держим в памяти
+QUESTION_CACHE_SIZE = int(os.getenv("QUESTION_CACHE_SIZE", 5000))
+
+
+class QuestionRecord:
+    __slots__ = (
+        'id',
+        'text',
+        'comment',
+        'question_type',
+        'wrong_answers',
+        'correct_answer',
+        'correct_answers',
+        'image_url',
+        'matcher',
+    )
+
+    def __init__(self, data: dict):
+        set_ = object.__setattr__
+        correct_answer = data.get('correct_answer') or ''
+        correct_answers = tuple(data.get('correct_answers') or (correct_answer,))
+        question_type = data.get('question_type')
+        set_(self, 'id', data['id'])
+        set_(self, 'text', data.get('text') or '')
+        set_(self, 'comment', data.get('comment'))
+        set_(self, 'question_type', question_type)
+        set_(self, 'wrong_answers', tuple(data.get('wrong_answers') or ()))
+        set_(self, 'correct_answer', correct_answer)
+        set_(self, 'correct_answers', correct_answers)
+        set_(self, 'image_url', data.get('image_url'))
+        # Матчер нужен только открытым вопросам; варианты сравнивает is_correct_option
+        set_(self, 'matcher', AnswerMatcher(correct_answers, fuzzy=True) if question_type == QuestionTypeChoices.TEXT else None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("QuestionRecord is immutable")
+
+    def __repr__(self):
+        return f"QuestionRecord(id={self.id}, type={self.question_type})"
+
+    @property
+    def right_answer(self) -> str:
+        """Ответ, который показываем игрокам."""
+        return self.correct_answers[0] if self.correct_answers else self.correct_answer
+
+    @property
+    def options(self) -> list[str]:
+        """Варианты ответа до перемешивания."""
+        return [*self.wrong_answers, self.correct_answer]
+
+    def is_correct_option(self, option: str) -> bool:
+        """Выбранный вариант — правильный; сравниваем текст кнопки как есть, без нормализации."""
+        return option.strip().casefold() == self.correct_answer.strip().casefold()
+
+    def is_correct(self, answer: str) -> bool:
+        if self.question_type == QuestionTypeChoices.TEXT:
+            return self.matcher.matches(answer)
+        return self.is_correct_option(answer)
+
+
+class QuestionCache:
+    def __init__(self, maxsize: int = QUESTION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._records: OrderedDict[int, QuestionRecord] = OrderedDict()
+        self._pins: dict[int, int] = {}
+        # владелец (ключ FSM соло-игры) -> (id вопросов, время последней активности)
+        self._leases: dict[Hashable, tuple[list[int], float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, items: Iterable[dict]) -> list[int]:
+        """Сохранить вопросы из API, закрепить их и вернуть список id."""
+        ids = []
+        for data in items:
+            qid = data['id']
+            # Запись обновляем: вопрос могли отредактировать в админке
+            self._records[qid] = QuestionRecord(data)
+            self._records.move_to_end(qid)
+            self._pins[qid] = self._pins.get(qid, 0) + 1
+            ids.append(qid)
+        self._evict()
+        return ids
+
+    def release(self, ids: Iterable[int]) -> None:
+        for qid in ids:
+            count = self._pins.get(qid, 0) - 1
+            if count > 0:
+                self._pins[qid] = count
+            else:
+                self._pins.pop(qid, None)
+        self._evict()
+
+    def lease(self, owner: Hashable, items: Iterable[dict]) -> list[int]:
+        """Закрепить вопросы за владельцем взамен его прежней аренды."""
+        self.drop_lease(owner)
+        ids = self.acquire(items)
+        self._leases[owner] = (ids, clock.monotonic())
+        return ids
+
+    def touch(self, owner: Hashable) -> None:
+        """Отметить активность владельца, чтобы сборщик не снял его аренду."""
+        lease = self._leases.get(owner)
+        if lease is not None:
+            self._leases[owner] = (lease[0], clock.monotonic())
+
+    def drop_lease(self, owner: Hashable) -> None:
+        lease = self._leases.pop(owner, None)
+        if lease is not None:
+            self.release(lease[0])
+
+    def expire_leases(self, idle_timeout: float, now: float | None = None) -> int:
+        """Снять аренды без активности дольше idle_timeout; вернуть их число."""
+        now = clock.monotonic() if now is None else now
+        expired = [owner for owner, (_, touched) in self._leases.items() if now - touched > idle_timeout]
+        for owner in expired:
+            self.drop_lease(owner)
+        return len(expired)
+
+    def get(self, qid: int) -> QuestionRecord:
+        record = self._records.get(qid)
+        if record is None:
+            self.misses += 1
+            raise KeyError(f"question {qid} is not cached")
+        self.hits += 1
+        self._records.move_to_end(qid)
+        return record
+
+    def _evict(self) -> None:
+        excess = len(self._records) - self.maxsize
+        if excess <= 0:
+            return
+        # Вытесняем самые давние незакреплённые записи
+        for qid in list(self._records):
+            if excess <= 0:
+                break
+            if qid not in self._pins:
+                del self._records[qid]
+                excess -= 1
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._records),
+            'max_size': self.maxsize,
+            'pinned': len(self._pins),
+            'leases': len(self._leases),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+question_cache = QuestionCache()
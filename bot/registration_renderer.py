@@ -0,0 +1,158 @@
+"""Отложенная перерисовка сообщения регистрации.
+
+Нажатия «Участвовать» меняют состояние игры сразу, а сообщение регистрации
+перерисовывается не чаще раза в REGISTRATION_EDIT_INTERVAL секунд с последним
+составом участников: 50 нажатий за пару секунд дают одно-два редактирования
+вместо 50 и не упираются в лимиты Telegram. Тот же цикл обновляет обратный
+отсчёт на отметках, кратных REGISTRATION_COUNTDOWN_STEP секундам.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import math
+import os
+from datetime import datetime
+from typing import Callable
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+import clock
+
+
+# Минимальный интервал между редактированиями сообщения регистрации, сек.
+REGISTRATION_EDIT_INTERVAL = float(os.getenv("REGISTRATION_EDIT_INTERVAL", 3))
+# Шаг обратного отсчёта на сообщении регистрации, сек.
+REGISTRATION_COUNTDOWN_STEP = int(os.getenv("REGISTRATION_COUNTDOWN_STEP", 10))
+
+# render(seconds_left) -> (текст, клавиатура)
+RenderFn = Callable[[int], tuple]
+
+
+class RegistrationRenderer:
+    def __init__(
+        self,
+        bot,
+        chat_id: int,
+        message_id: int,
+        ends_at: datetime,
+        render: RenderFn,
+        is_active: Callable[[], bool],
+        interval: float = REGISTRATION_EDIT_INTERVAL,
+        countdown_step: int = REGISTRATION_COUNTDOWN_STEP,
+    ):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.ends_at = ends_at
+        self.render = render
+        self.is_active = is_active
+        self.interval = interval
+        self.countdown_step = max(1, countdown_step)
+        self.requests = 0
+        self.edits = 0
+        self._shown_text: str | None = None
+        self._dirty = asyncio.Event()
+        self._closed = False
+        self._editing = False
+        self._paused_until = 0.0
+        self._task: asyncio.Task | None = None
+
+    def start(self, shown_text: str | None = None) -> None:
+        """Запустить цикл; shown_text — текст, уже отправленный в чат."""
+        self._shown_text = shown_text
+        # Цикл переживает обновление, которое его запустило, — без его контекста (trace)
+        self._task = asyncio.create_task(
+            self._run(), name=f"registration-render-{self.chat_id}", context=contextvars.Context(),
+        )
+
+    def request(self) -> None:
+        """Состав изменился — перерисовать при первой возможности."""
+        self.requests += 1
+        self._dirty.set()
+
+    def stop(self) -> None:
+        self._closed = True
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    async def close(self) -> None:
+        """Остановить цикл, дождавшись уже начатого редактирования.
+
+        Вызывается перед тем, как сообщение регистрации будет отредактировано
+        иначе, чтобы запоздалая перерисовка не вернула старый текст.
+        """
+        self._closed = True
+        task = self._task
+        if task is None or task.done() or task is asyncio.current_task():
+            return
+        if not self._editing:
+            # Цикл ждёт или спит — его можно просто снять
+            task.cancel()
+        await asyncio.wait({task})
+
+    def seconds_left(self) -> float:
+        return (self.ends_at - clock.utcnow()).total_seconds()
+
+    def _next_tick(self, left: float) -> float:
+        """Через сколько секунд обратный отсчёт дойдёт до следующей отметки."""
+        step = self.countdown_step
+        mark = max(0, math.ceil(left / step) - 1) * step
+        return max(0.0, left - mark)
+
+    def _alive(self) -> bool:
+        return not self._closed and self.is_active() and self.seconds_left() > 0
+
+    async def _run(self) -> None:
+        last_edit = float('-inf')
+        while self._alive():
+            try:
+                await asyncio.wait_for(self._dirty.wait(), timeout=self._next_tick(self.seconds_left()))
+            except asyncio.TimeoutError:
+                pass
+            # Не чаще одного редактирования за интервал: все нажатия за это
+            # время попадут в одну перерисовку
+            wait = max(last_edit + self.interval, self._paused_until) - clock.monotonic()
+            if wait > 0:
+                await clock.sleep(wait)
+            if not self._alive():
+                return
+            self._dirty.clear()
+            self._editing = True
+            try:
+                if not await self._edit():
+                    return
+            finally:
+                self._editing = False
+            last_edit = clock.monotonic()
+
+    async def _edit(self) -> bool:
+        """Перерисовать сообщение; False — продолжать бессмысленно."""
+        text, reply_markup = self.render(max(0, round(self.seconds_left())))
+        if text == self._shown_text:
+            return True
+        try:
+            await self.bot.edit_message_text(
+                chat_id=self.chat_id,
+                message_id=self.message_id,
+                text=text,
+                reply_markup=reply_markup,
+            )
+        except TelegramRetryAfter as e:
+            # Перерисуем после паузы, которую попросил Telegram
+            self._paused_until = clock.monotonic() + e.retry_after
+            self._dirty.set()
+            return True
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                self._shown_text = text
+                return True
+            # Сообщение удалено или недоступно
+            print(f"Не удалось обновить регистрацию в чате {self.chat_id}: {e}")
+            return False
+        except Exception as e:
+            print(f"Ошибка при обновлении регистрации в чате {self.chat_id}: {e}")
+            return True
+        self._shown_text = text
+        self.edits += 1
+        return True
@@ -0,0 +1,76 @@
+"""Таблица очков игры с быстрым топом.
+
+ScoreBoard ведёт себя как обычный dict «игрок -> очки» (порядок вставки
+сохраняется), но дополнительно раскладывает игроков по корзинам очков.
+Различных значений очков в викторине не больше числа вопросов, поэтому
+топ-K собирается обходом нескольких верхних корзин без сортировки всех
+игроков — это важно для комнат с сотнями участников.
+"""
+from __future__ import annotations
+
+import heapq
+from collections.abc import MutableMapping
+from typing import Iterator
+
+
+class ScoreBoard(MutableMapping):
+    __slots__ = ('_scores', '_buckets')
+
+    def __init__(self, initial=None):
+        self._scores: dict[str, int] = {}
+        self._buckets: dict[int, set[str]] = {}
+        if initial:
+            self.update(initial)
+
+    def __getitem__(self, name: str) -> int:
+        return self._scores[name]
+
+    def __setitem__(self, name: str, score: int) -> None:
+        old = self._scores.get(name)
+        if old is not None:
+            if old == score:
+                return
+            self._discard(name, old)
+        self._scores[name] = score
+        self._buckets.setdefault(score, set()).add(name)
+
+    def __delitem__(self, name: str) -> None:
+        score = self._scores.pop(name)
+        self._discard(name, score)
+
+    def _discard(self, name: str, score: int) -> None:
+        bucket = self._buckets[score]
+        bucket.discard(name)
+        if not bucket:
+            del self._buckets[score]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._scores)
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __repr__(self) -> str:
+        return f"ScoreBoard({self._scores!r})"
+
+    def clear(self) -> None:
+        self._scores.clear()
+        self._buckets.clear()
+
+    def top(self, k: int) -> list[tuple[str, int]]:
+        """k лучших игроков по убыванию очков, при равенстве — по имени."""
+        result: list[tuple[str, int]] = []
+        for score in sorted(self._buckets, reverse=True):
+            if len(result) >= k:
+                break
+            bucket = self._buckets[score]
+            names = heapq.nsmallest(k - len(result), bucket) if len(bucket) > k - len(result) else sorted(bucket)
+            result.extend((name, score) for name in names)
+        return result
+
+    def ranked(self) -> list[tuple[str, int]]:
+        """Все игроки по убыванию очков."""
+        return self.top(len(self._scores))
+
+    def total(self) -> int:
+        return sum(score * len(bucket) for score, bucket in self._buckets.items())
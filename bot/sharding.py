@@ -0,0 +1,535 @@
+"""Шардирование обработки обновлений по chat_id.
+
+Фронтовой процесс принимает webhook от Telegram, вычисляет chat_id и по
+консистентному хешу пересылает сырое обновление одному из N воркеров через
+unix-сокеты. Все обновления одного чата всегда попадают в один и тот же
+процесс, поэтому состояние игр и FSM остаются локальными для шарда и не
+требуют межпроцессной синхронизации.
+
+Проверка маршрутизации без Telegram и без API:
+
+    python sharding.py --selfcheck 4
+
+То же с настоящими процессами-воркерами (run_sharded, BOT_MODE=shard_worker)
+и заглушкой API из loadtest: шард, обработавший обновление, виден по
+span'у трассировки, который пишет его диспетчер:
+
+    python sharding.py --selfcheck 4 --workers
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web, web_runner
+
+import diagnostics
+
+
+# Виртуальных узлов на шард: сглаживает распределение чатов по кольцу
+RING_VNODES = 64
+
+# Типы обновлений, в которых чат лежит прямо в объекте
+_CHAT_UPDATE_TYPES = (
+    'message',
+    'edited_message',
+    'channel_post',
+    'edited_channel_post',
+    'business_message',
+    'edited_business_message',
+    'my_chat_member',
+    'chat_member',
+    'chat_join_request',
+    'chat_boost',
+    'removed_chat_boost',
+    'message_reaction',
+    'message_reaction_count',
+)
+
+# Типы обновлений без чата: маршрутизируем по пользователю
+_USER_UPDATE_TYPES = (
+    'inline_query',
+    'chosen_inline_result',
+    'shipping_query',
+    'pre_checkout_query',
+    'poll_answer',
+)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Консистентный хеш: при изменении числа шардов переезжает ~1/N чатов."""
+
+    def __init__(self, shards: int, vnodes: int = RING_VNODES):
+        if shards < 1:
+            raise ValueError("shards must be >= 1")
+        self.shards = shards
+        points = sorted(
+            (_hash(f"shard-{shard}-{vnode}"), shard)
+            for shard in range(shards)
+            for vnode in range(vnodes)
+        )
+        self._keys = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard_for(self, chat_id: int) -> int:
+        idx = bisect.bisect(self._keys, _hash(str(chat_id)))
+        if idx == len(self._keys):
+            idx = 0
+        return self._owners[idx]
+
+
+def extract_chat_id(update_data: dict) -> int | None:
+    """Найти chat_id в сыром обновлении Telegram (без полной валидации)."""
+    for key in _CHAT_UPDATE_TYPES:
+        obj = update_data.get(key)
+        if obj:
+            chat = obj.get('chat') or {}
+            if 'id' in chat:
+                return chat['id']
+    callback = update_data.get('callback_query')
+    if callback:
+        chat = (callback.get('message') or {}).get('chat') or {}
+        if 'id' in chat:
+            return chat['id']
+        # inline-кнопка без сообщения — по пользователю, как личный чат
+        user = callback.get('from') or {}
+        return user.get('id')
+    for key in _USER_UPDATE_TYPES:
+        obj = update_data.get(key)
+        if obj:
+            user = obj.get('from') or obj.get('user') or {}
+            return user.get('id')
+    return None
+
+
+def shard_socket_path(socket_dir: str, index: int) -> str:
+    return str(Path(socket_dir) / f"shard-{index}.sock")
+
+
+class ShardRouter:
+    """Пересылка обновлений воркерам по unix-сокетам."""
+
+    def __init__(self, socket_paths: list[str], webhook_path: str = "/webhook"):
+        self.socket_paths = socket_paths
+        self.webhook_path = webhook_path
+        self.ring = HashRing(len(socket_paths))
+        self._sessions: list[aiohttp.ClientSession] = []
+        self.forwarded_total = [0] * len(socket_paths)
+        self.failed_total = [0] * len(socket_paths)
+
+    async def start(self):
+        for path in self.socket_paths:
+            self._sessions.append(aiohttp.ClientSession(
+                connector=aiohttp.UnixConnector(path=path),
+                timeout=aiohttp.ClientTimeout(total=10),
+            ))
+
+    async def stop(self):
+        for session in self._sessions:
+            await session.close()
+        self._sessions.clear()
+
+    def shard_for_update(self, update_data: dict) -> int:
+        chat_id = extract_chat_id(update_data)
+        if chat_id is None:
+            return 0
+        return self.ring.shard_for(chat_id)
+
+    async def forward(self, shard: int, body: bytes) -> tuple[int, str]:
+        # Хост в URL не важен: соединение идёт через unix-сокет шарда
+        url = f"http://shard-{shard}{self.webhook_path}"
+        try:
+            async with self._sessions[shard].post(url, data=body, headers={'Content-Type': 'application/json'}) as resp:
+                text = await resp.text()
+                self.forwarded_total[shard] += 1
+                return resp.status, text
+        except Exception as e:
+            self.failed_total[shard] += 1
+            logging.error(f"Шард {shard} недоступен: {e}")
+            # 503 — Telegram повторит доставку позже
+            return 503, "Shard unavailable"
+
+    async def fetch_metrics(self, shard: int) -> str | None:
+        try:
+            async with self._sessions[shard].get(f"http://shard-{shard}/metrics") as resp:
+                resp.raise_for_status()
+                return await resp.text()
+        except Exception as e:
+            logging.error(f"Метрики шарда {shard} недоступны: {e}")
+            return None
+
+    async def fetch_health(self, shard: int) -> tuple[int, str]:
+        try:
+            async with self._sessions[shard].get(f"http://shard-{shard}/health") as resp:
+                return resp.status, await resp.text()
+        except Exception as e:
+            return 503, f"Shard unavailable: {e}"
+
+    async def fetch_stats(self, shard: int) -> dict:
+        try:
+            async with self._sessions[shard].get(f"http://shard-{shard}/diag/stats", headers=diagnostics.auth_headers()) as resp:
+                return await resp.json()
+        except Exception as e:
+            return {'error': str(e)}
+
+
+def merge_shard_metrics(texts: list[str | None]) -> str:
+    """Метрики шардов одним ответом: к каждой строке добавляется метка shard.
+
+    Строки одной метрики из разных шардов собираются вместе под одним
+    HELP/TYPE, как того требует текстовый формат Prometheus.
+    """
+    families: dict[str, list[str]] = {}
+    current = None
+    for shard, text in enumerate(texts):
+        if text is None:
+            continue
+        for line in text.splitlines():
+            if not line:
+                continue
+            if line.startswith('#'):
+                parts = line.split(maxsplit=3)
+                if len(parts) >= 3 and parts[1] in ('HELP', 'TYPE'):
+                    current = parts[2]
+                    family = families.setdefault(current, [])
+                    if line not in family:
+                        family.append(line)
+                continue
+            name, sep, rest = line.partition('{')
+            if sep:
+                sample = f'{name}{{shard="{shard}",{rest}'
+            else:
+                name, _, value = line.partition(' ')
+                sample = f'{name}{{shard="{shard}"}} {value}'
+            families.setdefault(current or name, []).append(sample)
+    return ''.join(line + '\n' for family in families.values() for line in family)
+
+
+def create_front_app(router: ShardRouter, webhook_path: str = "/webhook") -> web.Application:
+    """Лёгкое фронтовое приложение: разбор chat_id и пересылка на шард."""
+    app = web.Application(
+        client_max_size=1024*1024,
+        handler_args={'access_log': None},
+    )
+
+    async def webhook_handler(request):
+        body = await request.read()
+        try:
+            update_data = json.loads(body)
+        except ValueError:
+            return web.Response(text="Bad Request", status=400, content_type="text/plain")
+        if not isinstance(update_data, dict):
+            return web.Response(text="Bad Request", status=400, content_type="text/plain")
+        status, text = await router.forward(router.shard_for_update(update_data), body)
+        return web.Response(text=text, status=status, content_type="text/plain")
+
+    @diagnostics.guarded
+    async def stats_handler(request):
+        shards = await asyncio.gather(*(router.fetch_stats(i) for i in range(len(router.socket_paths))))
+        return web.json_response({
+            'shards': len(router.socket_paths),
+            'forwarded_total': router.forwarded_total,
+            'failed_total': router.failed_total,
+            'per_shard': shards,
+        })
+
+    async def metrics_handler(request):
+        # ?shard=N — метрики одного шарда как есть, без параметра — все с меткой shard
+        shard = request.query.get('shard')
+        if shard is not None:
+            if not shard.isdigit() or int(shard) >= len(router.socket_paths):
+                return web.Response(text="Unknown shard", status=404, content_type="text/plain")
+            text = await router.fetch_metrics(int(shard))
+            if text is None:
+                return web.Response(text="Shard unavailable", status=503, content_type="text/plain")
+        else:
+            texts = await asyncio.gather(*(router.fetch_metrics(i) for i in range(len(router.socket_paths))))
+            text = merge_shard_metrics(texts)
+        return web.Response(body=text.encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    async def health_handler(request):
+        # Фронт здоров, только если здоровы все шарды (у каждого свой цикл событий)
+        results = await asyncio.gather(*(router.fetch_health(i) for i in range(len(router.socket_paths))))
+        problems = [f"shard {i}: {text}" for i, (status, text) in enumerate(results) if status != 200]
+        if problems:
+            return web.Response(text="Bot is degraded\n" + "\n".join(problems), status=503, content_type="text/plain")
+        return web.Response(text="Bot is running", content_type="text/plain")
+
+    async def _start_router(app):
+        await router.start()
+
+    async def _stop_router(app):
+        await router.stop()
+
+    app.router.add_post(webhook_path, webhook_handler)
+    app.router.add_get('/health', health_handler)
+    app.router.add_get('/diag/stats', stats_handler)
+    app.router.add_get('/metrics', metrics_handler)
+    app.on_startup.append(_start_router)
+    app.on_cleanup.append(_stop_router)
+    return app
+
+
+async def _wait_for_socket(path: str, timeout: float = 30.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not os.path.exists(path):
+        if loop.time() > deadline:
+            raise TimeoutError(f"Шард не поднял сокет {path}")
+        await asyncio.sleep(0.1)
+
+
+async def _supervise_worker(index: int, socket_path: str, script: str):
+    """Запустить воркер шарда и перезапускать его при падении."""
+    env = dict(os.environ, BOT_MODE="shard_worker", SHARD_INDEX=str(index), SHARD_SOCKET=socket_path)
+    while True:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        proc = await asyncio.create_subprocess_exec(sys.executable, script, env=env)
+        try:
+            code = await proc.wait()
+        except asyncio.CancelledError:
+            proc.terminate()
+            try:
+                await asyncio.wait_for(proc.wait(), timeout=15)
+            except asyncio.TimeoutError:
+                proc.kill()
+            raise
+        logging.error(f"Шард {index} завершился с кодом {code}, перезапуск")
+        await asyncio.sleep(1)
+
+
+async def run_sharded(shards: int, socket_dir: str, host: str, port: int, webhook_path: str, script: str, on_ready=None):
+    """Поднять N воркеров и фронт, который маршрутизирует обновления по chat_id."""
+    os.makedirs(socket_dir, exist_ok=True)
+    paths = [shard_socket_path(socket_dir, i) for i in range(shards)]
+    supervisors = [asyncio.create_task(_supervise_worker(i, path, script)) for i, path in enumerate(paths)]
+    runner = None
+    try:
+        await asyncio.gather(*(_wait_for_socket(path) for path in paths))
+        runner = web_runner.AppRunner(create_front_app(ShardRouter(paths, webhook_path), webhook_path))
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logging.info(f"Фронт шардирования запущен на {host}:{port}, шардов: {shards}")
+        if on_ready is not None:
+            await on_ready()
+        await asyncio.Future()
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+        for task in supervisors:
+            task.cancel()
+        await asyncio.gather(*supervisors, return_exceptions=True)
+
+
+# ---------------- локальная самопроверка ----------------
+
+def _selfcheck_update(update_id: int, chat_id: int) -> dict:
+    if update_id % 2:
+        return {'update_id': update_id, 'message': {'message_id': 1, 'date': 0, 'chat': {'id': chat_id, 'type': 'group'}, 'text': 'x'}}
+    return {'update_id': update_id, 'callback_query': {'id': str(update_id), 'from': {'id': 1, 'is_bot': False, 'first_name': 'u'}, 'chat_instance': '1', 'data': 'x', 'message': {'message_id': 1, 'date': 0, 'chat': {'id': chat_id, 'type': 'group'}}}}
+
+
+async def _selfcheck(shards: int, chats: int, updates_per_chat: int) -> bool:
+    import tempfile
+
+    # Статистика фронта и шардов закрыта токеном диагностики
+    diagnostics.DIAG_TOKEN = diagnostics.DIAG_TOKEN or 'selfcheck'
+    socket_dir = tempfile.mkdtemp(prefix="quizbot-shards-")
+    paths = [shard_socket_path(socket_dir, i) for i in range(shards)]
+    received: list[list[tuple[int, int]]] = [[] for _ in range(shards)]
+    runners = []
+
+    # Вместо бота каждый шард записывает, какие обновления до него дошли
+    for index, path in enumerate(paths):
+        async def record(request, index=index):
+            data = await request.json()
+            received[index].append((extract_chat_id(data), data['update_id']))
+            return web.Response(text="OK")
+
+        @diagnostics.guarded
+        async def stats(request, index=index):
+            return web.json_response({'received': len(received[index])})
+
+        app = web.Application()
+        app.router.add_post('/webhook', record)
+        app.router.add_get('/diag/stats', stats)
+        runner = web_runner.AppRunner(app)
+        await runner.setup()
+        await web.UnixSite(runner, path).start()
+        runners.append(runner)
+
+    router = ShardRouter(paths)
+    front = web_runner.AppRunner(create_front_app(router))
+    await front.setup()
+    site = web.TCPSite(front, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    chat_ids = [random.choice((-1, 1)) * random.randint(1, 10**12) for _ in range(chats)]
+    update_id = 0
+    ok = True
+    try:
+        async with aiohttp.ClientSession() as client:
+            for _ in range(updates_per_chat):
+                batch = []
+                for chat_id in chat_ids:
+                    update_id += 1
+                    batch.append(client.post(f"http://127.0.0.1:{port}/webhook", json=_selfcheck_update(update_id, chat_id)))
+                responses = await asyncio.gather(*batch)
+                for resp in responses:
+                    if resp.status != 200:
+                        print(f"FAIL: фронт вернул {resp.status}")
+                        ok = False
+                    resp.release()
+            async with client.get(f"http://127.0.0.1:{port}/diag/stats") as resp:
+                if resp.status != 403:
+                    print(f"FAIL: статистика без токена вернула {resp.status}")
+                    ok = False
+            async with client.get(f"http://127.0.0.1:{port}/diag/stats", headers=diagnostics.auth_headers()) as resp:
+                stats = await resp.json()
+    finally:
+        await front.cleanup()
+        for runner in runners:
+            await runner.cleanup()
+
+    owner: dict[int, int] = {}
+    for index, items in enumerate(received):
+        for chat_id, _ in items:
+            if owner.setdefault(chat_id, index) != index:
+                print(f"FAIL: чат {chat_id} попал на шарды {owner[chat_id]} и {index}")
+                ok = False
+        if not items:
+            print(f"FAIL: шард {index} не получил ни одного обновления")
+            ok = False
+    total = sum(len(items) for items in received)
+    if total != chats * updates_per_chat:
+        print(f"FAIL: доставлено {total} из {chats * updates_per_chat}")
+        ok = False
+    for chat_id, index in owner.items():
+        if router.ring.shard_for(chat_id) != index:
+            print(f"FAIL: чат {chat_id} доставлен не на свой шард")
+            ok = False
+
+    print(f"Шардов: {shards}, чатов: {chats}, обновлений: {total}")
+    print("Распределение по шардам:", [len(items) for items in received])
+    print("Статистика фронта:", json.dumps(stats, ensure_ascii=False))
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+async def _selfcheck_workers(shards: int, chats: int, updates_per_chat: int, timeout: float = 60.0) -> bool:
+    import socket
+    import tempfile
+
+    from loadtest.stub_api import StubApi
+
+    work_dir = tempfile.mkdtemp(prefix="quizbot-shards-")
+    trace_file = os.path.join(work_dir, "trace.jsonl")
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    stub = StubApi(questions_per_game=3, time_to_answer=60)
+    stub.start()
+    # Воркеры наследуют окружение: API — заглушка, каждое обновление — span с номером шарда
+    os.environ.update(
+        API_URL=stub.base_url,
+        BOT_TOKEN='123456:SELFCHECK',
+        BOT_TRACE_FILE=trace_file,
+        TRACE_SAMPLE_RATE='1',
+    )
+    ready = asyncio.Event()
+
+    async def on_ready():
+        ready.set()
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    front = asyncio.create_task(run_sharded(shards, work_dir, '127.0.0.1', port, '/webhook', script, on_ready=on_ready))
+    ring = HashRing(shards)
+    chat_ids = [random.choice((-1, 1)) * random.randint(1, 10**12) for _ in range(chats)]
+    expected: dict[int, int] = {}
+    handled: dict[int, tuple[int, int]] = {}
+    ok = True
+    try:
+        await asyncio.wait_for(ready.wait(), timeout=timeout)
+        update_id = 0
+        async with aiohttp.ClientSession() as client:
+            for _ in range(updates_per_chat):
+                batch = []
+                for chat_id in chat_ids:
+                    update_id += 1
+                    expected[update_id] = chat_id
+                    batch.append(client.post(f"http://127.0.0.1:{port}/webhook", json=_selfcheck_update(update_id, chat_id)))
+                for resp in await asyncio.gather(*batch):
+                    if resp.status != 200:
+                        print(f"FAIL: фронт вернул {resp.status}")
+                        ok = False
+                    resp.release()
+
+        # Шарды обрабатывают обновления в фоне — ждём, пока все появятся в trace
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while len(handled) < len(expected) and loop.time() < deadline:
+            await asyncio.sleep(0.2)
+            handled.clear()
+            if not os.path.exists(trace_file):
+                continue
+            with open(trace_file, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    attrs = record.get('attrs', {})
+                    if record.get('parent_id') is None and 'shard' in attrs:
+                        handled[attrs['update_id']] = (attrs['shard'], attrs.get('chat_id'))
+    finally:
+        front.cancel()
+        await asyncio.gather(front, return_exceptions=True)
+        stub.stop()
+
+    if len(handled) != len(expected):
+        print(f"FAIL: шарды обработали {len(handled)} из {len(expected)} обновлений")
+        ok = False
+    per_shard = [0] * shards
+    for update_id, (shard, chat_id) in sorted(handled.items()):
+        per_shard[shard] += 1
+        if chat_id != expected.get(update_id):
+            print(f"FAIL: обновление {update_id} обработано с чатом {chat_id}, отправлено в {expected.get(update_id)}")
+            ok = False
+        elif ring.shard_for(chat_id) != shard:
+            print(f"FAIL: чат {chat_id} обработан шардом {shard}, а по кольцу принадлежит {ring.shard_for(chat_id)}")
+            ok = False
+    if not all(per_shard):
+        print(f"FAIL: не все шарды получили обновления: {per_shard}")
+        ok = False
+
+    print(f"Воркеров: {shards}, чатов: {chats}, обновлений: {len(expected)}")
+    print("Обработано диспетчерами шардов:", per_shard)
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка маршрутизации обновлений по шардам")
+    parser.add_argument('--selfcheck', type=int, metavar='SHARDS', required=True)
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--updates-per-chat', type=int, default=4)
+    parser.add_argument('--workers', action='store_true', help="Запустить настоящие процессы-воркеры бота")
+    args = parser.parse_args()
+    check = _selfcheck_workers if args.workers else _selfcheck
+    sys.exit(0 if asyncio.run(check(args.selfcheck, args.chats, args.updates_per_chat)) else 1)
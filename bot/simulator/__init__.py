@@ -0,0 +1,15 @@
+"""Детерминированный симулятор групповых игр в виртуальном времени.
+
+Игры идут через настоящие обработчики ответов и кнопки «Далее», очередь
+чата и игровые таймеры, но в цикле clock.VirtualTimeLoop: ожидание в
+120 секунд на вопрос ничего не стоит, и партия из десяти вопросов проходит
+за миллисекунды. Сцена задаётся seed: одинаковый seed даёт ту же ленту
+событий с теми же виртуальными отметками времени, поэтому гонки (ответ в
+ту же секунду, что и таймаут) воспроизводятся, а их исход можно проверять.
+
+Запуск из каталога bot/:
+
+    python -m simulator --players 5 --questions 10 --time-to-answer 120
+    python -m simulator --race --timeline
+    python -m simulator --chats 200 --check-replay
+"""
@@ -0,0 +1,128 @@
+"""CLI симулятора.
+
+    python -m simulator --chats 50 --players 5 --questions 10 --time-to-answer 120
+    python -m simulator --race --timeline          # лента событий первой игры
+    python -m simulator --check-replay             # два прогона должны совпасть
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Симуляция групповых игр в виртуальном времени")
+    parser.add_argument('--chats', type=int, default=1, help="Сколько игр идёт одновременно")
+    parser.add_argument('--players', type=int, default=5)
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--time-to-answer', type=int, default=120)
+    parser.add_argument('--correct-share', type=float, default=0.7)
+    parser.add_argument('--silent-share', type=float, default=0.1, help="Доля игроков, не отвечающих на вопрос")
+    parser.add_argument('--race', action='store_true', help="Последний ответ на каждый вопрос приходит в момент таймаута")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--timeline', action='store_true', help="Напечатать ленту событий первой игры")
+    parser.add_argument('--check-replay', action='store_true', help="Прогнать сцену дважды и сравнить ленты событий")
+    parser.add_argument('--json', dest='json_path', default=None, help="Сохранить итог в JSON")
+    return parser.parse_args(argv)
+
+
+async def simulate(args) -> dict:
+    from message_cleanup import wait_idle
+    from simulator.game import GameScript, RecordingBot, play_dm_game
+
+    script = GameScript(
+        players=args.players,
+        questions=args.questions,
+        time_to_answer=args.time_to_answer,
+        correct_share=args.correct_share,
+        silent_share=args.silent_share,
+        race=args.race,
+    )
+    bot = RecordingBot()
+    games = await asyncio.gather(*(
+        play_dm_game(bot, -(10**6 + idx), script, seed=args.seed * 100_003 + idx)
+        for idx in range(args.chats)
+    ))
+    await wait_idle()
+    io_wait_timeouts = asyncio.get_running_loop().io_wait_timeouts
+    # Внутри чата порядок событий детерминирован; чаты сравниваем по отдельности
+    timeline = [list(event) for event in sorted(bot.timeline, key=lambda event: event[1])]
+    return {
+        'games': games,
+        'telegram_calls': dict(bot.calls.most_common()),
+        'timeline': timeline,
+        'io_wait_timeouts': io_wait_timeouts,
+        'digest': hashlib.sha256(json.dumps(timeline, ensure_ascii=False).encode()).hexdigest(),
+    }
+
+
+def run_once(args) -> tuple[dict, float]:
+    import clock
+
+    # Сцена не должна зависеть от общего random, но и сбивать его не стоит
+    random.seed(args.seed)
+    started = time.perf_counter()
+    result = clock.run_virtual(simulate(args))
+    return result, time.perf_counter() - started
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    os.environ.setdefault('BOT_TOKEN', '123456:SIMULATOR')
+    # Тексты бота и итоги игр идут в API — отвечает заглушка нагрузочного стенда.
+    # Пока ждём настоящий ввод-вывод, виртуальное время стоит
+    from loadtest.stub_api import StubApi
+
+    stub = StubApi(questions_per_game=args.questions, time_to_answer=args.time_to_answer)
+    stub.start()
+    os.environ['API_URL'] = stub.base_url
+
+    try:
+        # Обработчики печатают отладку на каждый ответ — в отчёте это шум
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            # Импорт обработчиков загружает тексты из API — это не часть прогона
+            import team_handlers  # noqa: F401
+
+            result, real_s = run_once(args)
+            replay = run_once(args)[0] if args.check_replay else None
+    finally:
+        stub.stop()
+
+    games = result['games']
+    virtual_s = max(game['virtual_s'] for game in games)
+    print(f"Игр: {len(games)}, вопросов сыграно: {sum(g['questions_played'] for g in games)}, закрыто по таймауту: {sum(g['timeouts'] for g in games)}")
+    print(f"Виртуальное время: {virtual_s:.1f} с, реальное: {real_s * 1000:.0f} мс")
+    print(f"Вызовы Telegram API: {result['telegram_calls']}")
+    print(f"Лента событий: {len(result['timeline'])} событий, sha256 {result['digest'][:16]}")
+    if result['io_wait_timeouts']:
+        print(f"Часы переведены, не дождавшись ввода-вывода: {result['io_wait_timeouts']} раз — повтор не гарантирован")
+    if args.timeline:
+        first_chat = games[0]['chat_id']
+        print("\nЛента первой игры:")
+        for at, chat_id, event, detail in result['timeline']:
+            if chat_id == first_chat:
+                print(f"  {at:>10.3f}  {event:22} {detail}")
+
+    exit_code = 0
+    if replay is not None:
+        same = replay['digest'] == result['digest']
+        print(f"\nПовтор сцены: {'совпадает' if same else 'РАСХОДИТСЯ'}")
+        exit_code = 0 if same else 1
+
+    if args.json_path:
+        report = {'config': vars(args), 'real_s': round(real_s, 3), 'virtual_s': virtual_s, **result}
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""Сцена одной DM-игры: игроки отвечают и жмут «Далее» по расписанию."""
+from __future__ import annotations
+
+import asyncio
+import random
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+import clock
+from benchmarks.fixtures import StubBot, player_names, question_data
+
+
+@dataclass
+class GameScript:
+    players: int = 5
+    questions: int = 10
+    time_to_answer: int = 120
+    correct_share: float = 0.7
+    silent_share: float = 0.1  # доля игроков, которые не отвечают на вопрос
+    next_delay: float = 2.0  # через сколько секунд после итога жмут «Далее»
+    race: bool = False  # последний ответ приходит ровно в момент таймаута
+
+
+class RecordingBot(StubBot):
+    """Заглушка бота, которая пишет ленту событий с виртуальным временем."""
+
+    def __init__(self):
+        super().__init__()
+        self.timeline: list[tuple[float, int, str, str]] = []
+        # (chat_id, message_id) -> когда сообщение отправлено, для отсчёта времени ответов
+        self.sent_at: dict[tuple[int, int], float] = {}
+        self._activity: dict[int, asyncio.Event] = {}
+
+    def record(self, chat_id: int, event: str, detail: str = '') -> None:
+        self.timeline.append((round(clock.monotonic(), 3), chat_id, event, detail))
+        waiter = self._activity.pop(chat_id, None)
+        if waiter is not None:
+            waiter.set()
+
+    async def activity(self, chat_id: int) -> None:
+        """Дождаться следующего обращения бота в чат."""
+        waiter = self._activity.get(chat_id)
+        if waiter is None:
+            waiter = self._activity[chat_id] = asyncio.Event()
+        await waiter.wait()
+
+    async def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        self.record(chat_id, 'send_message', _first_line(text))
+        sent = await super().send_message(chat_id, text, reply_markup=reply_markup, **kwargs)
+        self.sent_at[chat_id, sent.message_id] = clock.monotonic()
+        return sent
+
+    async def send_photo(self, chat_id, photo=None, caption=None, reply_markup=None, **kwargs):
+        self.record(chat_id, 'send_photo', _first_line(caption))
+        sent = await super().send_photo(chat_id, photo, caption=caption, reply_markup=reply_markup, **kwargs)
+        self.sent_at[chat_id, sent.message_id] = clock.monotonic()
+        return sent
+
+    def __getattr__(self, method: str):
+        call = super().__getattr__(method)
+
+        async def recorded(*args, **kwargs):
+            chat_id = kwargs.get('chat_id', args[0] if args else 0)
+            self.record(chat_id, method, _first_line(kwargs.get('text') or kwargs.get('caption')))
+            return await call(*args, **kwargs)
+        return recorded
+
+
+def _first_line(text) -> str:
+    return (text or '').strip().split('\n', 1)[0][:60]
+
+
+def _callback(bot: RecordingBot, chat_id: int, message_id: int | None, user_id: int, username: str, data: str):
+    """Нажатие inline-кнопки в том виде, в каком его видят обработчики."""
+
+    async def answer(text=None, **kwargs):
+        bot.record(chat_id, 'answer_callback', f"{username}: {text or ''}")
+
+    message = SimpleNamespace(chat=SimpleNamespace(id=chat_id, type='supergroup'), message_id=message_id, bot=bot)
+    return SimpleNamespace(
+        data=data,
+        message=message,
+        from_user=SimpleNamespace(id=user_id, username=username),
+        answer=answer,
+    )
+
+
+async def _until(bot: RecordingBot, chat_id: int, condition, poll: float = 5.0) -> None:
+    """Ждать условия, просыпаясь на каждое сообщение бота в чат.
+
+    Состояние игры меняется вместе с обращениями бота в чат; редкий опрос —
+    лишь страховка на случай изменений без сообщений.
+    """
+    while not condition():
+        try:
+            await asyncio.wait_for(bot.activity(chat_id), poll)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def play_dm_game(bot: RecordingBot, chat_id: int, script: GameScript, seed: int) -> dict:
+    """Сыграть одну DM-игру по сценарию и вернуть её итог."""
+    from helpers import send_next_question
+    from chat_actor import post_chat_event
+    from states.local_state import _games_state, get_game_state
+    from team_handlers import answer_variant_callback, next_question_dm_team
+
+    rnd = random.Random(seed)
+    started = clock.monotonic()
+    game_key = f"{chat_id}_pending"
+    game_state = get_game_state(game_key)
+    game_state.status = "playing"
+    # Варианты перемешиваются своим генератором игры: общий random другие
+    # чаты расходуют в порядке, который зависит от настоящего ввода-вывода
+    game_state.rng = random.Random(f"options-{seed}")
+    game_state.players.update(player_names(script.players))
+    # Свой диапазон id вопросов на каждую игру, чтобы игры не делили записи кеша
+    first_qid = abs(chat_id) * 1000
+    game_state.load_questions([question_data(first_qid + i) for i in range(script.questions)])
+    game_state.time_to_answer = script.time_to_answer
+    users = {name: (abs(chat_id) * 10_000 + i) for i, name in enumerate(player_names(script.players))}
+
+    post_chat_event(chat_id, lambda: send_next_question(bot, chat_id, game_state))
+
+    timeouts = 0
+    for q_idx in range(script.questions):
+        await _until(bot, chat_id, lambda: game_state.status != "playing" or (
+            game_state.current_q_idx == q_idx and game_state.current_question_msg_id is not None
+        ))
+        if game_state.status != "playing":
+            break
+        message_id = game_state.current_question_msg_id
+        # Ответы отсчитываются от появления вопроса, а не от момента, когда
+        # сцена это заметила: так гонка с таймаутом попадает точно в секунду
+        shown_at = bot.sent_at[chat_id, message_id]
+        options = list(game_state.current_options or [])
+        right_idx = options.index(game_state.current_correct_answer)
+
+        plan = []
+        for name in users:
+            if rnd.random() < script.silent_share:
+                continue
+            idx = right_idx if rnd.random() < script.correct_share else (right_idx + 1) % len(options)
+            plan.append((rnd.uniform(1, script.time_to_answer - 1), name, idx))
+        if script.race and plan:
+            # Гонка: последний ответ приходит одновременно с таймаутом вопроса
+            _, name, idx = plan[-1]
+            plan[-1] = (float(script.time_to_answer), name, idx)
+
+        async def press_answer(offset: float, name: str, idx: int):
+            await clock.sleep(shown_at + offset - clock.monotonic())
+            await answer_variant_callback(_callback(bot, chat_id, message_id, users[name], name, f"answer:{idx}"), idx)
+
+        answers = [asyncio.create_task(press_answer(*item)) for item in plan]
+        await _until(bot, chat_id, lambda: game_state.status != "playing" or game_state.question_result_sent)
+        await asyncio.gather(*answers)
+        if len(game_state.answers_right) + len(game_state.answers_wrong) < len(game_state.players):
+            timeouts += 1
+
+        await clock.sleep(script.next_delay)
+        first = next(iter(users))
+        await next_question_dm_team(_callback(bot, chat_id, message_id, users[first], first, "next_question"))
+
+    await _until(bot, chat_id, lambda: game_key not in _games_state)
+    return {
+        'chat_id': chat_id,
+        'virtual_s': round(clock.monotonic() - started, 3),
+        'questions_played': game_state.current_q_idx,
+        'timeouts': timeouts,
+        'scores': dict(game_state.scores.ranked()),
+    }
@@ -1,12 +1,34 @@
+from collections import deque
 from dataclasses import dataclass, field
 from datetime import datetime
 import asyncio
+import os
+import random
+import sys
 from typing import Dict
 
+import clock
+from question_cache import QuestionRecord, question_cache
+from registration_renderer import RegistrationRenderer
+from scoreboard import ScoreBoard
+
 
 # Глобальное состояние игр
 _games_state: Dict[str, "GameState"] = {}
 
+# Сколько id сообщений на удаление держим в каждом буфере игры: при переполнении
+# самые старые id выпадают, и такие сообщения просто останутся в чате
+GAME_MESSAGE_ID_BUFFER = int(os.getenv("GAME_MESSAGE_ID_BUFFER", 300))
+
+# С какого числа игроков DM-игра показывает счётчики и топ вместо полных списков
+LARGE_ROOM_THRESHOLD = int(os.getenv("LARGE_ROOM_THRESHOLD", 50))
+# Сколько лидеров показывать в большой комнате
+LARGE_ROOM_TOP_N = int(os.getenv("LARGE_ROOM_TOP_N", 10))
+
+
+def _id_buffer() -> deque:
+    return deque(maxlen=GAME_MESSAGE_ID_BUFFER)
+
 
 class GameModeChoices:
     solo = 'solo'
@@ -14,13 +36,13 @@ class GameModeChoices:
     dm = 'dm'
 
 
-@dataclass
+@dataclass(slots=True)
 class GameState:
     mode: str  # 'dm' or 'team'
     players: set[str] = field(default_factory=set)
     teams: dict[str, list[str]] = field(default_factory=dict)
     captains: dict[str, str] = field(default_factory=dict)  # team -> captain username
-    scores: dict[str, int] = field(default_factory=dict)  # player/team -> score
+    scores: ScoreBoard = field(default_factory=ScoreBoard)  # player/team -> score
     team_id: int | None = None
     current_q_idx: int = 0
     total_questions: int = 0
@@ -29,9 +51,11 @@ class GameState:
     status: str = 'reg'  # 'reg' | 'playing' | 'finished'
     registration_ends_at: datetime | None = None
     timer_task: asyncio.Task | None = None
+    registration_renderer: "RegistrationRenderer | None" = None  # отложенная перерисовка регистрации
     message_id: int | None = None
     quiz_id: int | None = None
-    questions: list = field(default_factory=list)
+    question_ids: list[int] = field(default_factory=list)  # id вопросов в общем кеше
+    time_to_answer: int = 120  # секунд на ответ, общее для всех вопросов игры
     current_question_msg_id: int | None = None
     quiz_name: str | None = None
     attempts_left_by_user: dict[str, int] = field(default_factory=dict)
@@ -39,34 +63,100 @@ class GameState:
     available_quizzes: list[dict] = field(default_factory=list)
     selected_quiz_name: str | None = None
     current_options: list[str] | None = None
-    # --- anti-race / lifecycle flags ---
+    # Генератор для перемешивания вариантов; None — общий random. Симулятор
+    # задаёт свой на каждую игру, чтобы сцена не зависела от других чатов
+    rng: random.Random | None = None
+    # сообщение текущего вопроса: исходный текст и клавиатура для правок в режиме экономии
+    current_question_text: str | None = None
+    current_question_markup: object | None = None
+    current_question_is_photo: bool = False
+    # --- lifecycle ---
+    # События игры применяются последовательно очередью чата (chat_actor),
+    # поэтому блокировки не нужны; токен лишь отсекает устаревшие таймеры
     question_token: int = 0  # increments on each new question
     question_result_sent: bool = False  # per-question result summary sent
-    finished_sent: bool = False  # final results sent
-    is_finishing: bool = False  # finalization in progress
-    transition_lock: asyncio.Lock | None = None  # serializes transitions
-    # snapshot of current question to avoid index races
+    # snapshot of current question
     current_question_id: int | None = None
     current_correct_answer: str | None = None
-    # prevent duplicate Next transitions
-    next_in_progress: bool = False
     plan_team_quiz_id: int | None = None
     # защита от повторных лайков/дизлайков на текущий вопрос
     question_likes: set[str] = field(default_factory=set)  # telegram_id пользователей, поставивших лайк
     question_dislikes: set[str] = field(default_factory=set)  # telegram_id пользователей, поставивших дизлайк
-    # Новые поля для очистки сообщений
-    cleanup_message_ids: list[int] = field(default_factory=list)
-    registration_message_ids: list[int] = field(default_factory=list)  # ID сообщений регистрации для удаления
-    user_answer_message_ids: list[int] = field(default_factory=list)  # ID сообщений с ответами пользователей
+    # Новые поля для очистки сообщений (ограниченные буферы, очищать через clear())
+    cleanup_message_ids: deque[int] = field(default_factory=_id_buffer)
+    registration_message_ids: deque[int] = field(default_factory=_id_buffer)  # ID сообщений регистрации для удаления
+    user_answer_message_ids: deque[int] = field(default_factory=_id_buffer)  # ID сообщений с ответами пользователей
+    # clock.monotonic() последнего действия игроков, по нему сборщик находит брошенные игры
+    last_activity: float = field(default_factory=clock.monotonic)
+
+    @property
+    def large_room(self) -> bool:
+        return self.mode == "dm" and len(self.players) >= LARGE_ROOM_THRESHOLD
+
+    def touch(self) -> None:
+        self.last_activity = clock.monotonic()
+
+    def idle_for(self, now: float | None = None) -> float:
+        return (clock.monotonic() if now is None else now) - self.last_activity
+
+    def estimated_size(self) -> int:
+        """Примерный объём игры в памяти, байт (вопросы живут в общем кеше и не учитываются)."""
+        total = sys.getsizeof(self)
+        for name in self.__slots__:
+            value = getattr(self, name, None)
+            if value is None or isinstance(value, (bool, int, float, asyncio.Task)):
+                continue
+            total += _container_size(value)
+        return total
+
+    def load_questions(self, items: list[dict]) -> None:
+        """Положить вопросы из API в общий кеш и хранить в игре только их id."""
+        question_cache.release(self.question_ids)
+        self.question_ids = question_cache.acquire(items)
+        self.total_questions = len(self.question_ids)
+        if items and items[0].get('time_to_answer'):
+            self.time_to_answer = int(items[0]['time_to_answer'])
+
+    def current_question(self) -> QuestionRecord:
+        return question_cache.get(self.question_ids[self.current_q_idx])
+
+
+def _container_size(value, depth: int = 2) -> int:
+    size = sys.getsizeof(value)
+    if depth <= 0:
+        return size
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += _container_size(key, depth - 1) + _container_size(item, depth - 1)
+    elif isinstance(value, (list, tuple, set, frozenset, deque)):
+        for item in value:
+            size += _container_size(item, depth - 1)
+    return size
 
 
 def get_game_state(game_key: str) -> GameState:
-    """Получить или создать состояние игры."""
-    if game_key not in _games_state:
-        _games_state[game_key] = GameState(mode="dm")
-        # Инициализируем лок для переходов
-        _games_state[game_key].transition_lock = asyncio.Lock()
-    return _games_state[game_key]
+    """Получить или создать состояние игры; каждое обращение считается активностью."""
+    game_state = _games_state.get(game_key)
+    if game_state is None:
+        game_state = _games_state[game_key] = GameState(mode="dm")
+    game_state.touch()
+    return game_state
+
+
+def drop_game(game_key: str) -> None:
+    """Удалить игру: отменить таймер и освободить её вопросы в кеше."""
+    game_state = _games_state.pop(game_key, None)
+    if game_state is None:
+        return
+    if game_state.timer_task:
+        try:
+            game_state.timer_task.cancel()
+        except Exception:
+            pass
+    if game_state.registration_renderer:
+        game_state.registration_renderer.stop()
+    question_cache.release(game_state.question_ids)
+    game_state.question_ids = []
 
 
 def _get_game_key_for_chat(chat_id: int) -> str | None:
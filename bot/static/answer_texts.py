@@ -1,34 +1,156 @@
+"""Тексты бота.
+
+Тексты из админки (API /bot-texts/) компилируются один раз на версию набора:
+при загрузке каждый шаблон разбирается, а его плейсхолдеры сверяются с
+эталоном из bot_texts.json, так что опечатка в админке видна сразу, а не в
+момент отправки сообщения. Для каждой пары «ключ + текст по умолчанию»
+выбранный шаблон кешируется при первом использовании; там же проверяется,
+что вызывающий код передаёт все нужные шаблону параметры. Неподходящий
+шаблон из админки заменяется текстом по умолчанию.
+"""
+import json
+import logging
 import os
+import string
 import time
+from pathlib import Path
 
 from api_client import get_bot_texts
 
 
-time.sleep(5)
-_current_bot_texts = {list(item.keys())[0]: list(item.values())[0] for item in get_bot_texts(os.getenv('BOT_TOKEN'))}
+logger = logging.getLogger(__name__)
+
+_formatter = string.Formatter()
+_DEFAULT_TEXTS_PATH = Path(__file__).resolve().parent.parent / 'bot_texts.json'
+
+
+class _Template:
+    """Текст, заранее разобранный на плейсхолдеры."""
+
+    __slots__ = ('raw', 'fields', 'static')
+
+    def __init__(self, raw: str):
+        fields = set()
+        # ValueError на несбалансированных скобках и прочих ошибках формата
+        for _, field, _, _ in _formatter.parse(raw):
+            if field is None:
+                continue
+            name = field.split('.', 1)[0].split('[', 1)[0]
+            if not name or name.isdigit():
+                raise ValueError(f"позиционный плейсхолдер {{{field}}}")
+            fields.add(name)
+        self.raw = raw
+        self.fields = frozenset(fields)
+        # Текст без плейсхолдеров форматируется один раз (раскрываются {{ и }})
+        self.static = raw.format_map({}) if not fields else None
+
+    @classmethod
+    def literal(cls, raw: str) -> "_Template":
+        """Шаблон, который не разбирается: текст отдаётся как есть."""
+        template = cls.__new__(cls)
+        template.raw = raw
+        template.fields = frozenset()
+        template.static = raw
+        return template
+
+    def render(self, params: dict) -> str:
+        if self.static is not None:
+            return self.static
+        return self.raw.format_map(params)
+
+
+def _load_default_texts() -> dict[str, _Template]:
+    try:
+        with open(_DEFAULT_TEXTS_PATH, encoding='utf-8') as f:
+            items = json.load(f)
+        return {item['text_name']: _Template(item['unformatted_text']) for item in items}
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Не удалось загрузить эталонные тексты {_DEFAULT_TEXTS_PATH}: {e}")
+        return {}
+
+
+_default_templates = _load_default_texts()
+
+_current_bot_texts: dict = {}
+# Проверенные шаблоны из админки текущей версии
+_db_templates: dict[str, _Template] = {}
+# (ключ, текст по умолчанию) -> выбранный шаблон; сбрасывается при смене версии
+_compiled: dict[tuple[str, str], _Template] = {}
+_text_version = 0
+
+
+def load_bot_texts(items) -> list[str]:
+    """Загрузить новый набор текстов из API; вернуть список отклонённых шаблонов."""
+    global _current_bot_texts, _db_templates, _text_version
+    texts = {}
+    for item in items or []:
+        if isinstance(item, dict) and item:
+            key, value = next(iter(item.items()))
+            texts[key] = value
+
+    templates = {}
+    problems = []
+    for key, value in texts.items():
+        raw = value.get('unformatted_text') if isinstance(value, dict) else None
+        if not raw:
+            continue
+        try:
+            template = _Template(raw)
+        except ValueError as e:
+            problems.append(f"{key}: ошибка формата ({e})")
+            continue
+        reference = _default_templates.get(key)
+        unknown = template.fields - reference.fields if reference else frozenset()
+        if unknown:
+            problems.append(f"{key}: неизвестные плейсхолдеры {', '.join(sorted(unknown))}")
+            continue
+        templates[key] = template
+
+    for problem in problems:
+        logger.warning(f"Текст бота отклонён, используется текст по умолчанию — {problem}")
+
+    _current_bot_texts = texts
+    _db_templates = templates
+    _compiled.clear()
+    _text_version += 1
+    return problems
+
+
+def _compile(key: str, default: str, params: dict) -> _Template:
+    template = _db_templates.get(key)
+    if template is not None and not template.fields <= params.keys():
+        # Шаблону нужны параметры, которых этот вызов не передаёт
+        missing = ', '.join(sorted(template.fields - params.keys()))
+        logger.warning(f"Текст бота {key} требует параметры {missing}, используется текст по умолчанию")
+        template = None
+    if template is None:
+        try:
+            template = _Template(default)
+        except ValueError:
+            template = _Template.literal(default)
+    _compiled[(key, default)] = template
+    return template
 
 
 def _t(key: str, default: str, **params) -> str:
-    """Возвращает текст из _current_bot_texts по ключу с безопасным фолбеком.
+    """Возвращает текст по ключу из текущего набора с безопасным фолбеком на default.
 
-    Ожидаем структуру: { key: { 'unformatted_text': '...' } }
     Поддерживается подстановка плейсхолдеров через str.format(**params).
     """
+    template = _compiled.get((key, default))
+    if template is None:
+        template = _compile(key, default, params)
+    if not params:
+        return template.raw
     try:
-        source = _current_bot_texts or {}
-        # Если вдруг это корутина/не-словарь — игнорируем и используем default
-        if not isinstance(source, dict):
-            raise TypeError("texts source is not a dict")
-        raw = source.get(key) or {}
-        text = raw.get('unformatted_text') if isinstance(raw, dict) else None
-        text = text or default
-    except Exception:
-        text = default
-    try:
-        return text.format(**params) if params else text
+        return template.render(params)
     except Exception:
         # На случай несовпадения плейсхолдеров
-        return text
+        return template.raw
+
+
+time.sleep(5)
+load_bot_texts(get_bot_texts(os.getenv('BOT_TOKEN')))
 
 
 def plural_points(n: int) -> str:
@@ -172,7 +294,9 @@ class TextStatics:
         registered_count: int,
         participants_total_points: int | None = None,
         players_totals: list[tuple[str, int]] | None = None,
+        participated: int | None = None,
     ) -> str:
+        """sorted_scores может быть только топом; тогда participated — общее число игроков."""
         if not sorted_scores:
             results = "—"
             participated = 0
@@ -182,8 +306,11 @@ class TextStatics:
                 prefix = "🥇" if idx == 1 else ("🥈" if idx == 2 else ("🥉" if idx == 3 else "🔹"))
                 handle = f"@{name}"
                 result_lines.append(f"{prefix} {idx}. {handle}: {score} баллов")
+            if participated is None:
+                participated = len(sorted_scores)
+            elif participated > len(sorted_scores):
+                result_lines.append(f"…и ещё {participated - len(sorted_scores)} участников")
             results = "\n".join(result_lines)
-            participated = len(sorted_scores)
         percent = int(round((participated / registered_count) * 100)) if registered_count else 0
         if players_totals:
             totals_sorted = sorted(players_totals, key=lambda x: x[1], reverse=True)
@@ -220,10 +347,13 @@ class TextStatics:
             )
 
     @staticmethod
-    def dm_registration_message(usernames: list[str], seconds_left: int) -> str:
+    def dm_registration_message(usernames: list[str], seconds_left: int, max_listed: int | None = None) -> str:
         participants_text = ''
-        for i, username in enumerate(usernames):
+        listed = usernames if max_listed is None else usernames[:max_listed]
+        for i, username in enumerate(listed):
             participants_text += f"{i+1}. @{username}\n"
+        if len(listed) < len(usernames):
+            participants_text += f"…и ещё {len(usernames) - len(listed)}\n"
         default = (
             "📝 Регистрация на игру открыта!\n\n"
             "Если хочешь участвовать в этом раунде — просто нажми кнопку ниже.\n"
@@ -284,7 +414,7 @@ class TextStatics:
 
     @staticmethod
     def captain_only_can_answer(username: str) -> str:
-        default = f"Отвечать может только капитан команды! (@{username})"
+        default = "Отвечать может только капитан команды! (@{username})"
         return _t('captain_only_can_answer_with_username', default, username=username)
 
     @staticmethod
@@ -419,6 +549,35 @@ class TextStatics:
             comment_block=comment_block
         )
 
+    @staticmethod
+    def dm_quiz_question_result_summary(
+        right_answer: str,
+        right_count: int,
+        wrong_count: int,
+        not_answered_count: int,
+        top: list[tuple[str, int]],
+        comment: str | None = None,
+    ) -> str:
+        """Итог вопроса для большой комнаты: счётчики и топ вместо списков всех игроков."""
+        comment_block = f"\n\nКомментарий: {comment}" if comment else ""
+        top_lines = "\n".join(f"{idx}. {name}: {score}" for idx, (name, score) in enumerate(top, start=1)) or "—"
+        default = (
+            "⌛️ Время вышло!\n\n"
+            "✅ Правильный ответ: {right_answer}{comment_block}\n\n"
+            "📊 Ответы участников: ✅ {right_count} верно, ❌ {wrong_count} неверно, ⏳ {not_answered_count} не ответили\n\n"
+            "🏆 Лидеры:\n{top}"
+        )
+        return _t(
+            'dm_quiz_question_result_summary',
+            default,
+            right_answer=right_answer,
+            comment_block=comment_block,
+            right_count=right_count,
+            wrong_count=wrong_count,
+            not_answered_count=not_answered_count,
+            top=top_lines,
+        )
+
     @staticmethod
     def dm_quiz_question_template(text: str, timer: int, current_q_idx: int, total_questions: int = 0) -> str:
         default = (
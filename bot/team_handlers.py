@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import asyncio
 import os
 from datetime import datetime, timedelta
 
@@ -27,15 +26,21 @@ from helpers import (
     create_team_helper,
     get_today_games_avaliable,
     get_nearest_game_avaliable,
-    question_transition_delay,
+    get_difficulty_mix,
+    schedule_move_to_next_question,
     finalize_game,
-    move_to_next_question,
     stop_quiz,
+    GROUP_MESSAGE_BUDGET,
 )
+from chat_actor import post_chat_event
+import clock
+from callback_codec import callbacks
+from registration_renderer import RegistrationRenderer
 from states.local_state import (
     get_game_state,
+    drop_game,
     _get_game_key_for_chat,
-    _games_state,
+    LARGE_ROOM_TOP_N,
 )
 from static.answer_texts import TextStatics
 from states.fsm import SoloGameStates
@@ -52,7 +57,7 @@ async def stop_game_team(message: types.Message, state: FSMContext):
     await stop_quiz(message, state)
 
 
-@router.callback_query(lambda c: c.data == "cancel:team")
+@callbacks.route("cancel:team")
 async def cancel_team_game(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer("Игра отменена")
     await stop_quiz(callback.message, state)
@@ -193,7 +198,7 @@ async def choose_city(message: types.Message, state: FSMContext):
         await message.answer(TextStatics.team_create_error())
 
 
-@router.callback_query(lambda c: c.data == 'team:skip_city')
+@callbacks.route('team:skip_city')
 async def skip_city(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
     data = await state.get_data()
@@ -211,7 +216,7 @@ async def skip_city(callback: types.CallbackQuery, state: FSMContext):
         await callback.message.answer(TextStatics.team_create_error())
 
 
-@router.callback_query(lambda c: c.data in {"game:dm", "game:team"})
+@callbacks.route("game:dm", "game:team")
 async def start_registration(callback: types.CallbackQuery, state: FSMContext):
     """Callback after user selects DM or Team mode from main menu."""
     await callback.answer()
@@ -303,13 +308,13 @@ async def start_registration(callback: types.CallbackQuery, state: FSMContext):
     game_state = get_game_state(game_key)
     game_state.mode = mode
     game_state.status = "reg"
-    game_state.registration_ends_at = datetime.utcnow() + timedelta(seconds=registration_duration)
+    game_state.registration_ends_at = clock.utcnow() + timedelta(seconds=registration_duration)
     game_state.available_quizzes = quizzes
     game_state.quiz_id = None
     game_state.quiz_name = None
 
     # Пока вопросы не загружаем до выбора темы
-    game_state.questions = []
+    game_state.load_questions([])
 
     if mode == "dm":
         # ------ старая логика регистрации DM ------
@@ -321,8 +326,29 @@ async def start_registration(callback: types.CallbackQuery, state: FSMContext):
         game_state.message_id = sent_msg.message_id
         game_state.registration_message_ids.append(sent_msg.message_id)
 
+        # Состав и обратный отсчёт перерисовываются с ограничением частоты
+        if game_state.registration_renderer:
+            game_state.registration_renderer.stop()
+        game_state.registration_renderer = RegistrationRenderer(
+            callback.message.bot,
+            callback.message.chat.id,
+            sent_msg.message_id,
+            game_state.registration_ends_at,
+            render=lambda seconds_left: (
+                TextStatics.dm_registration_message(
+                    list(game_state.players),
+                    seconds_left,
+                    max_listed=LARGE_ROOM_TOP_N if game_state.large_room else None,
+                ),
+                registration_dm_keyboard(),
+            ),
+            is_active=lambda: game_state.status == "reg",
+        )
+        game_state.registration_renderer.start(reg_text)
+
         async def on_expire():
             try:
+                await _close_registration_renderer(game_state)
                 # Завершили регистрацию — сразу загружаем вопросы и начинаем игру
                 if not game_state.available_quizzes:
                     await callback.message.bot.edit_message_text(
@@ -338,12 +364,14 @@ async def start_registration(callback: types.CallbackQuery, state: FSMContext):
                 system_token = os.getenv('BOT_TOKEN')
                 configs = await get_configs(system_token)
                 amount_questions = int([config['value'] for config in configs if config['name'] == 'amount_questions_dm'][0])
+                difficulty_mix = get_difficulty_mix(configs, 'difficulty_mix_dm')
 
                 questions_data = await get_rotated_questions_dm(
                     system_token=system_token,
                     chat_id=callback.message.chat.id,
-                    size=amount_questions,
-                    time_to_answer=quiz['time_to_answer']
+                    size=sum(difficulty_mix.values()) if difficulty_mix else amount_questions,
+                    time_to_answer=quiz['time_to_answer'],
+                    difficulty_mix=difficulty_mix,
                 )
                 
                 if not questions_data.get('questions'):
@@ -354,8 +382,7 @@ async def start_registration(callback: types.CallbackQuery, state: FSMContext):
                     )
                     return
                 
-                game_state.questions = questions_data["questions"]
-                game_state.total_questions = len(game_state.questions)
+                game_state.load_questions(questions_data["questions"])
                 game_state.status = "playing"
                 
                 # Получаем название категории из Config
@@ -408,7 +435,7 @@ async def start_registration(callback: types.CallbackQuery, state: FSMContext):
 
 # -------- досрочный старт командной игры --------
 
-@router.callback_query(lambda c: c.data == "team:start_early")
+@callbacks.route("team:start_early")
 async def start_team_game_early(callback: types.CallbackQuery, state: FSMContext):
     """Досрочно начать командную игру."""
     await callback.answer()
@@ -464,9 +491,8 @@ async def start_team_game_early(callback: types.CallbackQuery, state: FSMContext
                 lang_code=callback.from_user.language_code,
             )
             quiz_info = await get_quiz_info("team", quiz_id=game_state.quiz_id)
-            questions_data = await get_questions(token, quiz_info["id"])
-            game_state.questions = questions_data["questions"]
-            game_state.total_questions = len(game_state.questions)
+            questions_data = await get_questions(token, quiz_info["id"], team_id=game_state.team_id)
+            game_state.load_questions(questions_data["questions"])
             game_state.status = "playing"
             # Редактируем исходное сообщение подготовки
             try:
@@ -482,12 +508,12 @@ async def start_team_game_early(callback: types.CallbackQuery, state: FSMContext
         except Exception:
             pass
     
-    game_state.timer_task = await schedule_registration_end(datetime.utcnow() + timedelta(seconds=registration_duration), _delayed_start)
+    game_state.timer_task = await schedule_registration_end(clock.utcnow() + timedelta(seconds=registration_duration), _delayed_start)
 
 
 # --- Выбор плана командной игры ---
-@router.callback_query(lambda c: c.data.startswith("plan_team:"))
-async def choose_team_plan(callback: types.CallbackQuery, state: FSMContext):
+@callbacks.route("plan_team", value=int)
+async def choose_team_plan(callback: types.CallbackQuery, state: FSMContext, value: int):
     await callback.answer()
     game_key = _get_game_key_for_chat(callback.message.chat.id)
     if not game_key:
@@ -495,11 +521,7 @@ async def choose_team_plan(callback: types.CallbackQuery, state: FSMContext):
     game_state = get_game_state(game_key)
     if game_state.mode != "team" or game_state.status not in {"reg"}:
         return
-    plan_id_str = callback.data.split(":", 1)[1]
-    try:
-        plan_id = int(plan_id_str)
-    except ValueError:
-        return
+    plan_id = value
     # Найдем план
     plan = next((p for p in game_state.available_quizzes if p.get("id") == plan_id), None)
     if not plan:
@@ -530,7 +552,7 @@ async def choose_team_plan(callback: types.CallbackQuery, state: FSMContext):
 
 # -------- обработка кнопки "Начать игру" для командного режима --------
 
-@router.callback_query(lambda c: c.data == "team:start_game")
+@callbacks.route("team:start_game")
 async def start_team_game(callback: types.CallbackQuery):
     """Обработчик кнопки 'Начать игру' для командного режима"""
     await callback.answer()
@@ -552,9 +574,8 @@ async def start_team_game(callback: types.CallbackQuery):
             lang_code=callback.from_user.language_code,
         )
         quiz_info = await get_quiz_info("team", quiz_id=game_state.quiz_id)
-        questions_data = await get_questions(token, quiz_info["id"])
-        game_state.questions = questions_data["questions"]
-        game_state.total_questions = len(game_state.questions)
+        questions_data = await get_questions(token, quiz_info["id"], team_id=game_state.team_id)
+        game_state.load_questions(questions_data["questions"])
         game_state.status = "playing"
         
         try:
@@ -575,7 +596,7 @@ async def start_team_game(callback: types.CallbackQuery):
 
 # -------- регистрация участников / команд --------
 
-@router.callback_query(lambda c: c.data == "reg:join")
+@callbacks.route("reg:join")
 async def reg_join_dm(callback: types.CallbackQuery):
     await callback.answer()
 
@@ -589,21 +610,25 @@ async def reg_join_dm(callback: types.CallbackQuery):
         return
 
     username = callback.from_user.username or str(callback.from_user.id)
+    if username in game_state.players:
+        return
     game_state.players.add(username)
 
-    seconds_left = int((game_state.registration_ends_at - datetime.utcnow()).total_seconds())
-    updated_text = TextStatics.dm_registration_message(list(game_state.players), seconds_left)
+    # Сообщение обновится вместе с другими нажатиями, не чаще раза в интервал
+    if game_state.registration_renderer:
+        game_state.registration_renderer.request()
 
-    await callback.message.bot.edit_message_text(
-        chat_id=callback.message.chat.id,
-        message_id=game_state.message_id,
-        text=updated_text,
-        reply_markup=registration_dm_keyboard(),
-    )
+
+async def _close_registration_renderer(game_state):
+    """Остановить перерисовку регистрации до того, как сообщение изменится иначе."""
+    renderer = game_state.registration_renderer
+    if renderer:
+        game_state.registration_renderer = None
+        await renderer.close()
 
 
 # --- Завершение регистрации DM вручную ---
-@router.callback_query(lambda c: c.data == "reg:end")
+@callbacks.route("reg:end")
 async def reg_end_dm(callback: types.CallbackQuery):
     await callback.answer()
 
@@ -618,6 +643,7 @@ async def reg_end_dm(callback: types.CallbackQuery):
     if game_state.timer_task:
         game_state.timer_task.cancel()
         game_state.timer_task = None
+    await _close_registration_renderer(game_state)
 
     # Сразу загружаем вопросы и начинаем игру
     try:
@@ -631,21 +657,22 @@ async def reg_end_dm(callback: types.CallbackQuery):
         system_token = os.getenv('BOT_TOKEN')
         configs = await get_configs(system_token)
         amount_questions = int([config['value'] for config in configs if config['name'] == 'amount_questions_dm'][0])
+        difficulty_mix = get_difficulty_mix(configs, 'difficulty_mix_dm')
 
 
         questions_data = await get_rotated_questions_dm(
             system_token=system_token,
             chat_id=callback.message.chat.id,
-            size=amount_questions,
-            time_to_answer=quiz['time_to_answer']
+            size=sum(difficulty_mix.values()) if difficulty_mix else amount_questions,
+            time_to_answer=quiz['time_to_answer'],
+            difficulty_mix=difficulty_mix,
         )
         
         if not questions_data.get('questions'):
             await callback.message.edit_text("Нет доступных вопросов для DM игр")
             return
         
-        game_state.questions = questions_data["questions"]
-        game_state.total_questions = len(game_state.questions)
+        game_state.load_questions(questions_data["questions"])
         game_state.status = "playing"
         
         await callback.message.edit_text(
@@ -663,9 +690,13 @@ async def reg_end_dm(callback: types.CallbackQuery):
 
 # -------- обработка ответов во время игры --------
 
-@router.callback_query(lambda c: c.data.startswith("answer:") and _get_game_key_for_chat(c.message.chat.id))
-async def answer_variant_callback(callback: types.CallbackQuery):
+@callbacks.route("answer", value=int, when=lambda c, state: _get_game_key_for_chat(c.message.chat.id) is not None)
+async def answer_variant_callback(callback: types.CallbackQuery, value: int):
+    # Ответы одного чата применяются строго по очереди
+    post_chat_event(callback.message.chat.id, lambda: _handle_variant_answer(callback, value))
+
 
+async def _handle_variant_answer(callback: types.CallbackQuery, variant_idx: int):
     game_key = _get_game_key_for_chat(callback.message.chat.id)
     if not game_key:
         await callback.answer(TextStatics.no_active_game())
@@ -676,8 +707,8 @@ async def answer_variant_callback(callback: types.CallbackQuery):
         await callback.answer(TextStatics.game_not_running())
         return
 
-    # Проверяем что это текущий вопрос (не старый)
-    if callback.message.message_id != game_state.current_question_msg_id:
+    # Проверяем что это текущий вопрос (не старый) и он ещё не закрыт
+    if callback.message.message_id != game_state.current_question_msg_id or game_state.question_result_sent:
         await callback.answer(TextStatics.outdated_question())
         return
 
@@ -705,19 +736,11 @@ async def answer_variant_callback(callback: types.CallbackQuery):
         await callback.answer(TextStatics.already_answered())
         return
 
-    # Получаем индекс выбранного варианта и маппим его в текст
-    _, variant_idx_str = callback.data.split(":", 1)
-    try:
-        variant_idx = int(variant_idx_str)
-    except ValueError:
-        await callback.answer(TextStatics.incorrect_inline_hint())
-        return
-
+    # Индекс выбранного варианта маппим в текст
     options = game_state.current_options or []
     if not options:
         # fallback на формирование из вопроса, если по какой-то причине не сохранилось
-        current_question = game_state.questions[game_state.current_q_idx]
-        options = current_question["wrong_answers"] + [current_question["correct_answer"]]
+        options = game_state.current_question().options
     if variant_idx < 0 or variant_idx >= len(options):
         await callback.answer(TextStatics.incorrect_inline_hint())
         return
@@ -743,12 +766,20 @@ async def answer_variant_callback(callback: types.CallbackQuery):
     )
 )
 async def answer_text_message(message: types.Message):
+    # Ответы одного чата применяются строго по очереди
+    post_chat_event(message.chat.id, lambda: _handle_text_answer(message))
+
+
+async def _handle_text_answer(message: types.Message):
     game_key = _get_game_key_for_chat(message.chat.id)
     if not game_key:
         return
-    
+
     game_state = get_game_state(game_key)
-    
+    # Пока ответ ждал в очереди, вопрос могли закрыть или игру завершить
+    if game_state.status != "playing" or game_state.question_result_sent:
+        return
+
     # Если это ответ-реплай, убеждаемся, что он к текущему вопросу
     if message.reply_to_message is not None:
         # current_question_msg_id должен быть уже установлен send_next_question()
@@ -756,11 +787,11 @@ async def answer_text_message(message: types.Message):
             return
     
     # Проверяем, что это текстовый вопрос
-    if game_state.current_q_idx >= len(game_state.questions):
+    if game_state.current_q_idx >= len(game_state.question_ids):
         return
     
-    current_question = game_state.questions[game_state.current_q_idx]
-    if current_question["question_type"] != QuestionTypeChoices.TEXT:
+    current_question = game_state.current_question()
+    if current_question.question_type != QuestionTypeChoices.TEXT:
         return
     
     username = message.from_user.username or str(message.from_user.id)
@@ -825,81 +856,71 @@ async def answer_text_message(message: types.Message):
 
 
 # --- Переход к следующему вопросу по кнопке ---
-@router.callback_query(lambda c: c.data == "next_question")
+@callbacks.route("next_question")
 async def next_question_dm_team(callback: types.CallbackQuery):
-    await callback.answer()
-    game_key = _get_game_key_for_chat(callback.message.chat.id)
-    if not game_key:
-        return
-    game_state = get_game_state(game_key)
-    # Игру могли завершать
-    if game_state.is_finishing or game_state.status != "playing":
-        return
-    # В DM/Team переходим далее только если выведен результат вопроса (ожидаем next)
-    # Защищаемся от одновременных кликов через lock
-    if game_state.transition_lock is None:
-        game_state.transition_lock = asyncio.Lock()
-    async with game_state.transition_lock:
-        if game_state.is_finishing or game_state.status != "playing":
-            return
-        # Разрешаем переход, если мы действительно на этапе после вывода результата
-        if not (game_state.waiting_next or game_state.question_result_sent):
+    if not GROUP_MESSAGE_BUDGET:
+        await callback.answer()
+    post_chat_event(callback.message.chat.id, lambda: _handle_next_question(callback))
+
+
+async def _handle_next_question(callback: types.CallbackQuery):
+    # В режиме экономии на клик отвечаем здесь: уведомление о переходе
+    # показывается всплывающим ответом вместо отдельного сообщения
+    notice = None
+    try:
+        game_key = _get_game_key_for_chat(callback.message.chat.id)
+        if not game_key:
             return
-        # Двойная защита от дублей: флаг на период перехода
-        if getattr(game_state, 'next_in_progress', False):
+        game_state = get_game_state(game_key)
+        # Переходим далее только после вывода результата вопроса; повторные клики
+        # обрабатываются после первого и видят уже снятый флаг
+        if game_state.status != "playing" or not game_state.waiting_next:
             return
-        game_state.next_in_progress = True
-        # Снимаем ожидание и помечаем, что результат уже отправлен, чтобы второй клик ничего не делал
         game_state.waiting_next = False
-        game_state.question_result_sent = True
-
-        # ВНУТРИ ЛОКА, НЕ КАК ЗАДАЧА!
-        try:
-            if game_state.current_q_idx < len(game_state.questions) - 1:
-                asyncio.create_task(question_transition_delay(callback.message.bot, callback.message.chat.id, game_state))
-            else:
-                await move_to_next_question(callback.message.bot, callback.message.chat.id, game_state)
-        except Exception as e:
-            print(f"Оибка при переходе к следующему вопросу: {e}")
+        if game_state.current_q_idx < len(game_state.question_ids) - 1:
+            notice = TextStatics.question_transition_delay()
+        schedule_move_to_next_question(callback.message.bot, callback.message.chat.id, game_state)
+    finally:
+        if GROUP_MESSAGE_BUDGET:
+            try:
+                await callback.answer(notice)
+            except Exception:
+                pass
 
 
 # --- Отмена игры кнопкой ---
-@router.callback_query(lambda c: c.data == "game:cancel")
+@callbacks.route("game:cancel")
 async def cancel_game_callback(callback: types.CallbackQuery):
     await callback.answer()
+    post_chat_event(callback.message.chat.id, lambda: _handle_cancel_game(callback))
+
+
+async def _handle_cancel_game(callback: types.CallbackQuery):
     game_key = _get_game_key_for_chat(callback.message.chat.id)
     if not game_key:
         return
     game_state = get_game_state(game_key)
-    if game_state.timer_task:
-        game_state.timer_task.cancel()
-    try:
-        del _games_state[game_key]
-    except Exception:
-        pass
+    game_state.status = "finished"
+    drop_game(game_key)
     await callback.message.answer(TextStatics.canceled())
 
 
 # --- Завершить игру кнопкой (DM/Team в группах) ---
-@router.callback_query(lambda c: c.data == "finish_quiz")
+@callbacks.route("finish_quiz")
 async def finish_quiz_group(callback: types.CallbackQuery):
     await callback.answer()
     # Только для групповых чатов: dm и team
     if callback.message.chat.type == 'private':
         return
+    post_chat_event(callback.message.chat.id, lambda: _handle_finish_quiz(callback))
+
+
+async def _handle_finish_quiz(callback: types.CallbackQuery):
     game_key = _get_game_key_for_chat(callback.message.chat.id)
     if not game_key:
         await callback.message.answer(TextStatics.no_active_game())
         return
     game_state = get_game_state(game_key)
-    # отменяем таймер
-    if game_state.timer_task:
-        try:
-            game_state.timer_task.cancel()
-        except Exception:
-            pass
-        game_state.timer_task = None
-    # Унифицированное завершение игры
-
+    # Унифицированное завершение игры (таймеры отменяет finalize_game)
     await finalize_game(callback.message.bot, callback.message.chat.id, game_state)
 
@@ -0,0 +1,390 @@
+"""Трассировка обновлений бота сквозь вызовы API.
+
+На каждое обновление TracingMiddleware (outer-middleware диспетчера)
+заводит trace_id и корневой span; вызовы api_client и Telegram внутри
+обработчика — дочерние span'ы. api_client передаёт в API заголовки
+X-Trace-Id и X-Parent-Span-Id, и Django (main.middleware.TracingMiddleware)
+пишет свой span с временем в базе под тем же trace_id. Так по одному
+trace_id видно, какой из последовательных вызовов «начать игру» медленный.
+
+Span'ы пишутся строками JSON в BOT_TRACE_FILE (весь trace одной записью,
+когда обновление обработано); без этой настройки трассировка выключена и
+заголовки не добавляются. Задачи, запущенные обработчиком (таймеры),
+наследуют trace и дописывают свои span'ы позже.
+
+Водопад по файлам бота и API:
+
+    python tracing.py traces/bot.jsonl ../api/traces/api.jsonl --slowest 5
+    python tracing.py traces/bot.jsonl ../api/traces/api.jsonl --trace 3f2a9c...
+
+Самопроверка: два обновления одного чата, события которых идут через
+очередь чата (chat_actor), дают два отдельных водопада:
+
+    python tracing.py --selfcheck
+"""
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+
+from callback_codec import current_callback_route
+
+
+# Куда писать span'ы (JSON lines); пусто — трассировка выключена
+BOT_TRACE_FILE = os.getenv("BOT_TRACE_FILE", "")
+# Доля обновлений, которые трассируются
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 1.0))
+# Номер шарда в режиме sharded: воркеры пишут в общий файл, так видно, кто обработал обновление
+SHARD_INDEX = os.getenv("SHARD_INDEX")
+
+TRACE_HEADER = 'X-Trace-Id'
+PARENT_SPAN_HEADER = 'X-Parent-Span-Id'
+
+
+class Trace:
+    __slots__ = ('trace_id', 'spans', 'finished')
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans: list[dict] = []
+        self.finished = False
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'attrs', 'started_at', '_started')
+
+    def __init__(self, trace: Trace, name: str, parent_id: str | None, attrs: dict | None = None):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs or {}
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+
+    def finish(self, **attrs) -> None:
+        self.attrs.update(attrs)
+        record = {
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'service': 'bot',
+            'name': self.name,
+            'start': round(self.started_at, 6),
+            'duration_ms': round((time.perf_counter() - self._started) * 1000, 3),
+            'attrs': self.attrs,
+        }
+        if self.trace.finished:
+            # Span задачи, пережившей обновление (например, таймера), — пишем сразу
+            _export([record])
+        else:
+            self.trace.spans.append(record)
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def enabled() -> bool:
+    return bool(BOT_TRACE_FILE)
+
+
+def _export(records: list[dict]) -> None:
+    # Одна запись на обновление: строки короткие и ложатся в кеш страниц ОС
+    try:
+        with open(BOT_TRACE_FILE, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records))
+    except OSError as e:
+        print(f"tracing: не удалось записать span'ы в {BOT_TRACE_FILE}: {e}")
+
+
+def current_trace_id() -> str | None:
+    span = _current_span.get()
+    return span.trace.trace_id if span is not None else None
+
+
+def headers() -> dict[str, str]:
+    """Заголовки для запроса к API из текущего span'а; вне трассировки — пусто."""
+    span = _current_span.get()
+    if span is None:
+        return {}
+    return {TRACE_HEADER: span.trace.trace_id, PARENT_SPAN_HEADER: span.span_id}
+
+
+class _SpanScope:
+    def __init__(self, name: str, attrs: dict | None):
+        self.name = name
+        self.attrs = attrs
+        self.span: Span | None = None
+        self._token = None
+
+    def __enter__(self) -> Span | None:
+        parent = _current_span.get()
+        if parent is None:
+            return None
+        self.span = Span(parent.trace, self.name, parent.span_id, self.attrs)
+        self._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is None:
+            return
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.span.attrs['error'] = exc_type.__name__
+        self.span.finish()
+
+
+def span(name: str, **attrs) -> _SpanScope:
+    """Дочерний span текущего trace; вне трассировки ничего не делает."""
+    return _SpanScope(name, attrs)
+
+
+def traced(func):
+    """Декоратор корутины: span с именем функции (для функций api_client)."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if _current_span.get() is None:
+            return await func(*args, **kwargs)
+        with span(func.__name__, kind='api'):
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+def _update_attrs(update: Update) -> dict:
+    attrs = {'update_id': update.update_id, 'event': update.event_type}
+    if SHARD_INDEX is not None:
+        attrs['shard'] = int(SHARD_INDEX)
+    event = update.event
+    chat = getattr(event, 'chat', None) or getattr(getattr(event, 'message', None), 'chat', None)
+    if chat is not None:
+        attrs['chat_id'] = chat.id
+    if update.callback_query is not None:
+        attrs['callback_data'] = update.callback_query.data
+    elif update.message is not None and update.message.text and update.message.text.startswith('/'):
+        attrs['command'] = update.message.text.split()[0]
+    return attrs
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Outer-middleware на dp.update: trace и корневой span на каждое обновление."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if random.random() >= TRACE_SAMPLE_RATE:
+            return await handler(event, data)
+        trace = Trace()
+        root = Span(trace, 'update', None, _update_attrs(event))
+        # Имя маршрута прошлого нажатия не должно попасть в этот trace
+        current_callback_route.set(None)
+        token = _current_span.set(root)
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            root.attrs['error'] = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            route = current_callback_route.get()
+            if route:
+                root.attrs['handler'] = route
+            root.finish()
+            trace.finished = True
+            # Корневой span — первым, остальные по времени начала
+            _export([trace.spans[-1]] + sorted(trace.spans[:-1], key=lambda s: s['start']))
+
+
+class TelegramTracingMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: вызовы Telegram как span'ы текущего обновления."""
+
+    async def __call__(self, make_request, bot, method):
+        with span(getattr(method, '__api_method__', type(method).__name__), kind='telegram'):
+            return await make_request(bot, method)
+
+
+def install(dispatcher, bot) -> None:
+    if not enabled():
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(BOT_TRACE_FILE)), exist_ok=True)
+    dispatcher.update.outer_middleware(TracingMiddleware())
+    bot.session.middleware(TelegramTracingMiddleware())
+
+
+# --- водопад ---
+
+def load_spans(paths: list[str]) -> dict[str, list[dict]]:
+    traces: dict[str, list[dict]] = {}
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                traces.setdefault(record['trace_id'], []).append(record)
+    return traces
+
+
+def _describe(record: dict) -> str:
+    attrs = record.get('attrs', {})
+    if record.get('service') == 'api':
+        text = f"api {record['name']} -> {attrs.get('status')}"
+        if 'db_ms' in attrs:
+            text += f", db {attrs['db_ms']} мс / {attrs.get('queries')} запр."
+        return text
+    if record['name'] == 'update':
+        details = [attrs.get('event'), attrs.get('handler') or attrs.get('command') or attrs.get('callback_data')]
+        if 'shard' in attrs:
+            details.append(f"[shard {attrs['shard']}]")
+        return 'update ' + ' '.join(str(d) for d in details if d)
+    text = record['name']
+    if attrs.get('error'):
+        text += f" ! {attrs['error']}"
+    return text
+
+
+def render_waterfall(spans: list[dict], width: int = 40) -> str:
+    roots = [s for s in spans if s.get('parent_id') is None] or spans[:1]
+    start = min(s['start'] for s in spans)
+    end = max(s['start'] + s['duration_ms'] / 1000 for s in spans)
+    total_ms = max((end - start) * 1000, 0.001)
+    children: dict[str | None, list[dict]] = {}
+    for record in spans:
+        children.setdefault(record.get('parent_id'), []).append(record)
+
+    lines = [f"trace {spans[0]['trace_id']}  {total_ms:.1f} мс"]
+
+    def walk(record: dict, depth: int):
+        offset_ms = (record['start'] - start) * 1000
+        left = min(int(offset_ms / total_ms * width), width - 1)
+        bar = min(max(1, round(record['duration_ms'] / total_ms * width)), width - left)
+        lines.append(
+            f"{offset_ms:>8.1f} {record['duration_ms']:>8.1f} мс  "
+            f"{' ' * left}{'█' * bar}{' ' * (width - left - bar)}  {'  ' * depth}{_describe(record)}"
+        )
+        for child in sorted(children.get(record['span_id'], []), key=lambda s: s['start']):
+            walk(child, depth + 1)
+
+    for root in roots:
+        walk(root, 0)
+    return '\n'.join(lines)
+
+
+# --- самопроверка ---
+
+async def _selfcheck(updates: int = 2) -> bool:
+    import asyncio
+    import tempfile
+
+    from chat_actor import post_chat_event
+
+    global BOT_TRACE_FILE
+    chat_id = -100123
+    handled: list[asyncio.Future] = []
+    middleware = TracingMiddleware()
+
+    # Как игровые обработчики: событие уходит в очередь чата, обновление
+    # завершается, не дожидаясь его
+    async def handler(event: Update, data: dict):
+        done = asyncio.get_running_loop().create_future()
+        handled.append(done)
+
+        async def chat_event():
+            with span('chat_event', update_id=event.update_id):
+                with span('sendMessage', kind='telegram'):
+                    await asyncio.sleep(0.01)
+            done.set_result(current_trace_id())
+
+        post_chat_event(chat_id, chat_event)
+
+    previous = BOT_TRACE_FILE
+    fd, BOT_TRACE_FILE = tempfile.mkstemp(prefix='quizbot-trace-', suffix='.jsonl')
+    os.close(fd)
+    try:
+        for update_id in range(1, updates + 1):
+            update = Update.model_validate({
+                'update_id': update_id,
+                'message': {'message_id': update_id, 'date': 0, 'chat': {'id': chat_id, 'type': 'group'}, 'text': '/start'},
+            })
+            await middleware(handler, update, {})
+        event_traces = await asyncio.wait_for(asyncio.gather(*handled), timeout=5)
+        traces = load_spans([BOT_TRACE_FILE])
+    finally:
+        os.unlink(BOT_TRACE_FILE)
+        BOT_TRACE_FILE = previous
+
+    ok = True
+    if len(traces) != updates:
+        print(f"FAIL: {len(traces)} trace вместо {updates}")
+        ok = False
+    for spans in traces.values():
+        roots = [s for s in spans if s['parent_id'] is None]
+        events = [s for s in spans if s['name'] == 'chat_event']
+        if len(roots) != 1 or len(events) != 1:
+            print(f"FAIL: trace {spans[0]['trace_id']}: корней {len(roots)}, событий чата {len(events)}")
+            ok = False
+            continue
+        if events[0]['parent_id'] != roots[0]['span_id'] or events[0]['attrs']['update_id'] != roots[0]['attrs']['update_id']:
+            print(f"FAIL: событие обновления {events[0]['attrs']['update_id']} записано в trace обновления {roots[0]['attrs']['update_id']}")
+            ok = False
+        print(render_waterfall(spans))
+        print()
+    if len(set(event_traces)) != updates:
+        print(f"FAIL: события чата видели trace {event_traces}")
+        ok = False
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main(argv=None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv == ['--selfcheck']:
+        import asyncio
+
+        return 0 if asyncio.run(_selfcheck()) else 1
+
+    parser = argparse.ArgumentParser(description="Водопад span'ов бота и API по trace_id")
+    parser.add_argument('files', nargs='+', help="Файлы JSON lines бота (BOT_TRACE_FILE) и API (API_TRACE_FILE)")
+    parser.add_argument('--trace', help="trace_id (можно начало)")
+    parser.add_argument('--slowest', type=int, default=5, help="Показать столько самых долгих обновлений")
+    parser.add_argument('--width', type=int, default=40)
+    args = parser.parse_args(argv)
+
+    traces = load_spans(args.files)
+    if args.trace:
+        selected = [spans for trace_id, spans in traces.items() if trace_id.startswith(args.trace)]
+        if not selected:
+            print(f"trace {args.trace} не найден")
+            return 1
+    else:
+        def root_duration(spans: list[dict]) -> float:
+            return max((s['duration_ms'] for s in spans if s.get('parent_id') is None), default=0.0)
+
+        selected = sorted(traces.values(), key=root_duration, reverse=True)[:args.slowest]
+    for spans in selected:
+        print(render_waterfall(spans, args.width))
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""Очередь входящих обновлений для webhook-режима.
+
+Webhook только валидирует update и кладёт его в очередь, а ограниченный пул
+воркеров прогоняет обновления через диспетчер. Повторно доставленные Telegram
+update_id отбрасываются по короткоживущему seen-set.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram.types import Update
+
+
+class SubmitResult:
+    queued = 'queued'
+    duplicate = 'duplicate'
+    rejected = 'rejected'
+
+
+class UpdatePool:
+    def __init__(
+        self,
+        dispatcher,
+        bot,
+        workers: int = 16,
+        max_queue: int = 1000,
+        dedupe_ttl: float = 600.0,
+        dedupe_max_size: int = 100_000,
+    ):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.workers = workers
+        self.dedupe_ttl = dedupe_ttl
+        self.dedupe_max_size = dedupe_max_size
+        self._queue: asyncio.Queue[tuple[Update, float]] = asyncio.Queue(maxsize=max_queue)
+        self._seen: OrderedDict[int, float] = OrderedDict()
+        self._tasks: list[asyncio.Task] = []
+        self._busy = 0
+        # --- метрики ---
+        self.queued_total = 0
+        self.processed_total = 0
+        self.failed_total = 0
+        self.duplicates_total = 0
+        self.rejected_total = 0
+        self.max_depth = 0
+        self.wait_seconds_total = 0.0
+        self.process_seconds_total = 0.0
+
+    async def start(self):
+        for idx in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"update-worker-{idx}"))
+        logging.info(f"Пул обработки обновлений запущен: {self.workers} воркеров, очередь {self._queue.maxsize}")
+
+    async def stop(self):
+        # Даём дообработать то, что уже принято
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=10)
+        except asyncio.TimeoutError:
+            logging.warning(f"Пул обновлений остановлен с {self._queue.qsize()} необработанными обновлениями")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def _is_duplicate(self, update_id: int, now: float) -> bool:
+        # Записи упорядочены по времени добавления, поэтому истёкшие всегда в начале
+        while self._seen:
+            _, expires_at = next(iter(self._seen.items()))
+            if expires_at > now and len(self._seen) < self.dedupe_max_size:
+                break
+            self._seen.popitem(last=False)
+        return update_id in self._seen
+
+    def submit(self, update: Update) -> str:
+        """Поставить обновление в очередь без ожидания обработки."""
+        now = time.monotonic()
+        if self._is_duplicate(update.update_id, now):
+            self.duplicates_total += 1
+            return SubmitResult.duplicate
+        try:
+            self._queue.put_nowait((update, now))
+        except asyncio.QueueFull:
+            # Не помечаем как увиденное: Telegram повторит доставку позже
+            self.rejected_total += 1
+            return SubmitResult.rejected
+        self._seen[update.update_id] = now + self.dedupe_ttl
+        self.queued_total += 1
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return SubmitResult.queued
+
+    async def _worker(self):
+        while True:
+            update, enqueued_at = await self._queue.get()
+            started_at = time.monotonic()
+            self.wait_seconds_total += started_at - enqueued_at
+            self._busy += 1
+            try:
+                await self.dispatcher.feed_update(self.bot, update)
+                self.processed_total += 1
+            except Exception as e:
+                self.failed_total += 1
+                logging.error(f"Ошибка при обработке обновления {update.update_id}: {e}")
+            finally:
+                self._busy -= 1
+                self.process_seconds_total += time.monotonic() - started_at
+                self._queue.task_done()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        done = self.processed_total + self.failed_total
+        return {
+            'queue_depth': self._queue.qsize(),
+            'queue_max_size': self._queue.maxsize,
+            'queue_max_depth': self.max_depth,
+            'workers': self.workers,
+            'workers_busy': self._busy,
+            'queued_total': self.queued_total,
+            'processed_total': self.processed_total,
+            'failed_total': self.failed_total,
+            'duplicates_total': self.duplicates_total,
+            'rejected_total': self.rejected_total,
+            'avg_wait_ms': round(self.wait_seconds_total / done * 1000, 2) if done else 0.0,
+            'avg_process_ms': round(self.process_seconds_total / done * 1000, 2) if done else 0.0,
+            'seen_ids': len(self._seen),
+        }